@@ -0,0 +1,42 @@
+"""
+Compare generating codes by keying a fresh HMAC for every code
+against copying an HMAC that was keyed once up front.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hmac
+"""
+from __future__ import print_function
+from __future__ import division
+import hashlib
+import hmac
+import timeit
+
+from spookyotp.otp import OTPBase
+
+
+N_CODES = 100000
+
+
+def main():
+    secret = bytearray(range(20))
+    print('{:<8} {:>14} {:>14} {:>9}'.format('algo', 'rekey (us)',
+                                             'prekeyed (us)', 'saving'))
+    for name in ('sha1', 'sha256', 'sha512'):
+        algorithm = getattr(hashlib, name)
+        keyed = hmac.new(secret, None, algorithm)
+
+        rekey = timeit.timeit(
+            lambda: OTPBase._get_otp(secret, 123456, 6, algorithm),
+            number=N_CODES)
+        prekeyed = timeit.timeit(
+            lambda: OTPBase._get_keyed_otp(keyed, 123456, 6),
+            number=N_CODES)
+
+        print('{:<8} {:>14.3f} {:>14.3f} {:>8.1f}%'.format(
+            name, 1e6 * rekey / N_CODES, 1e6 * prekeyed / N_CODES,
+            100 * (rekey - prekeyed) / rekey))
+
+
+if __name__ == '__main__':
+    main()
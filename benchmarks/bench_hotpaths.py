@@ -0,0 +1,201 @@
+"""
+Microbenchmarks for the OTP hot paths: code generation, TOTP and HOTP
+compare, URI round trips and the byte helpers. Generation and compare
+are run for every algorithm, digit count and window size in the grids
+below.
+
+For each case, this records operations per second (best of several
+runs) and the peak bytes allocated during one call, as measured by
+tracemalloc. Results can be saved as JSON and compared against a
+saved baseline; any case that is slower, or allocates more, than the
+baseline by more than the tolerance is reported, and the exit status
+is 1.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hotpaths --output baseline.json
+    python -m benchmarks.bench_hotpaths --baseline baseline.json
+"""
+from __future__ import print_function
+from __future__ import division
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from spookyotp.otp import OTPBase, HOTP, TOTP, from_uri
+from spookyotp.byte_util import int_to_bytearray, bytes_to_31_bit_int
+
+
+ALGORITHMS = ('sha1', 'sha224', 'sha256', 'sha384', 'sha512', 'md5')
+DIGITS = (6, 7, 8)
+TOTP_WINDOWS = (0, 1, 2, 5)
+HOTP_WINDOWS = (0, 2, 10)
+
+SECRET = bytearray(range(20))
+TIMESTAMP = 1414782000
+
+
+def iter_cases():
+    """
+    Yield (name, function) for every benchmark case
+    """
+    for algorithm in ALGORITHMS:
+        hash_function = OTPBase._get_algorithm(algorithm)
+        for n_digits in DIGITS:
+            suffix = '{}/{}'.format(algorithm, n_digits)
+            yield ('get_otp/' + suffix,
+                   _bind(OTPBase._get_otp, SECRET, 2**40, n_digits,
+                         hash_function))
+
+            totp = TOTP(SECRET, 'bench', 'user', n_digits=n_digits,
+                        algorithm=algorithm, time_source=lambda: TIMESTAMP)
+            # a wrong code checks the whole window, the worst case
+            wrong = totp.get_otp(TIMESTAMP + 3600)
+            for window in TOTP_WINDOWS:
+                yield ('totp_compare/{}/{}'.format(suffix, window),
+                       _bind(totp.compare, wrong, window))
+            wrong = totp.get_otp_int(TIMESTAMP + 3600)
+            for window in TOTP_WINDOWS:
+                yield ('totp_compare_int/{}/{}'.format(suffix, window),
+                       _bind(totp.compare_int, wrong, window))
+
+            hotp = HOTP(SECRET, 'bench', 'user', n_digits=n_digits,
+                        algorithm=algorithm, counter=1000)
+            wrong = hotp.get_otp(0)
+            for window in HOTP_WINDOWS:
+                yield ('hotp_compare/{}/{}'.format(suffix, window),
+                       _bind(hotp.compare, wrong, window))
+            wrong = hotp.get_otp_int(0)
+            for window in HOTP_WINDOWS:
+                yield ('hotp_compare_int/{}/{}'.format(suffix, window),
+                       _bind(hotp.compare_int, wrong, window))
+
+    totp = TOTP(SECRET, 'bench', 'user@example.org', n_digits=8,
+                algorithm='sha256', period=60)
+    hotp = HOTP(SECRET, 'bench', 'user@example.org', counter=1000)
+    for otp_type, otp in (('totp', totp), ('hotp', hotp)):
+        uri = otp.get_uri()
+        yield 'get_uri/' + otp_type, otp.get_uri
+        yield 'from_uri/' + otp_type, _bind(from_uri, uri)
+
+    yield 'int_to_bytearray', _bind(int_to_bytearray, 2**40 + 12345)
+    yield 'bytes_to_31_bit_int', _bind(bytes_to_31_bit_int,
+                                       bytearray(b'\x9f\x12\x34\x56'))
+
+
+def _bind(function, *args):
+    return lambda: function(*args)
+
+
+def ops_per_second(function, min_time, repeat):
+    """
+    Return calls per second, from the fastest of repeat timed runs,
+    each of which runs for at least about min_time seconds
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return number / min(timer.repeat(repeat, number))
+
+
+def peak_alloc_bytes(function):
+    """
+    Return the most memory allocated at once while function runs,
+    beyond what was allocated before it was called
+    """
+    function()  # warm up any caches
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def run(name_filter=None, min_time=0.05, repeat=3):
+    """
+    Run every case whose name contains name_filter, and return
+    {name: {'ops_per_sec': float, 'alloc_bytes': int}}
+    """
+    results = {}
+    for name, function in iter_cases():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = {
+            'ops_per_sec': ops_per_second(function, min_time, repeat),
+            'alloc_bytes': peak_alloc_bytes(function),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return (name, metric, baseline value, new value) for each case
+    that got worse than the baseline by more than tolerance
+    """
+    regressions = []
+    for name, new in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if new['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            regressions.append((name, 'ops_per_sec',
+                                old['ops_per_sec'], new['ops_per_sec']))
+        if new['alloc_bytes'] > old['alloc_bytes'] * (1 + tolerance):
+            regressions.append((name, 'alloc_bytes',
+                                old['alloc_bytes'], new['alloc_bytes']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.bench_hotpaths',
+        description="Benchmark the OTP hot paths.")
+    parser.add_argument('-o', '--output',
+                        help="write the results to this JSON file")
+    parser.add_argument('-b', '--baseline',
+                        help="compare against results saved with --output")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help="allowed fractional regression (default: 0.1)")
+    parser.add_argument('-k', '--filter',
+                        help="only run cases whose name contains this")
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help="seconds each timed run lasts at least")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="timed runs per case, of which the best is kept")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.min_time, args.repeat)
+
+    print('{:<32} {:>14} {:>12}'.format('case', 'ops/sec', 'alloc (B)'))
+    for name, result in sorted(results.items()):
+        print('{:<32} {:>14.0f} {:>12d}'.format(
+            name, result['ops_per_sec'], result['alloc_bytes']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'implementation': platform.python_implementation(),
+                       'results': results},
+                      f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, new in regressions:
+            print('REGRESSION {} {}: {:.0f} -> {:.0f}'.format(
+                name, metric, old, new))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
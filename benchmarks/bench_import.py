@@ -0,0 +1,49 @@
+"""
+Compare how long a fresh process takes to import spookyotp, now that
+qrcode is only loaded when a QR code is rendered, against importing
+it together with qrcode (and PIL, if installed) as it used to.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import [N_RUNS]
+"""
+from __future__ import print_function
+from __future__ import division
+import os
+import subprocess
+import sys
+import timeit
+
+
+STATEMENTS = [
+    ('python', 'pass'),
+    ('spookyotp', 'import spookyotp'),
+    ('+ qrcode', 'import spookyotp, qrcode, qrcode.image.pil'),
+]
+
+
+def time_import(statement, n_runs):
+    """
+    Return the fastest of n_runs fresh interpreters running statement
+    """
+    command = [sys.executable, '-c', statement]
+    with open(os.devnull, 'w') as devnull:
+        return min(timeit.repeat(
+            lambda: subprocess.check_call(command, stderr=devnull),
+            number=1, repeat=n_runs))
+
+
+def main():
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print('{:<12} {:>12}'.format('import', 'startup (ms)'))
+    for name, statement in STATEMENTS:
+        try:
+            elapsed = time_import(statement, n_runs)
+        except subprocess.CalledProcessError:
+            print('{:<12} {:>12}'.format(name, 'unavailable'))
+            continue
+        print('{:<12} {:>12.1f}'.format(name, 1e3 * elapsed))
+
+
+if __name__ == '__main__':
+    main()
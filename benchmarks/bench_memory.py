@@ -0,0 +1,63 @@
+"""
+Compare the memory used by many TOTP objects against the same
+credentials stored in a CredentialTable.
+
+Memory is measured with tracemalloc, which doesn't see what OpenSSL
+allocates for each TOTP's pre-keyed HMAC, so the real cost of the
+objects is somewhat higher than reported.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory [N_CREDENTIALS]
+"""
+from __future__ import print_function
+from __future__ import division
+import gc
+import sys
+import tracemalloc
+
+from spookyotp.otp import TOTP, get_random_secret
+from spookyotp.table import CredentialTable
+
+
+def measure(build):
+    """
+    Return the bytes still allocated after build() runs, and its result
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    n_credentials = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    secrets = [get_random_secret(20) for _ in range(n_credentials)]
+
+    def build_objects():
+        return [TOTP(secret, 'Example', 'user{}'.format(i))
+                for i, secret in enumerate(secrets)]
+
+    def build_table():
+        table = CredentialTable()
+        for i, secret in enumerate(secrets):
+            table.append(TOTP(secret, 'Example', 'user{}'.format(i)))
+        return table
+
+    objects_bytes, objects = measure(build_objects)
+    del objects
+    table_bytes, table = measure(build_table)
+
+    print('{} credentials'.format(n_credentials))
+    print('{:<18} {:>12} {:>12}'.format('layout', 'total (MB)', 'per row (B)'))
+    for name, used in (('TOTP objects', objects_bytes),
+                       ('CredentialTable', table_bytes)):
+        print('{:<18} {:>12.1f} {:>12.0f}'.format(name, used / 1e6,
+                                                  used / n_credentials))
+
+
+if __name__ == '__main__':
+    main()
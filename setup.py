@@ -32,6 +32,7 @@ setup(name='SpookyOTP',
       license='Apache2',
       packages=['spookyotp'],
       install_requires=['qrcode', 'six'],
+      extras_require={'numpy': ['numpy']},
       include_package_data=True,
       setup_requires=['wheel'],
       test_suite='nose.collector',
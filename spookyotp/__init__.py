@@ -2,6 +2,9 @@ from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
-from .otp import (HOTP, TOTP, get_random_secret, from_uri)
+from .otp import (HOTP, TOTP, get_random_secret, from_uri, verify_many,
+                  generate_many)
+from .replay import UsedCodeCache
 
-__all__ = ['HOTP', 'TOTP', 'get_random_secret', 'from_uri']
+__all__ = ['HOTP', 'TOTP', 'get_random_secret', 'from_uri',
+           'verify_many', 'generate_many', 'UsedCodeCache']
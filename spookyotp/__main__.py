@@ -0,0 +1,4 @@
+import sys
+from spookyotp.cli import main
+
+sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Check OTP codes from asyncio code without blocking the event loop.
+
+Requires Python 3.5 or newer, so it isn't imported by the spookyotp
+package; import it as spookyotp.aio.
+"""
+import asyncio
+import hmac
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from spookyotp.otp import OTPBase, HOTP, TOTP, constant_time_compare
+
+
+__all__ = ['AsyncVerifier', 'VerifierBusy']
+
+
+class VerifierBusy(RuntimeError):
+    """
+    Raised when too many checks are already waiting to run
+    """
+
+
+def _first_match(keyed_hmac, n_digits, code, counters):
+    """
+    Return the first counter whose code matches, or None
+    """
+    for counter in counters:
+        valid = OTPBase._get_keyed_otp(keyed_hmac, counter, n_digits)
+        if constant_time_compare(code, valid):
+            return counter
+    return None
+
+
+def _first_match_rekeyed(secret, algorithm_name, n_digits, code, counters):
+    """
+    Like _first_match, but keys the HMAC here, since pre-keyed HMACs
+    can't be sent to another process.
+    """
+    algorithm = OTPBase._get_algorithm(algorithm_name)
+    keyed_hmac = hmac.new(secret, None, algorithm)
+    return _first_match(keyed_hmac, n_digits, code, counters)
+
+
+class AsyncVerifier(object):
+    """
+    Runs TOTP/HOTP checks in an executor, so the HMAC work doesn't
+    block the event loop.
+
+    At most max_concurrency checks run at once; the rest wait their
+    turn. If max_waiting is set, checks beyond that many waiting raise
+    VerifierBusy right away so the caller can shed load. stats() reports
+    the queue depth and latencies.
+
+    HOTP checks for the same HOTP object run one at a time, in the
+    order they were made, so counter updates are never lost or
+    applied out of order. Checks waiting for an earlier one on the
+    same HOTP count as waiting too. The counter itself is only updated
+    back on the event loop, which also makes a process pool safe to use.
+
+    The codes are computed directly from the OTP's parameters, so
+    overrides of get_otp and HOTP resync indexes aren't used.
+    """
+
+    def __init__(self, executor=None, max_concurrency=16, max_waiting=None):
+        """
+        Args:
+          executor (concurrent.futures.Executor, optional): Where to run
+                    the HMAC work (default: the event loop's default
+                    thread pool)
+          max_concurrency (int, optional): The most checks to run at
+                                           once (default: 16)
+          max_waiting (int, optional): The most checks allowed to wait
+                                       for a turn before VerifierBusy is
+                                       raised (default: no limit)
+        """
+        if max_concurrency < 1:
+            raise ValueError("Max concurrency must be positive")
+        self._executor = executor
+        self._in_process_pool = isinstance(executor, ProcessPoolExecutor)
+        self._max_concurrency = max_concurrency
+        self._max_waiting = max_waiting
+        self._semaphore = None
+        self._hotp_locks = weakref.WeakKeyDictionary()
+        self._waiting = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def stats(self):
+        """
+        Return a dict of counters describing the work done so far:
+          waiting: checks waiting for a turn
+          in_flight: checks running right now
+          completed: checks that have finished
+          rejected: checks refused with VerifierBusy
+          mean_latency, max_latency: seconds from the call to the
+                                     result, including time waiting
+        """
+        mean_latency = (self._total_latency / self._completed
+                        if self._completed else 0.0)
+        return {
+            'waiting': self._waiting,
+            'in_flight': self._in_flight,
+            'completed': self._completed,
+            'rejected': self._rejected,
+            'mean_latency': mean_latency,
+            'max_latency': self._max_latency,
+        }
+
+    async def compare(self, otp, code, **kwargs):
+        """
+        Like otp.compare, but doesn't block the event loop.
+        Keyword arguments are passed on to verify.
+        """
+        return (await self.verify(otp, code, **kwargs)) is not None
+
+    async def verify(self, otp, code, max_step_difference=1, look_ahead=2,
+                     used_codes=None):
+        """
+        Like otp.verify, but doesn't block the event loop.
+
+        Args:
+          otp (TOTP or HOTP): The OTP to check the code against
+          code (str): The code to check
+          max_step_difference (int, optional): Used for TOTPs, as in
+                                               TOTP.verify (default: 1)
+          look_ahead (int, optional): Used for HOTPs, as in HOTP.verify
+                                      (default: 2)
+          used_codes (UsedCodeCache, optional): Used for TOTPs, as in
+                                                TOTP.verify
+        """
+        if isinstance(otp, TOTP):
+            if max_step_difference < 0:
+                raise ValueError("Max step difference must be non-negative")
+            otp._validate_code(code)
+            return await self._verify_totp(otp, code, max_step_difference,
+                                           used_codes)
+        if isinstance(otp, HOTP):
+            if look_ahead < 0:
+                raise ValueError("Look-ahead must be non-negative")
+            otp._validate_code(code)
+            return await self._verify_hotp(otp, code, look_ahead)
+        raise TypeError("Can only verify TOTP or HOTP codes")
+
+    async def _verify_totp(self, otp, code, max_step_difference, used_codes):
+        step = int(otp._current_timestamp()) // otp._period
+        # the TOTP's own window, so drift tracking is respected
+        counters = [step + offset
+                    for offset in otp._window(max_step_difference)]
+        matched = await self._run(otp, code, counters)
+        if matched is None:
+            return None
+        return otp._consume(matched - step, step, max_step_difference,
+                            used_codes)
+
+    async def _verify_hotp(self, otp, code, look_ahead):
+        lock = self._hotp_locks.get(otp)
+        if lock is None:
+            lock = self._hotp_locks[otp] = asyncio.Lock()
+        # admitted before queueing on the lock, so checks piling up
+        # behind one HOTP are counted and shed like any others
+        started = time.monotonic()
+        self._admit()
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._waiting -= 1
+            raise
+        try:
+            counter = otp.counter
+            counters = range(counter, counter + look_ahead + 1)
+            matched = await self._run(otp, code, counters, started)
+            # a compare-and-swap, since sync verify calls on the same
+            # HOTP don't take this lock
+            if matched is None or not otp._advance_counter(matched + 1):
+                return None
+            return matched - counter
+        finally:
+            lock.release()
+
+    def _admit(self):
+        """
+        Count a check as waiting, or raise VerifierBusy if too many are
+        """
+        if self._max_waiting is not None and (
+                self._waiting >= self._max_waiting):
+            self._rejected += 1
+            raise VerifierBusy("Too many checks waiting")
+        self._waiting += 1
+
+    async def _run(self, otp, code, counters, started=None):
+        """
+        Find the first matching counter in the executor, respecting
+        the concurrency and queue limits. If started is given, the
+        check was already admitted at that time.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        if self._in_process_pool:
+            job = (_first_match_rekeyed, bytes(otp._secret),
+                   otp._algorithm_name, otp._n_digits, code, counters)
+        else:
+            job = (_first_match, otp._hmac, otp._n_digits, code, counters)
+
+        loop = asyncio.get_event_loop()
+        if started is None:
+            started = time.monotonic()
+            self._admit()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(self._executor, *job)
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            latency = time.monotonic() - started
+            self._completed += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import io
+from itertools import islice
+import re
+from six import string_types
+from spookyotp.otp import OTPBase, _DeferredSecret
+from spookyotp.pool import starmap_in_pool
+
+
+__all__ = ['iter_uris', 'load_uri_file']
+
+
+# What base64.b32decode accepts: whole 8-character groups of A-Z and
+# 2-7, the last of which may end in valid padding
+_BASE32 = re.compile(r'(?:[A-Z2-7]{8})*'
+                     r'(?:[A-Z2-7]{2}={6}|[A-Z2-7]{4}={4}|'
+                     r'[A-Z2-7]{5}={3}|[A-Z2-7]{7}=)?\Z')
+
+
+def iter_uris(lines, on_error=None, lazy=True, workers=None,
+              chunk_size=1000, max_in_flight=None):
+    """
+    Build TOTP/HOTP objects from otpauth:// URIs, one per line,
+    yielding them as they're parsed rather than all at once.
+
+    Blank lines are skipped. Malformed lines, including ones whose
+    secret isn't valid base32, don't stop the load: they are passed to
+    on_error (if given) and skipped. By default, secrets are only
+    checked while loading, and aren't decoded until each object is
+    first used.
+
+    With more than one worker, lines are parsed in chunks in a process
+    pool, with at most max_in_flight chunks submitted ahead of the one
+    being yielded. Objects are still built, and yielded in order,
+    in this process.
+
+    Args:
+      lines (iterable): URIs, one per item, such as an open file
+      on_error (function, optional): Called as
+                                     on_error(line_number, line, error)
+                                     for each malformed line. line_number
+                                     counts from 1.
+      lazy (bool, optional): Decode secrets on first use (default: True)
+      workers (int, optional): The number of processes to parse with.
+                               None or 1 parses in this process
+                               (default: None)
+      chunk_size (int, optional): How many lines each chunk of work
+                                  parses (default: 1000)
+      max_in_flight (int, optional): The most chunks submitted to the
+                                     pool at once (default: 2 * workers)
+    """
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+    chunks = _iter_chunks(lines, chunk_size)
+    parsed_chunks = starmap_in_pool(_parse_chunk,
+                                    ((chunk,) for chunk in chunks),
+                                    workers, max_in_flight)
+
+    for parsed_chunk in parsed_chunks:
+        for line_number, line, otp_type, parameters in parsed_chunk:
+            try:
+                if otp_type is None:
+                    raise parameters
+                otp_class = OTPBase._otp_type_lookup[otp_type]
+                if lazy:
+                    parameters['secret'] = _DeferredSecret(
+                        parameters['secret'])
+                otp = otp_class(**parameters)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(line_number, line, e)
+                continue
+            yield otp
+
+
+def load_uri_file(path, **kwargs):
+    """
+    Like iter_uris, but reads the URIs from the named file.
+    Keyword arguments are passed on to iter_uris.
+    """
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for otp in iter_uris(f, **kwargs):
+            yield otp
+
+
+def _iter_chunks(lines, chunk_size):
+    """
+    Yield lists of (line number, line) for non-blank lines
+    """
+    numbered = ((i, line.strip()) for i, line in enumerate(lines, 1))
+    numbered = (pair for pair in numbered if pair[1])
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_chunk(chunk):
+    """
+    Parse a chunk of numbered lines. For lines that can't be parsed,
+    the OTP type is None and the exception takes the place of the
+    parameters. Module-level so it can be sent to a process pool.
+    """
+    parsed = []
+    for line_number, line in chunk:
+        try:
+            otp_type, parameters = OTPBase._parse_uri(line)
+            if otp_type not in OTPBase._otp_type_lookup:
+                raise ValueError("Unknown OTP type '{}'".format(otp_type))
+            if 'secret' not in parameters:
+                raise ValueError("URI has no secret")
+            secret = parameters['secret']
+            if not (isinstance(secret, string_types) and
+                    _BASE32.match(secret)):
+                raise ValueError("Secret is not valid base32")
+        except Exception as e:
+            otp_type, parameters = None, e
+        parsed.append((line_number, line, otp_type, parameters))
+    return parsed
@@ -2,9 +2,24 @@ from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
+import struct
+from six import indexbytes
 
 
-__all__ = ['int_to_bytearray', 'bytes_to_31_bit_int']
+__all__ = ['int_to_bytearray', 'bytes_to_31_bit_int', 'pack_counter',
+           'dynamic_truncate', 'truncate_digest', 'truncate_digest_int',
+           'format_code', 'truncate_digests']
+
+
+_UINT64 = struct.Struct(str('>Q'))
+_UINT32 = struct.Struct(str('>I'))
+# n_digits -> (10**n_digits, function formatting an int to n digits)
+_CODE_FORMATS = {}
+# The numpy module, None if it isn't installed, or _NOT_LOADED until
+# truncate_digests first needs it. Loading NumPy takes far longer than
+# loading the rest of the package, so it isn't done on import.
+_NOT_LOADED = object()
+_np = _NOT_LOADED
 
 
 def int_to_bytearray(number):
@@ -18,12 +33,7 @@ def int_to_bytearray(number):
         raise TypeError("Number must be an integer.")
     if number < 0:
         raise ValueError("Number must be greater than 0.")
-    mask = 0xff
-    shifts = (8*i for i in range(7, -1, -1))
-    result = []
-    for shift in shifts:
-        result.append((number >> shift) & mask)
-    return bytearray(result)
+    return bytearray(_UINT64.pack(number))
 
 
 def bytes_to_31_bit_int(as_bytes):
@@ -40,3 +50,143 @@ def bytes_to_31_bit_int(as_bytes):
                (as_bytes[-2] << 1*8) +
                (as_bytes[-1] << 0*8))
     return as_int
+
+
+def pack_counter(number):
+    """
+    Return a 64-bit number as 8 big-endian bytes. Like
+    int_to_bytearray, but packs directly into a bytes object.
+    """
+    try:
+        return _UINT64.pack(number)
+    except struct.error:
+        # raise the same errors int_to_bytearray would
+        int_to_bytearray(number)
+        raise
+
+
+def dynamic_truncate(digest):
+    """
+    Apply the dynamic truncation from RFC 4226 to one HMAC digest and
+    return the 31-bit integer it selects, before reducing it to a
+    number of digits.
+
+    The value is read straight out of the digest, which can be bytes,
+    a bytearray or a memoryview, without copying it.
+    """
+    offset = indexbytes(digest, -1) & 0x0f
+    if offset + 4 <= len(digest):
+        return _UINT32.unpack_from(digest, offset)[0] & 0x7fffffff
+    # digests shorter than 20 bytes (MD5) can run off the end
+    return bytes_to_31_bit_int(digest[offset:offset + 4])
+
+
+def truncate_digest(digest, n_digits):
+    """
+    Apply the dynamic truncation from RFC 4226 to one HMAC digest and
+    return the zero-padded n-digit code.
+    """
+    modulus, code_format = _code_format(n_digits)
+    return code_format(dynamic_truncate(digest) % modulus)
+
+
+def truncate_digest_int(digest, n_digits):
+    """
+    Like truncate_digest, but return the code as an integer
+    (less than 10**n_digits) instead of formatting it
+    """
+    return dynamic_truncate(digest) % _code_format(n_digits)[0]
+
+
+def format_code(code, n_digits):
+    """
+    Return an integer code as the zero-padded n-digit string a user sees
+    """
+    return _code_format(n_digits)[1](code)
+
+
+def _code_format(n_digits):
+    """
+    Return (10**n_digits, function formatting an int to n digits)
+    """
+    try:
+        return _CODE_FORMATS[n_digits]
+    except KeyError:
+        return _CODE_FORMATS.setdefault(
+            n_digits, (10**n_digits, '{{:0{}d}}'.format(n_digits).format))
+
+
+def truncate_digests(digests, n_digits):
+    """
+    Apply the dynamic truncation from RFC 4226 to many HMAC digests
+    at once and return the zero-padded n-digit codes.
+
+    If NumPy is installed, the truncation, masking, modulo and digit
+    formatting are all done as array operations, and the result is a
+    contiguous NumPy array of unicode strings. Otherwise, this falls
+    back to pure Python and returns a list of strings.
+
+    Args:
+      digests: A 2-D uint8 array with one digest per row, or a sequence
+               of equal-length digests as bytes
+      n_digits (int): The number of digits in each code
+    """
+    np = _numpy()
+    if np is None:
+        return [truncate_digest(digest, n_digits) for digest in digests]
+    return _truncate_digests_numpy(np, digests, n_digits)
+
+
+def _numpy():
+    """
+    Return the numpy module, importing it on first use,
+    or None if it isn't installed
+    """
+    global _np
+    if _np is _NOT_LOADED:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def _truncate_digests_numpy(np, digests, n_digits):
+    if not isinstance(digests, np.ndarray):
+        digests = list(digests)
+        if not digests:
+            return np.empty(0, dtype='U{}'.format(n_digits))
+        joined = b''.join(bytes(digest) for digest in digests)
+        digests = np.frombuffer(joined, dtype=np.uint8).reshape(len(digests),
+                                                                -1)
+    if digests.ndim != 2:
+        raise ValueError("Digests must be a 2-D array")
+    if len(digests) == 0:
+        return np.empty(0, dtype='U{}'.format(n_digits))
+
+    width = digests.shape[1]
+    offsets = (digests[:, -1] & 0x0f).astype(np.intp)
+    rows = np.arange(len(digests))[:, np.newaxis]
+    indexes = offsets[:, np.newaxis] + np.arange(4)
+    # digests shorter than 20 bytes (MD5) can run off the end; like
+    # bytes_to_31_bit_int, read the bytes there are as a big-endian
+    # number, as if zero-padded on the left
+    in_range = indexes < width
+    window = digests[rows, np.minimum(indexes, width - 1)]
+    window = np.where(in_range, window, 0).astype(np.uint64)
+    as_int = ((window[:, 0] << 24) |
+              (window[:, 1] << 16) |
+              (window[:, 2] << 8) |
+              window[:, 3])
+    missing = (4 - in_range.sum(axis=1)).astype(np.uint64)
+    as_int = (as_int >> (np.uint64(8) * missing)) & np.uint64(0x7fffffff)
+    codes = as_int % np.uint64(10**n_digits)
+
+    # pull out each decimal digit, most significant first, and view the
+    # resulting code points as fixed-width unicode strings
+    powers = np.uint64(10) ** np.arange(n_digits - 1, -1, -1, dtype=np.uint64)
+    code_points = (codes[:, np.newaxis] // powers) % np.uint64(10)
+    code_points = np.ascontiguousarray(code_points.astype(np.uint32) +
+                                       ord('0'))
+    return code_points.view('U{}'.format(n_digits)).ravel()
@@ -0,0 +1,463 @@
+"""
+Stream TOTP/HOTP work over stdin and stdout, for jobs too big or too
+routine for a one-off script:
+
+    python -m spookyotp generate < accounts.jsonl
+    python -m spookyotp verify --input-format csv < attempts.csv
+    python -m spookyotp uri-export < parameters.jsonl
+    python -m spookyotp uri-import --input-format uris < uris.txt
+    python -m spookyotp enroll ISSUER ARCHIVE < accounts.txt
+
+Each input record is a JSON object per line (jsonl), a CSV row with a
+header (csv), or a bare otpauth:// URI per line (uris). Every record is
+written back out with the command's fields added:
+
+    generate    needs uri, optionally timestamp (TOTP) or counter
+                (HOTP); adds code
+    verify      needs uri and code (a string, or a JSON number that is
+                zero-padded to the code's length); adds valid, and
+                for HOTPs the counter after the check, to store
+    uri-export  needs secret (base32) and issuer, optionally type,
+                account, digits, algorithm, period and counter;
+                adds uri
+    uri-import  needs uri; adds type, secret, issuer, account, digits,
+                algorithm, and period or counter
+
+A record that can't be processed gets an error field instead, and the
+rest carry on. Records are handled in chunks, optionally in a process
+pool, so memory use doesn't grow with the input. A summary with the
+throughput is written to stderr at the end.
+
+enroll reads account names, one per line, and writes new TOTP secrets
+with their QR codes to an archive; see spookyotp.enroll.enroll.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import argparse
+import base64
+import csv
+import io
+from itertools import islice
+import json
+import sys
+import time
+from six import integer_types
+from spookyotp.byte_util import format_code
+from spookyotp.otp import OTPBase, TOTP, from_uri, verify_many
+from spookyotp.pool import starmap_in_pool
+
+
+__all__ = ['run', 'main']
+
+
+def _generate(records, options):
+    now = options['timestamp']
+    if now is None:
+        now = time.time()
+    totps = {}
+    for record in records:
+        otp = _load(record, totps)
+        if isinstance(otp, TOTP):
+            timestamp = record.get('timestamp')
+            record['code'] = otp.get_otp(now if timestamp in (None, '')
+                                         else float(timestamp))
+        else:
+            counter = record.get('counter')
+            record['code'] = otp.get_otp(None if counter in (None, '')
+                                         else int(counter),
+                                         auto_increment=False)
+
+
+def _verify(records, options):
+    totps = {}
+    items = []
+    for record in records:
+        try:
+            otp = _load(record, totps)
+            items.append((record, otp, _code_text(record['code'], otp)))
+        except Exception as e:
+            _set_error(record, e)
+    results = verify_many([(otp, code) for _, otp, code in items],
+                          options['timestamp'], options['window'],
+                          options['look_ahead'])
+    for (record, otp, _), valid in zip(items, results):
+        record['valid'] = valid
+        if not isinstance(otp, TOTP):
+            # advanced past a match, so the caller can store it
+            record['counter'] = otp.counter
+
+
+def _uri_export(records, options):
+    for record in records:
+        otp_class = OTPBase._otp_type_lookup[record.get('type') or 'totp']
+        parameters = dict((name, record[field])
+                          for name, field in (('account', 'account'),
+                                              ('algorithm', 'algorithm'),
+                                              ('n_digits', 'digits'),
+                                              ('period', 'period'),
+                                              ('counter', 'counter'))
+                          if record.get(field) not in (None, ''))
+        otp = otp_class(record['secret'], record['issuer'], **parameters)
+        record['uri'] = otp.get_uri()
+
+
+def _uri_import(records, options):
+    for record in records:
+        otp = from_uri(record['uri'])
+        record['type'] = otp._otp_type
+        record['secret'] = base64.b32encode(bytes(otp._secret)) \
+            .decode('ascii')
+        record['issuer'] = otp._issuer
+        record['account'] = otp._account
+        record['digits'] = otp._n_digits
+        record['algorithm'] = otp._algorithm_name
+        if isinstance(otp, TOTP):
+            record['period'] = otp._period
+        else:
+            record['counter'] = otp.counter
+
+
+# command -> (function, fields it adds, whether it handles errors itself)
+_COMMANDS = {
+    'generate': (_generate, ['code'], False),
+    'verify': (_verify, ['valid', 'counter'], True),
+    'uri-export': (_uri_export, ['uri'], False),
+    'uri-import': (_uri_import, ['type', 'secret', 'issuer', 'account',
+                                 'digits', 'algorithm', 'period', 'counter'],
+                   False),
+}
+
+
+def _load(record, totps):
+    """
+    Build the OTP for a record's URI. TOTPs are reused within a chunk;
+    HOTPs are built fresh so each record starts from its own counter.
+    """
+    uri = record['uri']
+    otp = totps.get(uri)
+    if otp is None:
+        otp = from_uri(uri)
+        if isinstance(otp, TOTP):
+            totps[uri] = otp
+    return otp
+
+
+def _code_text(code, otp):
+    """
+    Return a record's code as text. JSON numbers are zero-padded back to
+    the OTP's length, since a leading zero is lost when a code is
+    written as a number.
+    """
+    if isinstance(code, type('')):
+        return code
+    if isinstance(code, bool) or not isinstance(code, integer_types):
+        raise TypeError("Codes must be strings or integers")
+    if code < 0:
+        raise ValueError("'{}' is not a valid OTP code".format(code))
+    return format_code(code, otp._n_digits)
+
+
+def _set_error(record, error):
+    record['error'] = '{}: {}'.format(type(error).__name__, error)
+
+
+def _run_chunk(command, options, records):
+    """
+    Process a chunk of records, returning them with fields added.
+    Module-level so it can be sent to a process pool.
+    """
+    function, _, handles_errors = _COMMANDS[command]
+    # records that couldn't even be read already have an error
+    pending = [record for record in records if 'error' not in record]
+    if handles_errors:
+        function(pending, options)
+        return records
+    for record in pending:
+        try:
+            function([record], options)
+        except Exception as e:
+            _set_error(record, e)
+    return records
+
+
+def _iter_chunks(records, chunk_size):
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_records(f, input_format):
+    """
+    Return (field names or None, iterator of record dicts)
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(f)
+        return reader.fieldnames or [], reader
+    lines = (line.strip() for line in f)
+    lines = (line for line in lines if line)
+    if input_format == 'uris':
+        return ['uri'], ({'uri': line} for line in lines)
+    return None, (_parse_json(line) for line in lines)
+
+
+def _parse_json(line):
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("Records must be JSON objects")
+    except ValueError as e:
+        record = {'line': line}
+        _set_error(record, e)
+    return record
+
+
+class _CSVWriter(object):
+    """
+    Writes records as CSV rows: the input fields (if known), then the
+    fields the command adds. JSON lines input has no fixed fields, so
+    the columns are taken from the keys in the first chunk of records;
+    keys that first appear in later chunks are left out.
+    """
+
+    def __init__(self, f, fields, added_fields):
+        self._buf = io.StringIO()
+        self._f = f
+        self._added_fields = added_fields
+        self._writer = None
+        if fields is not None:
+            self._start(fields)
+
+    def _start(self, fields):
+        fields = list(fields)
+        for field in self._added_fields + ['error']:
+            if field not in fields:
+                fields.append(field)
+        self._writer = csv.DictWriter(self._buf, fields, restval='',
+                                      extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, records):
+        if self._writer is None:
+            added = self._added_fields + ['error']
+            fields = []
+            for record in records:
+                fields.extend(key for key in record
+                              if key not in fields and key not in added)
+            self._start(fields)
+        self._writer.writerows(records)
+        self._f.write(self._buf.getvalue())
+        self._buf.seek(0)
+        self._buf.truncate()
+
+
+class _JSONLWriter(object):
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, records):
+        self._f.write(''.join(json.dumps(record) + '\n'
+                              for record in records))
+
+
+class _URIWriter(object):
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, records):
+        self._f.write(''.join(record['uri'] + '\n' for record in records
+                              if record.get('uri')))
+
+
+def run(command, input_file, output_file, input_format='jsonl',
+        output_format='jsonl', workers=None, chunk_size=1000,
+        max_in_flight=None, **options):
+    """
+    Stream records from input_file through a command to output_file,
+    in order. Returns (records processed, records with errors).
+
+    Args:
+      command (str): 'generate', 'verify', 'uri-export' or 'uri-import'
+      input_file (file): Text file to read records from
+      output_file (file): Text file to write records to
+      input_format (str, optional): 'jsonl', 'csv' or 'uris'
+                                    (default: 'jsonl')
+      output_format (str, optional): 'jsonl', 'csv' or 'uris'
+                                     (default: 'jsonl')
+      workers (int, optional): The number of processes to work in.
+                               None or 1 works in this process
+                               (default: None)
+      chunk_size (int, optional): How many records each chunk of work
+                                  holds, and how many are written at
+                                  once (default: 1000)
+      max_in_flight (int, optional): The most chunks submitted to the
+                                     pool at once (default: 2 * workers)
+      timestamp (float, optional): For generate and verify, the time to
+                                   use for TOTPs (default: now)
+      window (int, optional): For verify, the TOTP max step difference
+                              (default: 1)
+      look_ahead (int, optional): For verify, the HOTP look-ahead
+                                  (default: 2)
+    """
+    if command not in _COMMANDS:
+        raise ValueError("Unknown command '{}'".format(command))
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+    options.setdefault('timestamp', None)
+    options.setdefault('window', 1)
+    options.setdefault('look_ahead', 2)
+    if options['window'] < 0:
+        raise ValueError("Window must be non-negative")
+    if options['look_ahead'] < 0:
+        raise ValueError("Look-ahead must be non-negative")
+
+    fields, records = _read_records(input_file, input_format)
+    if output_format == 'csv':
+        writer = _CSVWriter(output_file, fields, _COMMANDS[command][1])
+    elif output_format == 'uris':
+        writer = _URIWriter(output_file)
+    else:
+        writer = _JSONLWriter(output_file)
+
+    chunks = _iter_chunks(records, chunk_size)
+    done = starmap_in_pool(_run_chunk,
+                           ((command, options, chunk) for chunk in chunks),
+                           workers, max_in_flight)
+    n_records = n_errors = 0
+    for chunk in done:
+        writer.write(chunk)
+        n_records += len(chunk)
+        n_errors += sum(1 for record in chunk if 'error' in record)
+    return n_records, n_errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m spookyotp',
+        description="Generate or check codes, or convert credentials to "
+                    "and from otpauth:// URIs, streaming records from "
+                    "stdin to stdout. Or enroll a list of accounts.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    records = argparse.ArgumentParser(add_help=False)
+    records.add_argument('-i', '--input', default='-',
+                         help="file to read records from (default: stdin)")
+    records.add_argument('-o', '--output', default='-',
+                         help="file to write records to (default: stdout)")
+    records.add_argument('--input-format', choices=('jsonl', 'csv', 'uris'),
+                         default='jsonl', help="format of the input records")
+    records.add_argument('--output-format', choices=('jsonl', 'csv', 'uris'),
+                         default='jsonl',
+                         help="format of the output records")
+    records.add_argument('-w', '--workers', type=int, default=None,
+                         help="processes to work in")
+    records.add_argument('--chunk-size', type=_positive_int, default=1000,
+                         help="records per chunk of work")
+    records.add_argument('--timestamp', type=float, default=None,
+                         help="time to generate or check TOTP codes at "
+                              "(default: now)")
+    records.add_argument('--window', type=_non_negative_int, default=1,
+                         help="TOTP steps either side of now to accept")
+    records.add_argument('--look-ahead', type=_non_negative_int, default=2,
+                         help="HOTP counters ahead to accept")
+    for command in sorted(_COMMANDS):
+        subparsers.add_parser(command, parents=[records])
+
+    enroll = subparsers.add_parser(
+        'enroll',
+        help="create TOTP secrets for a list of accounts, and write their "
+             "QR codes and a manifest to an archive")
+    enroll.add_argument('issuer', help="the issuer for every account")
+    enroll.add_argument('archive',
+                        help="the archive to write (.zip, .tar, .tar.gz, "
+                             ".tgz, .tar.bz2 or .tar.xz)")
+    enroll.add_argument('-i', '--input', default='-',
+                        help="file of account names, one per line "
+                             "(default: stdin)")
+    enroll.add_argument('-f', '--format', choices=('png', 'svg'),
+                        default='png', help="QR code image format")
+    enroll.add_argument('-w', '--workers', type=int, default=None,
+                        help="processes to render QR codes with")
+    enroll.add_argument('--chunk-size', type=int, default=100,
+                        help="QR codes rendered per chunk of work")
+    enroll.add_argument('--digits', type=int, default=6,
+                        help="digits in each code")
+    enroll.add_argument('--algorithm', default='sha1',
+                        help="hash algorithm")
+    enroll.add_argument('--period', type=int, default=30,
+                        help="seconds each code is valid")
+    enroll.add_argument('--secret-bytes', type=int, default=10,
+                        help="length of each secret")
+    args = parser.parse_args(argv)
+
+    if args.command == 'enroll':
+        return _enroll(args)
+    started = time.time()
+    input_file = _open(args.input, 'r', sys.stdin)
+    try:
+        output_file = _open(args.output, 'w', sys.stdout)
+        try:
+            n_records, n_errors = run(
+                args.command, input_file, output_file,
+                input_format=args.input_format,
+                output_format=args.output_format, workers=args.workers,
+                chunk_size=args.chunk_size, timestamp=args.timestamp,
+                window=args.window, look_ahead=args.look_ahead)
+            output_file.flush()
+        finally:
+            if output_file is not sys.stdout:
+                output_file.close()
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    elapsed = time.time() - started
+    print("{}: {} records ({} errors) in {:.2f}s, {:.0f} records/s".format(
+        args.command, n_records, n_errors, elapsed,
+        n_records / elapsed if elapsed > 0 else 0), file=sys.stderr)
+    return 1 if n_errors else 0
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be positive")
+    return value
+
+
+def _non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("must be non-negative")
+    return value
+
+
+def _enroll(args):
+    # the QR code modules are only loaded when enrolling
+    from spookyotp.enroll import enroll
+    accounts = _open(args.input, 'r', sys.stdin)
+    try:
+        n_enrolled = enroll(accounts, args.archive, args.issuer,
+                            image_format=args.format, workers=args.workers,
+                            chunk_size=args.chunk_size,
+                            n_bytes=args.secret_bytes, n_digits=args.digits,
+                            algorithm=args.algorithm, period=args.period)
+    finally:
+        if accounts is not sys.stdin:
+            accounts.close()
+    print("Enrolled {} accounts".format(n_enrolled), file=sys.stderr)
+    return 0
+
+
+def _open(path, mode, default):
+    if path == '-':
+        return default
+    # newline='' so the csv module handles line endings itself
+    return io.open(path, mode, encoding='utf-8', newline='')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
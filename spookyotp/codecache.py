@@ -0,0 +1,181 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from collections import OrderedDict
+import threading
+
+
+__all__ = ['CodeCache']
+
+
+class CodeCache(object):
+    """
+    Remembers the TOTP codes computed for each credential and time step,
+    so credentials that are checked many times within one period only
+    compute each code once. Attach it to TOTPs with TOTP.set_code_cache;
+    one cache can be shared by any number of TOTPs.
+
+    Codes are keyed by the credential (see OTPBase._credential_key) and
+    time step, so different TOTP objects for the same credential share
+    entries. An entry expires once its time step is more than
+    retain_steps behind the current step of the TOTP it was computed
+    for, by that TOTP's own clock, which by default covers the step
+    before the current one that verify checks. As a hard cap, once
+    max_entries is reached the oldest entry is dropped to make room.
+
+    Keys are digests rather than secrets, but the cache does hold a
+    reference to each TOTP it has codes for, until they expire.
+    """
+
+    def __init__(self, max_entries=100000, retain_steps=1,
+                 thread_safe=False):
+        """
+        Args:
+          max_entries (int, optional): The most codes to keep
+                                       (default: 100000)
+          retain_steps (int, optional): Keep codes this many steps after
+                                        their own (default: 1)
+          thread_safe (bool, optional): Guard the cache with a lock so it
+                                        can be shared between threads
+                                        (default: False)
+        """
+        if max_entries < 1:
+            raise ValueError("Max entries must be positive")
+        if retain_steps < 0:
+            raise ValueError("Retain steps must be non-negative")
+        self._max_entries = int(max_entries)
+        self._retain_steps = int(retain_steps)
+        # key -> [code, time step, hits, otp]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock() if thread_safe else None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, otp, step):
+        """
+        Return the code for a TOTP at a time step, computing and
+        caching it if it isn't cached already.
+
+        Args:
+          otp (TOTP): The TOTP to get a code for
+          step (int): The time step (timestamp // period)
+        """
+        key = self._key(otp, step)
+        oldest = self._oldest_step(otp)
+        if self._lock is None:
+            return self._get(key, otp, step, oldest)
+        with self._lock:
+            entry = self._lookup(key, oldest)
+        if entry is not None:
+            return entry[0]
+        # compute outside the lock; at worst two threads both compute it
+        code = otp._get_keyed_otp(otp._hmac, step, otp._n_digits)
+        with self._lock:
+            self._store(key, code, otp, step, oldest)
+        return code
+
+    def _get(self, key, otp, step, oldest):
+        entry = self._lookup(key, oldest)
+        if entry is not None:
+            return entry[0]
+        code = otp._get_keyed_otp(otp._hmac, step, otp._n_digits)
+        self._store(key, code, otp, step, oldest)
+        return code
+
+    def precompute(self, lead=2.0, min_hits=2):
+        """
+        Compute the next step's code for every hot credential whose
+        current step ends within lead seconds, so the first checks after
+        the boundary are cache hits. Meant to be called periodically,
+        e.g. every second from a background thread.
+        Returns the number of codes computed.
+
+        Args:
+          lead (float, optional): How close to the end of its step a
+                                  credential must be, in seconds
+                                  (default: 2.0)
+          min_hits (int, optional): How many times a credential's current
+                                    code must have been looked up for it
+                                    to count as hot (default: 2)
+        """
+        if self._lock is None:
+            entries = list(self._entries.items())
+        else:
+            with self._lock:
+                entries = list(self._entries.items())
+
+        n_computed = 0
+        for (credential, step), entry in entries:
+            if entry[2] < min_hits:
+                continue
+            otp = entry[3]
+            period = otp._period
+            now = otp._current_timestamp()
+            if int(now) // period != step or (step + 1) * period - now > lead:
+                continue
+            key = (credential, step + 1)
+            if key in self._entries:
+                continue
+            code = otp._get_keyed_otp(otp._hmac, step + 1, otp._n_digits)
+            oldest = step - self._retain_steps
+            if self._lock is None:
+                self._store(key, code, otp, step + 1, oldest, 0)
+            else:
+                with self._lock:
+                    self._store(key, code, otp, step + 1, oldest, 0)
+            n_computed += 1
+        return n_computed
+
+    def clear(self):
+        """
+        Forget every cached code
+        """
+        self._entries.clear()
+
+    @staticmethod
+    def _key(otp, step):
+        return (otp._credential_key(), step)
+
+    def _oldest_step(self, otp):
+        """
+        Return the oldest time step still kept for a TOTP, by its clock
+        """
+        return (int(otp._current_timestamp()) // otp._period -
+                self._retain_steps)
+
+    def _lookup(self, key, oldest):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < oldest:
+            self.misses += 1
+            return None
+        entry[2] += 1
+        self.hits += 1
+        return entry
+
+    def _store(self, key, code, otp, step, oldest, hits=1):
+        self._expire()
+        if step < oldest:
+            # would already have expired
+            return
+        if key not in self._entries:
+            if len(self._entries) >= self._max_entries:
+                self._entries.popitem(last=False)
+        self._entries[key] = [code, step, hits, otp]
+
+    def _expire(self):
+        """
+        Drop entries from the oldest end until one is still live.
+        Entries are added roughly in time order, so this removes
+        nearly everything that has expired without a full scan.
+        """
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            entry = entries[key]
+            if entry[1] >= self._oldest_step(entry[3]):
+                break
+            del entries[key]
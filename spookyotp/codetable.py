@@ -0,0 +1,207 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import io
+import mmap
+import struct
+from spookyotp.byte_util import dynamic_truncate, pack_counter
+from spookyotp.otp import HOTP, TOTP
+from spookyotp.table import _TOTP, _HOTP
+from spookyotp.mapped import _ALGORITHMS
+
+
+__all__ = ['write_code_table', 'CodeTable']
+
+
+# The file starts with a header:
+#   magic (8 bytes), format version (uint16), OTP type (uint8; 0 TOTP,
+#   1 HOTP), algorithm (uint8; an index into mapped._ALGORITHMS),
+#   n_digits (uint8), code size in bytes (uint8; always 4),
+#   padding (2 bytes), period in seconds (uint32; 0 for HOTP),
+#   padding (4 bytes), first counter or time step (uint64),
+#   codes per row (uint64), row count (uint64)
+# followed by one row per credential, each holding that many codes for
+# consecutive counters or time steps as uint32s. Codes are stored as
+# integers; zero-pad them to n_digits to get the code a user sees.
+# All integers are little-endian.
+_MAGIC = b'SPKYCODE'
+_VERSION = 1
+_HEADER = struct.Struct(str('<8sHBBBB2xI4xQQQ'))
+_CODE = struct.Struct(str('<I'))
+_ROW_COUNT_OFFSET = 40
+_CHUNK_SIZE = 4096
+
+
+def write_code_table(path, otps, start, count):
+    """
+    Precompute codes for many credentials and write them to a file that
+    CodeTable can read. Rows are numbered in the order given, and each
+    row holds the codes for counters (HOTP) or time steps (TOTP) start
+    through start + count - 1. Returns the number of rows written.
+
+    Every credential in a table must have the same type, algorithm and
+    number of digits, and TOTPs the same period. Credentials are read
+    one at a time and each row is written as it's computed, so memory
+    use doesn't grow with the number of credentials.
+
+    Args:
+      path (str): The file to write, overwriting any existing one
+      otps (iterable): TOTPs or HOTPs
+      start (int): The first counter, or for TOTPs the first time step
+                   (timestamp // period)
+      count (int): How many codes to compute for each credential
+    """
+    if start < 0 or count < 0:
+        raise ValueError("Start and count must be non-negative")
+    header = None
+    n_rows = 0
+    with io.open(path, 'wb') as f:
+        for otp in otps:
+            fields = _header_fields(otp)
+            if header is None:
+                header = fields
+                f.write(_HEADER.pack(_MAGIC, _VERSION, *(fields +
+                                                         (start, count, 0))))
+            elif fields != header:
+                raise ValueError("Every credential in a code table must "
+                                 "have the same parameters")
+            _write_row(f, otp, start, count)
+            n_rows += 1
+        if header is None:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _TOTP, 0, 6,
+                                 _CODE.size, 30, start, count, 0))
+        # the row count goes in last, so a partly written file is empty
+        f.seek(_ROW_COUNT_OFFSET)
+        f.write(struct.pack(str('<Q'), n_rows))
+    return n_rows
+
+
+def _header_fields(otp):
+    """
+    Return the header fields from the OTP type through the period
+    """
+    if isinstance(otp, TOTP):
+        otp_type, period = _TOTP, otp._period
+    elif isinstance(otp, HOTP):
+        otp_type, period = _HOTP, 0
+    else:
+        raise TypeError("Can only write TOTP or HOTP credentials")
+    if otp._algorithm_name not in _ALGORITHMS:
+        raise ValueError("Can't store algorithm '{}'"
+                         .format(otp._algorithm_name))
+    return (otp_type, _ALGORITHMS.index(otp._algorithm_name), otp._n_digits,
+            _CODE.size, period)
+
+
+def _write_row(f, otp, start, count):
+    keyed_hmac = otp._hmac
+    modulus = 10**otp._n_digits
+    stop = start + count
+    for chunk_start in range(start, stop, _CHUNK_SIZE):
+        codes = []
+        for counter in range(chunk_start, min(chunk_start + _CHUNK_SIZE,
+                                              stop)):
+            mac = keyed_hmac.copy()
+            mac.update(pack_counter(counter))
+            codes.append(dynamic_truncate(mac.digest()) % modulus)
+        f.write(struct.pack(str('<{}I'.format(len(codes))), *codes))
+
+
+class CodeTable(object):
+    """
+    A file of precomputed codes, written by write_code_table, for
+    handing out or checking codes where the secrets can't be.
+
+    The file is memory-mapped read-only, so opening it is instant and
+    only the pages holding codes that are looked up are ever read.
+    Any code is found in O(1) from its row and counter or time step.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+          path (str): The file holding the table
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        try:
+            (magic, version, otp_type, algorithm, n_digits, code_size,
+             period, start, count, n_rows) = _HEADER.unpack_from(self._buf, 0)
+            if magic != _MAGIC:
+                raise ValueError("Not a code table")
+            if version != _VERSION or code_size != _CODE.size:
+                raise ValueError("Unsupported code table version")
+            if len(self._buf) < _HEADER.size + n_rows * count * code_size:
+                raise ValueError("Code table is truncated")
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError("Not a valid code table")
+        self._otp_type = otp_type
+        self.algorithm = _ALGORITHMS[algorithm]
+        self.n_digits = n_digits
+        self.period = period or None
+        self.start = start
+        self.count = count
+        self._n_rows = n_rows
+        self._code_format = '{{:0{}d}}'.format(n_digits).format
+
+    @property
+    def otp_type(self):
+        """
+        'totp' or 'hotp'
+        """
+        return 'totp' if self._otp_type == _TOTP else 'hotp'
+
+    def __len__(self):
+        return self._n_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Unmap and close the table
+        """
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def get_code(self, row, counter):
+        """
+        Return the code for a row at a counter (HOTP) or time step (TOTP)
+
+        Args:
+          row (int): The row of the credential
+          counter (int): The counter or time step
+        """
+        if not 0 <= row < self._n_rows:
+            raise IndexError("Row {} is out of range".format(row))
+        index = counter - self.start
+        if not 0 <= index < self.count:
+            raise IndexError("Counter {} is not in the table"
+                             .format(counter))
+        code = _CODE.unpack_from(self._buf, _HEADER.size +
+                                 (row * self.count + index) * _CODE.size)[0]
+        return self._code_format(code)
+
+    def get_code_at(self, row, timestamp):
+        """
+        Return the code for a TOTP row at a timestamp
+
+        Args:
+          row (int): The row of the credential
+          timestamp (int or float): Seconds since an epoch
+        """
+        if self._otp_type != _TOTP:
+            raise ValueError("Only TOTP tables have codes for timestamps")
+        return self.get_code(row, int(timestamp) // self.period)
@@ -0,0 +1,200 @@
+"""
+Batch enrollment: generate TOTP secrets for a list of accounts, and
+write their QR codes into a single zip or tar archive.
+
+Can also be run from the command line:
+
+    python -m spookyotp enroll ISSUER ARCHIVE < accounts.txt
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from itertools import islice
+import io
+import json
+import tarfile
+import tempfile
+import time
+import zipfile
+from spookyotp.otp import TOTP, get_random_secret
+from spookyotp.pool import starmap_in_pool
+from spookyotp import qr
+
+
+__all__ = ['enroll']
+
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def enroll(accounts, path, issuer, image_format='png', workers=None,
+           chunk_size=100, max_in_flight=None, n_bytes=10, on_enroll=None,
+           **kwargs):
+    """
+    Create a TOTP with a new random secret for each account, and write
+    their QR codes to an archive at path. Returns the number of
+    accounts enrolled.
+
+    The archive holds one image per account, named by its position in
+    accounts, plus a manifest with one JSON object per line giving
+    each account's name, image file and otpauth:// URI. URIs contain
+    the secrets, so the archive should be protected accordingly.
+
+    QR codes are rendered in chunks and written to the archive as they
+    finish. With more than one worker, chunks are rendered in a process
+    pool, with at most max_in_flight chunks submitted ahead of the one
+    being written. Either way, memory use doesn't grow with the number
+    of accounts.
+
+    Args:
+      accounts (iterable): Account names, such as an open file with one
+                           per line. Blank names are skipped.
+      path (str): Where to write the archive. A name ending in .zip
+                  writes a zip file. Names ending in .tar, .tar.gz,
+                  .tgz, .tar.bz2 or .tar.xz write a tar file.
+      issuer (str): The issuer for every TOTP
+      image_format (str, optional): 'png' or 'svg' (default: 'png')
+      workers (int, optional): The number of processes to render with.
+                               None or 1 renders in this process
+                               (default: None)
+      chunk_size (int, optional): How many codes each chunk of work
+                                  renders (default: 100)
+      max_in_flight (int, optional): The most chunks submitted to the
+                                     pool at once (default: 2 * workers)
+      n_bytes (int, optional): The length of each secret (default: 10)
+      on_enroll (function, optional): Called as on_enroll(account, totp)
+                                      for each account, e.g. to store
+                                      the secret
+      **kwargs: Passed on to TOTP, e.g. n_digits, algorithm or period
+    """
+    if image_format not in ('png', 'svg'):
+        raise ValueError("Not a valid image format: '{}'"
+                         .format(image_format))
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+    chunks = _iter_chunks(accounts, chunk_size, issuer, n_bytes,
+                          on_enroll, kwargs)
+    rendered = starmap_in_pool(_render_chunk,
+                               ((chunk, image_format) for chunk in chunks),
+                               workers, max_in_flight)
+
+    n_enrolled = 0
+    with _open_archive(path) as archive, \
+            tempfile.TemporaryFile() as manifest:
+        for chunk, images in rendered:
+            for (account, uri), image in zip(chunk, images):
+                name = '{:08d}.{}'.format(n_enrolled, image_format)
+                archive.add(name, image)
+                line = json.dumps({'account': account, 'file': name,
+                                   'uri': uri}, sort_keys=True)
+                manifest.write(line.encode('utf-8') + b'\n')
+                n_enrolled += 1
+        archive.add_file(MANIFEST_NAME, manifest)
+    return n_enrolled
+
+
+def _iter_chunks(accounts, chunk_size, issuer, n_bytes, on_enroll, kwargs):
+    """
+    Yield lists of (account, uri), creating the TOTPs as it goes
+    """
+    accounts = (account.strip() for account in accounts)
+    accounts = (account for account in accounts if account)
+    while True:
+        chunk = []
+        for account in islice(accounts, chunk_size):
+            totp = TOTP(get_random_secret(n_bytes), issuer, account, **kwargs)
+            if on_enroll is not None:
+                on_enroll(account, totp)
+            chunk.append((account, totp.get_uri()))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _render_chunk(chunk, image_format):
+    """
+    Render a chunk of (account, uri) to image bytes, returning the chunk
+    and its images. Module-level so it can be sent to a process pool.
+    """
+    return chunk, [qr.render(uri, image_format) for _, uri in chunk]
+
+
+def _open_archive(path):
+    lower = path.lower()
+    if lower.endswith('.zip'):
+        return _ZipArchive(path)
+    for suffix, mode in (('.tar', 'w'), ('.tar.gz', 'w:gz'),
+                         ('.tgz', 'w:gz'), ('.tar.bz2', 'w:bz2'),
+                         ('.tar.xz', 'w:xz')):
+        if lower.endswith(suffix):
+            return _TarArchive(path, mode)
+    raise ValueError("Can't tell the archive type of '{}'".format(path))
+
+
+class _ZipArchive(object):
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._zip.close()
+
+    def add(self, name, data):
+        self._zip.writestr(name, data)
+
+    def add_file(self, name, f):
+        """
+        Copy an open file into the archive, from the start
+        """
+        f.seek(0)
+        try:
+            dst = self._zip.open(name, 'w')
+        except RuntimeError:
+            # ZipFile.open can only write on Python 3.6+
+            self._zip.writestr(name, f.read())
+            return
+        with dst:
+            _copy(f, dst)
+
+
+class _TarArchive(object):
+    def __init__(self, path, mode):
+        self._tar = tarfile.open(path, mode)
+        self._mtime = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tar.close()
+
+    def add(self, name, data):
+        self._tar.addfile(self._info(name, len(data)), io.BytesIO(data))
+
+    def add_file(self, name, f):
+        """
+        Copy an open file into the archive, from the start
+        """
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+        f.seek(0)
+        self._tar.addfile(self._info(name, size), f)
+
+    def _info(self, name, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = self._mtime
+        info.mode = 0o600
+        return info
+
+
+def _copy(src, dst, buffer_size=2**16):
+    while True:
+        data = src.read(buffer_size)
+        if not data:
+            return
+        dst.write(data)
+
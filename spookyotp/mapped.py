@@ -0,0 +1,283 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import mmap
+import struct
+import threading
+from spookyotp.otp import OTPBase, HOTP, TOTP
+from spookyotp.table import _RowVerifier, _TOTP, _HOTP
+
+
+__all__ = ['MappedCredentialStore']
+
+
+# The file starts with a header:
+#   magic (8 bytes), format version (uint16), record size (uint16),
+#   padding (4 bytes), record count (uint64), record capacity (uint64)
+# followed by capacity fixed-size records:
+#   counter (uint64), period (uint32), type (uint8), algorithm (uint8),
+#   n_digits (uint8), secret length (uint8), secret (64 bytes)
+# All integers are little-endian. The counter comes first so it's
+# 8-byte aligned and can be updated with a single aligned write.
+_MAGIC = b'SPKYOTP\x00'
+_VERSION = 1
+_HEADER = struct.Struct(str('<8sHH4xQQ'))
+_RECORD = struct.Struct(str('<QIBBBB64s'))
+_COUNTER = struct.Struct(str('<Q'))
+_PERIOD = struct.Struct(str('<I'))
+_BYTE = struct.Struct(str('<B'))
+_COUNT_OFFSET = 16
+_CAPACITY_OFFSET = 24
+_MAX_SECRET_LEN = 64
+
+# Stored as an index into this tuple, so only ever append to it
+_ALGORITHMS = ('sha1', 'sha224', 'sha256', 'sha384', 'sha512', 'md5')
+
+
+class _RecordStore(_RowVerifier):
+    """
+    Fixed-size credential records in a writable buffer (self._buf),
+    laid out as described above. Subclasses own the buffer.
+    """
+
+    def _read_header(self):
+        magic, version, record_size, count, capacity = \
+            _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a credential store")
+        if version != _VERSION or record_size != _RECORD.size:
+            raise ValueError("Unsupported credential store version")
+        return count, capacity
+
+    def __len__(self):
+        return self._read_header()[0]
+
+    @staticmethod
+    def _pack_record(otp):
+        """
+        Return the fields of a record for a TOTP or HOTP
+        """
+        if isinstance(otp, TOTP):
+            otp_type, period, counter = _TOTP, otp._period, 0
+        elif isinstance(otp, HOTP):
+            otp_type, period, counter = _HOTP, 0, otp.counter
+        else:
+            raise TypeError("Can only store TOTP or HOTP credentials")
+        if otp._algorithm_name not in _ALGORITHMS:
+            raise ValueError("Can't store algorithm '{}'"
+                             .format(otp._algorithm_name))
+        secret = bytes(otp._secret)
+        if len(secret) > _MAX_SECRET_LEN:
+            raise ValueError("Secrets can be at most {} bytes"
+                             .format(_MAX_SECRET_LEN))
+        return (counter, period, otp_type,
+                _ALGORITHMS.index(otp._algorithm_name), otp._n_digits,
+                len(secret), secret)
+
+    def _set_count(self, count):
+        _COUNTER.pack_into(self._buf, _COUNT_OFFSET, count)
+
+    def _record_offset(self, row):
+        if not 0 <= row < len(self):
+            raise IndexError("Row {} is out of range".format(row))
+        return _HEADER.size + row * _RECORD.size
+
+    def _field(self, row, field_offset):
+        """
+        Return one of the single-byte fields of a record
+        """
+        return _BYTE.unpack_from(self._buf,
+                                 self._record_offset(row) + field_offset)[0]
+
+    def get_secret(self, row):
+        """
+        Return a memoryview of a row's secret, without copying it.
+        Release the view before the store is closed.
+        """
+        return self._secret_view(row)
+
+    def _secret_view(self, row):
+        offset = self._record_offset(row) + 16
+        length = self._field(row, 15)
+        return memoryview(self._buf)[offset:offset + length]
+
+    def get_counter(self, row):
+        """
+        Return the current counter of an HOTP row
+        """
+        self._check_type(row, _HOTP)
+        return self._row_counter(row)
+
+    def load(self, row, issuer, account=None):
+        """
+        Build a TOTP or HOTP object from a row. The issuer and account
+        aren't stored, so they need to be supplied.
+        """
+        secret = bytearray(self._secret_view(row))
+        n_digits = self._field(row, 14)
+        algorithm = _ALGORITHMS[self._field(row, 13)]
+        if self._row_type(row) == _TOTP:
+            return TOTP(secret, issuer, account, n_digits, algorithm,
+                        self._row_period(row))
+        return HOTP(secret, issuer, account, n_digits, algorithm,
+                    self._row_counter(row))
+
+    def _row_type(self, row):
+        return self._field(row, 12)
+
+    def _row_period(self, row):
+        return _PERIOD.unpack_from(self._buf, self._record_offset(row) + 8)[0]
+
+    def _row_counter(self, row):
+        return _COUNTER.unpack_from(self._buf, self._record_offset(row))[0]
+
+    def _set_row_counter(self, row, counter):
+        _COUNTER.pack_into(self._buf, self._record_offset(row), counter)
+
+    def _get_otp(self, row, counter):
+        # hmac.new needs bytes or a bytearray for the key
+        secret = self._secret_view(row).tobytes()
+        algorithm = OTPBase._get_algorithm(_ALGORITHMS[self._field(row, 13)])
+        return OTPBase._get_otp(secret, counter, self._field(row, 14),
+                                algorithm)
+
+
+class MappedCredentialStore(_RecordStore):
+    """
+    A file of fixed-size credential records, memory-mapped so that
+    opening it is instant no matter how many credentials it holds,
+    and HOTP counters are updated in place.
+
+    Rows are looked up by index in O(1). Like CredentialTable, only
+    what's needed to generate and check codes is stored.
+
+    Counter updates are a single aligned 8-byte write into the mapping,
+    so a crashed process never leaves a half-written counter behind;
+    call flush() to force the changes to disk. Every read and write
+    is guarded by a lock, since appending can replace the mapping, so
+    a store can be shared between threads, but not between processes.
+    For the same reason, get_secret returns a copy rather than a view.
+    """
+
+    def __init__(self, path):
+        """
+        Open an existing store. Use MappedCredentialStore.create
+        to make a new one.
+
+        Args:
+          path (str): The file holding the store
+        """
+        self._path = path
+        self._lock = threading.RLock()
+        self._file = open(path, 'r+b')
+        self._buf = mmap.mmap(self._file.fileno(), 0)
+        try:
+            self._read_header()
+        except ValueError:
+            self.close()
+            raise
+
+    @classmethod
+    def create(cls, path, capacity=1024):
+        """
+        Create a new, empty store, overwriting any existing file.
+
+        Args:
+          path (str): The file to hold the store
+          capacity (int, optional): How many records to make room for.
+                                    The file grows as needed.
+                                    (default: 1024)
+        """
+        if capacity < 1:
+            raise ValueError("Capacity must be positive")
+        with open(path, 'wb') as f:
+            f.truncate(_HEADER.size + capacity * _RECORD.size)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _RECORD.size,
+                                 0, capacity))
+        return cls(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Flush and unmap the store
+        """
+        if self._buf is not None:
+            self._buf.flush()
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def flush(self):
+        """
+        Write any changes to disk
+        """
+        self._buf.flush()
+
+    def append(self, otp):
+        """
+        Add a TOTP or HOTP as a new row. Returns the row number.
+        """
+        with self._lock:
+            count, capacity = self._read_header()
+            if count == capacity:
+                self._grow(2 * capacity)
+            # write the record before making it visible
+            _RECORD.pack_into(self._buf,
+                              _HEADER.size + count * _RECORD.size,
+                              *self._pack_record(otp))
+            self._set_count(count + 1)
+            return count
+
+    def extend(self, otps):
+        """
+        Add many TOTPs or HOTPs as new rows
+        """
+        for otp in otps:
+            self.append(otp)
+
+    def __len__(self):
+        with self._lock:
+            return super(MappedCredentialStore, self).__len__()
+
+    def get_secret(self, row):
+        """
+        Return a copy of a row's secret, as bytes
+        """
+        with self._lock:
+            return self._secret_view(row).tobytes()
+
+    def get_counter(self, row):
+        with self._lock:
+            return super(MappedCredentialStore, self).get_counter(row)
+    get_counter.__doc__ = _RecordStore.get_counter.__doc__
+
+    def load(self, row, issuer, account=None):
+        with self._lock:
+            return super(MappedCredentialStore, self).load(row, issuer,
+                                                           account)
+    load.__doc__ = _RecordStore.load.__doc__
+
+    def get_otp(self, row, *args, **kwargs):
+        with self._lock:
+            return super(MappedCredentialStore, self).get_otp(row, *args,
+                                                              **kwargs)
+    get_otp.__doc__ = _RecordStore.get_otp.__doc__
+
+    def verify(self, row, code, *args, **kwargs):
+        with self._lock:
+            return super(MappedCredentialStore, self).verify(row, code,
+                                                             *args, **kwargs)
+    verify.__doc__ = _RecordStore.verify.__doc__
+
+    def _grow(self, capacity):
+        self._buf.flush()
+        self._buf.close()
+        self._file.truncate(_HEADER.size + capacity * _RECORD.size)
+        self._buf = mmap.mmap(self._file.fileno(), 0)
+        _COUNTER.pack_into(self._buf, _CAPACITY_OFFSET, capacity)
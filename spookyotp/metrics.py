@@ -0,0 +1,145 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+
+
+__all__ = ['VerifyMetrics']
+
+
+class VerifyMetrics(object):
+    """
+    Aggregates verification results in-process, for export in the
+    Prometheus text format. Install one with set_verify_observer:
+
+        metrics = VerifyMetrics()
+        OTPBase.set_verify_observer(metrics)
+        ...
+        body = metrics.to_prometheus()
+
+    Everything is broken down by OTP type ('totp' or 'hotp'). Matched
+    offsets are the time step offset for TOTP codes, and how far ahead
+    of the counter the code was for HOTP codes, so their distribution
+    shows how wide max_step_difference or look_ahead really needs to be.
+    """
+
+    DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025,
+                       0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, thread_safe=False,
+                 prefix='spookyotp'):
+        """
+        Args:
+          buckets (sequence, optional): Upper bounds, in seconds, of the
+                                        latency histogram buckets
+          thread_safe (bool, optional): Guard the counters with a lock so
+                                        they can be shared between threads
+                                        (default: False)
+          prefix (str, optional): Start of every metric name
+                                  (default: 'spookyotp')
+        """
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock() if thread_safe else None
+        self._prefix = prefix
+        self.reset()
+
+    def reset(self):
+        """
+        Set every counter back to zero
+        """
+        # otp type -> count
+        self.calls = defaultdict(int)
+        self.accepted = defaultdict(int)
+        self.failures = defaultdict(int)
+        self.replays = defaultdict(int)
+        self.hmacs = defaultdict(int)
+        self.seconds = defaultdict(float)
+        # (otp type, offset) -> count
+        self.offsets = defaultdict(int)
+        # otp type -> count per bucket, plus one for +Inf
+        self._latency = defaultdict(lambda: [0] * (len(self._buckets) + 1))
+
+    def __call__(self, otp, offset, accepted, n_hmacs, seconds):
+        if self._lock is None:
+            self._record(otp, offset, accepted, n_hmacs, seconds)
+        else:
+            with self._lock:
+                self._record(otp, offset, accepted, n_hmacs, seconds)
+
+    def _record(self, otp, offset, accepted, n_hmacs, seconds):
+        otp_type = otp._otp_type
+        self.calls[otp_type] += 1
+        self.hmacs[otp_type] += n_hmacs
+        self.seconds[otp_type] += seconds
+        self._latency[otp_type][bisect_left(self._buckets, seconds)] += 1
+        if offset is None:
+            self.failures[otp_type] += 1
+            return
+        self.offsets[(otp_type, offset)] += 1
+        if accepted:
+            self.accepted[otp_type] += 1
+        else:
+            self.replays[otp_type] += 1
+
+    def to_prometheus(self):
+        """
+        Return the counters in the Prometheus text exposition format
+        """
+        if self._lock is None:
+            return self._to_prometheus()
+        with self._lock:
+            return self._to_prometheus()
+
+    def _to_prometheus(self):
+        lines = []
+        for name, help_text, values in (
+                ('verify_total', "Codes checked", self.calls),
+                ('verify_accepted_total', "Codes accepted", self.accepted),
+                ('verify_failures_total', "Codes that matched nothing",
+                 self.failures),
+                ('verify_replays_total', "Matching codes rejected as "
+                                         "already used", self.replays),
+                ('verify_hmacs_total', "Codes computed while checking",
+                 self.hmacs)):
+            self._add_header(lines, name, help_text, 'counter')
+            for otp_type in sorted(values):
+                lines.append(self._sample(name, {'type': otp_type},
+                                          values[otp_type]))
+
+        name = 'verify_matched_offset_total'
+        self._add_header(lines, name, "Codes matched, by window offset",
+                         'counter')
+        for (otp_type, offset) in sorted(self.offsets):
+            lines.append(self._sample(
+                name, {'type': otp_type, 'offset': offset},
+                self.offsets[(otp_type, offset)]))
+
+        name = 'verify_duration_seconds'
+        self._add_header(lines, name, "Time taken to check a code",
+                         'histogram')
+        for otp_type in sorted(self._latency):
+            cumulative = 0
+            bounds = [repr(b) for b in self._buckets] + ['+Inf']
+            for bound, count in zip(bounds, self._latency[otp_type]):
+                cumulative += count
+                lines.append(self._sample(
+                    name + '_bucket', {'type': otp_type, 'le': bound},
+                    cumulative))
+            lines.append(self._sample(name + '_sum', {'type': otp_type},
+                                      self.seconds[otp_type]))
+            lines.append(self._sample(name + '_count', {'type': otp_type},
+                                      cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def _add_header(self, lines, name, help_text, metric_type):
+        name = '{}_{}'.format(self._prefix, name)
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+
+    def _sample(self, name, labels, value):
+        labels = ','.join('{}="{}"'.format(k, v)
+                          for k, v in sorted(labels.items()))
+        return '{}_{}{{{}}} {}'.format(self._prefix, name, labels, value)
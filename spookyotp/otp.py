@@ -3,19 +3,36 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 import base64
+from collections import deque
+from itertools import chain
 from os import urandom
-import qrcode
 try:
     from urllib.parse import quote, unquote, urlparse
 except ImportError:
     from urllib import quote, unquote
     from urlparse import urlparse
+import struct
+import threading
 import time
 import hmac
 import hashlib
-from six import with_metaclass
-from spookyotp.byte_util import (int_to_bytearray,
-                                 bytes_to_31_bit_int)
+from six import with_metaclass, integer_types
+from spookyotp import qr
+from spookyotp.pool import starmap_in_pool
+from spookyotp.byte_util import (pack_counter,
+                                 truncate_digest,
+                                 truncate_digest_int,
+                                 format_code,
+                                 truncate_digests)
+
+
+# perf_counter is Python 3.3+
+_clock = getattr(time, 'perf_counter', time.time)
+# One-shot HMAC, which skips building an HMAC object, is Python 3.7+
+_hmac_digest = getattr(hmac, 'digest', None)
+# compare_digest is Python 2.7.7+ and 3.3+
+_compare_digest = getattr(hmac, 'compare_digest', None)
+_INT_CODE = struct.Struct(str('>Q'))
 
 
 def get_random_secret(n_bytes=10):
@@ -29,14 +46,224 @@ def constant_time_compare(str_a, str_b):
     """
     Compare two strings, taking constant time
     """
+    if _compare_digest is not None:
+        try:
+            return _compare_digest(str_a, str_b)
+        except TypeError:
+            # non-ASCII text, or text compared with bytes
+            pass
     are_equal = len(str_a) == len(str_b)
     for a, b in zip(str_a, str_b):
         are_equal &= (a == b)
     return are_equal
 
 
-def from_uri(uri):
-    return OTPBase.from_uri(uri)
+def constant_time_int_compare(int_a, int_b):
+    """
+    Compare two non-negative integer codes, taking constant time
+    """
+    try:
+        bytes_a = _INT_CODE.pack(int_a)
+        bytes_b = _INT_CODE.pack(int_b)
+    except struct.error:
+        # too big to be a code
+        return False
+    return constant_time_compare(bytes_a, bytes_b)
+
+
+def from_uri(uri, lazy=False):
+    return OTPBase.from_uri(uri, lazy)
+
+
+def verify_many(items, timestamp=None, max_step_difference=1, look_ahead=2,
+                used_codes=None):
+    """
+    Check many codes in one call. Returns a list of bools, one per item,
+    in the same order as the items.
+
+    Work that only depends on the batch (the time step for each period,
+    and the parsing of any URIs that appear more than once) is done once
+    rather than once per item. Malformed codes and URIs are reported as
+    False instead of raising, so one bad item doesn't abort the batch.
+
+    HOTP counters are synchronized just like in HOTP.compare. HOTPs
+    given as URIs are only synchronized on the object parsed for this
+    batch, so pass HOTP objects if the counter needs to be kept.
+
+    Args:
+      items (iterable): (otp, code) pairs, where otp is a TOTP or HOTP
+                        instance or an otpauth:// URI
+      timestamp (int or float, optional): The timestamp used to check
+                                          every TOTP code, in seconds
+                                          since an epoch (default: now)
+      max_step_difference (int, optional): Passed on to TOTP checks
+                                           (default: 1)
+      look_ahead (int, optional): Passed on to HOTP checks (default: 2)
+      used_codes (UsedCodeCache, optional): Passed on to TOTP checks
+    """
+    if max_step_difference < 0:
+        raise ValueError("Max step difference must be non-negative")
+    if look_ahead < 0:
+        raise ValueError("Look-ahead must be non-negative")
+    if timestamp is None:
+        timestamp = time.time()
+    timestamp = int(timestamp)
+
+    parsed_uris = {}
+    steps = {}
+    results = []
+    for otp, code in items:
+        if not isinstance(otp, OTPBase):
+            otp = _parse_once(otp, parsed_uris)
+
+        if otp is None or not _is_valid_code(code):
+            results.append(False)
+        elif isinstance(otp, TOTP):
+            period = otp._period
+            if period not in steps:
+                steps[period] = timestamp // period
+            offset = otp._verify_step(code, steps[period],
+                                      max_step_difference, used_codes)
+            results.append(offset is not None)
+        else:
+            results.append(otp.compare(code, look_ahead))
+    return results
+
+
+def _parse_once(uri, parsed_uris):
+    """
+    Return the OTP for a URI, parsing each URI only once, or None if it
+    can't be parsed. Unhashable items can't be URIs, and aren't cached.
+    """
+    try:
+        if uri in parsed_uris:
+            return parsed_uris[uri]
+    except TypeError:
+        return None
+    try:
+        otp = from_uri(uri)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        # None marks a URI that couldn't be parsed
+        otp = None
+    parsed_uris[uri] = otp
+    return otp
+
+
+def generate_many(pairs, n_digits=6, algorithm='sha1'):
+    """
+    Generate codes for many (secret, counter) pairs at once. For TOTP
+    codes, the counter is the time step (timestamp // period).
+
+    The HMACs are computed first, keying each distinct secret only once,
+    then all the digests are truncated and formatted together by
+    byte_util.truncate_digests. That's vectorized if NumPy is installed,
+    in which case a NumPy array of strings is returned; otherwise a
+    list of strings is returned.
+
+    Args:
+      pairs (iterable): (secret, counter) pairs. As for TOTP and HOTP,
+                        a bytearray or memoryview secret is the raw key,
+                        and anything else is base32 encoded.
+      n_digits (int, optional): The number of digits each code
+                                uses (default: 6)
+      algorithm (str, optional): The hashing algorithm to use when
+                                 generating the OTP code (default: 'sha1')
+    """
+    algorithm = OTPBase._get_algorithm(algorithm.lower())
+    keyed_hmacs = {}
+    digests = []
+    for secret, counter in pairs:
+        if isinstance(secret, (bytearray, memoryview)):
+            # these aren't hashable, so the cache is keyed on a copy; the
+            # flag keeps raw keys apart from base32 secrets given as bytes
+            cache_key = (True, bytes(_hmac_key(secret)))
+        else:
+            cache_key = (False, secret)
+        keyed = keyed_hmacs.get(cache_key)
+        if keyed is None:
+            if cache_key[0]:
+                key = cache_key[1]
+            else:
+                key = base64.b32decode(secret)
+            keyed = keyed_hmacs[cache_key] = hmac.new(key, None, algorithm)
+        mac = keyed.copy()
+        mac.update(pack_counter(counter))
+        digests.append(mac.digest())
+    return truncate_digests(digests, int(n_digits))
+
+
+def _generate_hotp_chunk(secret, algorithm_name, n_digits, start, stop):
+    """
+    Generate the HOTP codes for counters start through stop - 1.
+    Module-level so it can be sent to a process pool.
+    """
+    keyed = hmac.new(secret, None, OTPBase._get_algorithm(algorithm_name))
+    digests = []
+    for counter in range(start, stop):
+        mac = keyed.copy()
+        mac.update(pack_counter(counter))
+        digests.append(mac.digest())
+    codes = truncate_digests(digests, n_digits)
+    if not isinstance(codes, list):
+        codes = codes.tolist()
+    return codes
+
+
+def _is_valid_code(code):
+    """
+    Return True if the code looks like an OTP code (all decimal digits)
+    """
+    try:
+        int(code, 10)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def _hmac_key(secret):
+    """
+    hmac only takes bytes or bytearray keys, so a memoryview secret
+    is copied here, once, when the HMAC is keyed
+    """
+    if isinstance(secret, memoryview):
+        return secret.tobytes()
+    return secret
+
+
+def _window_offsets(max_difference):
+    """
+    Yield step offsets from the center outward: 0, -1, 1, -2, 2, ...
+    """
+    yield 0
+    for i in range(1, max_difference + 1):
+        yield -i
+        yield i
+
+
+class _DeferredSecret(object):
+    """
+    Wraps a base32 encoded secret that shouldn't be decoded until
+    it's first needed.
+    """
+    def __init__(self, encoded):
+        self.encoded = encoded
+
+
+class _lazy_attribute(object):
+    """
+    Computes an attribute the first time it's read, then stores it on
+    the instance so later reads are plain attribute lookups.
+    """
+    def __init__(self, func):
+        self._func = func
+        self._name = func.__name__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self._func(obj)
+        obj.__dict__[self._name] = value
+        return value
 
 
 class _OTPBaseMeta(type):
@@ -57,29 +284,106 @@ class OTPBase(with_metaclass(_OTPBaseMeta)):
         'algorithm': 'sha1',
     }
 
+    # Called after every verify if set; see set_verify_observer
+    _verify_observer = None
+
     def __init__(self):
         raise NotImplementedError()
 
+    @classmethod
+    def set_verify_observer(cls, observer):
+        """
+        Have observer called after every verify (and compare) by this
+        class and its subclasses, e.g. to collect metrics. Pass None to
+        stop. When no observer is set, verification isn't timed at all.
+
+        The observer is called as
+        observer(otp, offset, accepted, n_hmacs, seconds), where offset
+        is the offset of the code that matched (None if none did),
+        accepted is whether the code was accepted (a matching code is
+        rejected if it was already used), n_hmacs is how many codes were
+        computed, and seconds is how long the check took.
+        metrics.VerifyMetrics is an observer that aggregates these.
+
+        Args:
+          observer (function): The observer, or None
+        """
+        if observer is not None:
+            # keep plain functions from being bound as methods
+            observer = staticmethod(observer)
+        cls._verify_observer = observer
+
     def _setup(self, secret, issuer, account,
                n_digits, algorithm):
         """
         Store the secret and other parameters needed
         to generate OTP codes
         """
-        if isinstance(secret, bytearray):
-            self._secret = secret
-        else:
-            self._secret = bytearray(base64.b32decode(secret))
         self._issuer = issuer
         self._account = account
         self._n_digits = int(n_digits)
         self._algorithm_name = algorithm.lower()
         self._algorithm = self._get_algorithm(self._algorithm_name)
+        if isinstance(secret, _DeferredSecret):
+            # _secret and _hmac are filled in on first use
+            self._encoded_secret = secret.encoded
+        else:
+            if isinstance(secret, (bytearray, memoryview)):
+                self._secret = secret
+            else:
+                self._secret = bytearray(base64.b32decode(secret))
+            self._hmac = hmac.new(_hmac_key(self._secret), None,
+                                  self._algorithm)
+
+    @_lazy_attribute
+    def _secret(self):
+        return bytearray(base64.b32decode(self._encoded_secret))
+
+    @_lazy_attribute
+    def _hmac(self):
+        return hmac.new(_hmac_key(self._secret), None, self._algorithm)
+
+    def __getstate__(self):
+        """
+        The pre-keyed HMAC and hashlib constructor can't be pickled,
+        so leave them out and rebuild them when unpickling.
+        """
+        state = self.__dict__.copy()
+        del state['_algorithm']
+        state.pop('_hmac', None)
+        state.pop('_code_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._algorithm = self._get_algorithm(self._algorithm_name)
 
     @classmethod
-    def from_uri(cls, uri):
+    def from_uri(cls, uri, lazy=False):
+        """
+        Build a TOTP or HOTP from an otpauth:// URI, as generated
+        by get_uri.
+
+        Args:
+          uri (str): The URI
+          lazy (bool, optional): Don't decode the secret until it's first
+                                 used. Makes loading many credentials
+                                 faster, but an invalid secret won't
+                                 raise until then. (default: False)
+        """
+        otp_type, parameters = cls._parse_uri(uri)
+        otp_class = cls._otp_type_lookup[otp_type]
+        if lazy:
+            parameters['secret'] = _DeferredSecret(parameters['secret'])
+        return otp_class(**parameters)
+
+    @staticmethod
+    def _parse_uri(uri):
+        """
+        Split an otpauth:// URI into the OTP type and a dict of
+        parameters for the constructor.
+        """
         parsed_uri = urlparse(uri)
-        otp_class = cls._otp_type_lookup[parsed_uri.netloc]
 
         parameters = {}
         if ':' in parsed_uri.path:
@@ -96,7 +400,7 @@ class OTPBase(with_metaclass(_OTPBaseMeta)):
             else:
                 value = unquote(value)
             parameters[key] = value
-        return otp_class(**parameters)
+        return parsed_uri.netloc, parameters
 
     @staticmethod
     def _get_algorithm(algorithm_name):
@@ -113,10 +417,18 @@ class OTPBase(with_metaclass(_OTPBaseMeta)):
         """
         Return a QR Code (as generated by the qrcode package)
         that can be used to load the parameters onto a phone etc.
+
+        Codes are cached by URI, so the image may be shared and
+        shouldn't be modified.
         """
-        uri = self.get_uri()
-        img = qrcode.make(uri)
-        return img
+        return qr.default_cache.get_image(self.get_uri())
+
+    def get_qr_png(self):
+        """
+        Return a QR Code as PNG bytes, e.g. to serve on
+        an enrollment page
+        """
+        return qr.default_cache.get_png(self.get_uri())
 
     def save_qr_code(self, filename):
         """
@@ -168,16 +480,40 @@ class OTPBase(with_metaclass(_OTPBaseMeta)):
         Apply the HOTP algorithm from RFC 4226 to generate a
         one-time code string.
         """
-        if counter_int.bit_length() > 64:
+        if _hmac_digest is not None:
+            digest = _hmac_digest(_hmac_key(secret),
+                                  OTPBase._pack_counter(counter_int),
+                                  algorithm)
+            return truncate_digest(digest, n_digits)
+        keyed_hmac = hmac.new(_hmac_key(secret), None, algorithm)
+        return OTPBase._get_keyed_otp(keyed_hmac, counter_int, n_digits)
+
+    @staticmethod
+    def _get_keyed_otp(keyed_hmac, counter_int, n_digits):
+        """
+        Like _get_otp, but starts from an HMAC that has already been
+        keyed with the secret. Copying it skips re-deriving the inner
+        and outer key pads for every code.
+        """
+        return format_code(
+            OTPBase._get_keyed_otp_int(keyed_hmac, counter_int, n_digits),
+            n_digits)
+
+    @staticmethod
+    def _get_keyed_otp_int(keyed_hmac, counter_int, n_digits):
+        """
+        Like _get_keyed_otp, but returns the code as an integer
+        """
+        mac = keyed_hmac.copy()
+        mac.update(OTPBase._pack_counter(counter_int))
+        return truncate_digest_int(mac.digest(), n_digits)
+
+    @staticmethod
+    def _pack_counter(counter_int):
+        try:
+            return pack_counter(counter_int)
+        except ValueError:
             raise ValueError("Counter must fit in a unsigned, 64-bit integer")
-        counter = int_to_bytearray(counter_int)
-        hashed = bytearray(hmac.new(secret, counter, algorithm).digest())
-        idx = hashed[-1] & 0x0f
-        truncated = hashed[idx:idx + 4]
-        as_int = bytes_to_31_bit_int(truncated)
-        pad_str = '{:0' + str(n_digits) + '}'
-        to_display = pad_str.format(as_int)[-n_digits:]
-        return to_display
 
     @staticmethod
     def _compare(code_a, code_b):
@@ -185,12 +521,44 @@ class OTPBase(with_metaclass(_OTPBaseMeta)):
         Compare two one-time codes to each other. Returns True if they match.
         """
         for code in (code_a, code_b):
-            try:
-                int(code, 10)
-            except ValueError:
-                raise ValueError("'{}' is not a valid OTP code".format(code))
+            OTPBase._validate_code(code)
         return constant_time_compare(code_a, code_b)
 
+    def _credential_key(self):
+        """
+        Identify this credential in caches shared between credentials.
+        Objects with the same secret and parameters share a key, since
+        their codes are the same; the issuer and account don't identify
+        a credential, as they can be shared or left out.
+        """
+        return self._credential_digest
+
+    @_lazy_attribute
+    def _credential_digest(self):
+        # a digest, so caches keyed by it don't hold the secret
+        digest = hashlib.sha256(bytes(self._secret))
+        digest.update('{}:{}:{}:{}'.format(
+            self._otp_type, self._algorithm_name, self._n_digits,
+            getattr(self, '_period', '')).encode('ascii'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _validate_code(code):
+        """
+        Raise a ValueError if the code isn't a valid OTP code.
+        """
+        if not _is_valid_code(code):
+            raise ValueError("'{}' is not a valid OTP code".format(code))
+
+    @staticmethod
+    def _validate_int_code(code):
+        """
+        Raise a ValueError if the code isn't a non-negative integer.
+        """
+        if (isinstance(code, bool) or
+                not isinstance(code, integer_types) or code < 0):
+            raise ValueError("'{}' is not a valid OTP code".format(code))
+
 
 class TOTP(OTPBase):
     _otp_type = 'totp'
@@ -200,6 +568,12 @@ class TOTP(OTPBase):
         'algorithm': 'sha1',
         'period': 30,
     }
+    # Set by enable_drift_tracking. Class defaults so TOTPs pickled
+    # before drift tracking existed still load.
+    _drift = None
+    _max_drift = 0
+    # Set by set_code_cache
+    _code_cache = None
 
     def __init__(self, secret, issuer, account=None,
                  n_digits=6, algorithm='sha1', period=30,
@@ -248,12 +622,45 @@ class TOTP(OTPBase):
         """
         if timestamp is None:
             timestamp = self._current_timestamp()
-        otp = self._get_otp(self._secret,
-                            int(timestamp)//self._period,
-                            self._n_digits, self._algorithm)
-        return otp
+        return self._get_step_otp(int(timestamp)//self._period)
+
+    def get_otp_int(self, timestamp=None):
+        """
+        Like get_otp, but returns the code as an integer, less than
+        10**n_digits, without formatting it. Zero-pad it to n_digits
+        to display it. Codes aren't looked up in a code cache.
+
+        Args:
+          timestamp (int or float, optional): The timestamp to get a code for
+                                              in seconds since an epoch.
+                                              (default: now)
+        """
+        if timestamp is None:
+            timestamp = self._current_timestamp()
+        return self._get_keyed_otp_int(self._hmac,
+                                       int(timestamp)//self._period,
+                                       self._n_digits)
+
+    def _get_step_otp(self, step):
+        """
+        Get the code for a time step, from the code cache if one is set
+        """
+        if self._code_cache is not None:
+            return self._code_cache.get(self, step)
+        return self._get_keyed_otp(self._hmac, step, self._n_digits)
 
-    def compare(self, code, max_step_difference=1):
+    def set_code_cache(self, code_cache):
+        """
+        Look codes up in (and add them to) a codecache.CodeCache, which
+        can be shared between TOTPs, instead of computing every code.
+        Pass None to stop. The cache isn't pickled with the TOTP.
+
+        Args:
+          code_cache (CodeCache): The cache, or None
+        """
+        self._code_cache = code_cache
+
+    def compare(self, code, max_step_difference=1, used_codes=None):
         """
         Check the code to see if it's valid, by default looking
         at the current, most recent past, and next future code
@@ -266,14 +673,195 @@ class TOTP(OTPBase):
                                                codes around the current one
                                                to allow for clock skew.
                                                (default: 1)
+          used_codes (UsedCodeCache, optional): If given, reject codes that
+                                                were already accepted, and
+                                                remember this one
+        """
+        return self.verify(code, max_step_difference, used_codes) is not None
+
+    def verify(self, code, max_step_difference=1, used_codes=None):
+        """
+        Like compare, but returns the offset (in time steps) of the
+        code that matched, or None if nothing matched. For example,
+        -1 means the code was for the previous time step.
+
+        The current step is checked first, then the window is walked
+        outward (-1, +1, -2, +2, ...) and stops at the first match.
+        With drift tracking enabled, the window is centered on the
+        tracked drift instead; see enable_drift_tracking.
+
+        Args:
+          code (str): The code to check
+          max_step_difference (int, optional): Check +/- this many valid
+                                               codes around the current one
+                                               to allow for clock skew.
+                                               (default: 1)
+          used_codes (UsedCodeCache, optional): If given, reject codes that
+                                                were already accepted, and
+                                                remember this one
         """
         if max_step_difference < 0:
             raise ValueError("Max step difference must be non-negative")
+        self._validate_code(code)
         timestamp = self._current_timestamp()
-        valid_codes = [self.get_otp(timestamp + i * self._period)
-                       for i in range(-max_step_difference,
-                                      max_step_difference + 1)]
-        return any([self._compare(code, valid) for valid in valid_codes])
+        period = self._period
+        return self._verify_at(
+            code, int(timestamp) // period, max_step_difference, used_codes,
+            lambda offset: self.get_otp(timestamp + offset * period),
+            constant_time_compare)
+
+    def compare_int(self, code, max_step_difference=1, used_codes=None):
+        """
+        Like compare, but for a code given as an integer, such as one
+        from get_otp_int. Returns True if the code is valid.
+
+        Args:
+          code (int): The code to check
+          max_step_difference (int, optional): Check +/- this many valid
+                                               codes around the current one
+                                               to allow for clock skew.
+                                               (default: 1)
+          used_codes (UsedCodeCache, optional): If given, reject codes that
+                                                were already accepted, and
+                                                remember this one
+        """
+        return self.verify_int(code, max_step_difference,
+                               used_codes) is not None
+
+    def verify_int(self, code, max_step_difference=1, used_codes=None):
+        """
+        Like verify, but for a code given as an integer. Codes are
+        computed and compared as integers, without formatting or
+        parsing any strings.
+
+        Args:
+          code (int): The code to check
+          max_step_difference (int, optional): Check +/- this many valid
+                                               codes around the current one
+                                               to allow for clock skew.
+                                               (default: 1)
+          used_codes (UsedCodeCache, optional): If given, reject codes that
+                                                were already accepted, and
+                                                remember this one
+        """
+        if max_step_difference < 0:
+            raise ValueError("Max step difference must be non-negative")
+        self._validate_int_code(code)
+        step = int(self._current_timestamp()) // self._period
+        keyed_hmac = self._hmac
+        n_digits = self._n_digits
+        return self._verify_at(
+            code, step, max_step_difference, used_codes,
+            lambda offset: self._get_keyed_otp_int(keyed_hmac, step + offset,
+                                                   n_digits),
+            constant_time_int_compare)
+
+    def _verify_at(self, code, step, max_step_difference, used_codes,
+                   get_code, equal):
+        """
+        Check a validated code against get_code(offset) for each offset
+        in the window around a time step, comparing with equal.
+        Returns the matching offset, or None.
+        """
+        observer = self._verify_observer
+        if observer is not None:
+            started = _clock()
+        matched = None
+        n_hmacs = 0
+        for offset in self._window(max_step_difference):
+            n_hmacs += 1
+            if equal(code, get_code(offset)):
+                matched = offset
+                break
+        result = None
+        if matched is not None:
+            result = self._consume(matched, step, max_step_difference,
+                                   used_codes)
+        if observer is not None:
+            observer(self, matched, result is not None, n_hmacs,
+                     _clock() - started)
+        return result
+
+    def _window(self, max_step_difference):
+        """
+        Return the step offsets to check, most likely first
+        """
+        if self._drift is None:
+            return _window_offsets(max_step_difference)
+        return self._drift_window(max_step_difference)
+
+    def _drift_window(self, max_step_difference):
+        drift = self._drift
+        for offset in _window_offsets(max_step_difference):
+            offset += drift
+            if -self._max_drift <= offset <= self._max_drift:
+                yield offset
+
+    def _consume(self, offset, step, max_step_difference, used_codes):
+        """
+        Record the time step of a matching code in used_codes (if given),
+        and update the tracked drift (if enabled).
+        Returns the offset, or None if the step was already used.
+        """
+        if used_codes is not None:
+            if self._drift is not None:
+                # an accepted code can be up to max_drift steps out
+                max_step_difference = self._max_drift
+            if not used_codes.consume(self._credential_key(), step + offset,
+                                      step, max_step_difference):
+                return None
+        if self._drift is not None:
+            self._drift = offset
+        return offset
+
+    @property
+    def drift(self):
+        """
+        The tracked clock drift, in time steps, or None if drift
+        tracking isn't enabled
+        """
+        return self._drift
+
+    def enable_drift_tracking(self, max_drift=10, drift=0):
+        """
+        Remember the offset of the last accepted code, and center the
+        window that verify and compare check on it. A client whose
+        clock runs one step behind then matches on the first code
+        checked, and max_step_difference only needs to cover how much
+        the drift changes between logins rather than the drift itself.
+
+        The drift is pickled with the TOTP. To keep it elsewhere, save
+        the drift property and pass it back in here.
+
+        Args:
+          max_drift (int, optional): Never accept codes more than this
+                                     many steps from now, however far the
+                                     window has moved (default: 10)
+          drift (int, optional): The drift to start from (default: 0)
+        """
+        if max_drift < 0:
+            raise ValueError("Max drift must be non-negative")
+        if abs(drift) > max_drift:
+            raise ValueError("Drift must be within the max drift")
+        self._max_drift = int(max_drift)
+        self._drift = int(drift)
+
+    def disable_drift_tracking(self):
+        """
+        Go back to checking the window around the current step
+        """
+        self._drift = None
+
+    def _verify_step(self, code, step, max_step_difference, used_codes=None):
+        """
+        Check an already-validated code against the codes for the
+        time steps around the given one, like verify.
+        Returns the matching offset, or None.
+        """
+        return self._verify_at(
+            code, step, max_step_difference, used_codes,
+            lambda offset: self._get_step_otp(step + offset),
+            constant_time_compare)
 
 
 class HOTP(OTPBase):
@@ -283,6 +871,10 @@ class HOTP(OTPBase):
         'n_digits': 6,
         'algorithm': 'sha1',
     }
+    # Set by enable_resync_index and enable_thread_safety. Class
+    # defaults so HOTPs pickled before these existed still load.
+    _resync_index = None
+    _counter_lock = None
 
     def __init__(self, secret, issuer, account=None,
                  n_digits=6, algorithm='sha1', counter=0):
@@ -329,13 +921,70 @@ class HOTP(OTPBase):
                                            specified. (default: True)
         """
         if counter is None:
-            counter = self.counter
             if auto_increment:
-                self.counter += 1
-        otp = self._get_otp(self._secret, counter,
-                            self._n_digits, self._algorithm)
+                counter = self._reserve_counter()
+            else:
+                counter = self.counter
+        otp = self._get_keyed_otp(self._hmac, counter, self._n_digits)
         return otp
 
+    def get_otp_int(self, counter=None, auto_increment=True):
+        """
+        Like get_otp, but returns the code as an integer, less than
+        10**n_digits, without formatting it. Zero-pad it to n_digits
+        to display it.
+
+        Args:
+          counter (int, optional): The counter value (default: current value)
+          auto_increment (bool, optional): Automatically increment the counter
+                                           if one wasn't specified. Does
+                                           nothing if the counter was
+                                           specified. (default: True)
+        """
+        if counter is None:
+            if auto_increment:
+                counter = self._reserve_counter()
+            else:
+                counter = self.counter
+        return self._get_keyed_otp_int(self._hmac, counter, self._n_digits)
+
+    def get_otp_range(self, start, stop, workers=None, chunk_size=10000,
+                      max_in_flight=None):
+        """
+        Generate the HOTPs for counters start through stop - 1, in order.
+        Returns an iterator, so codes are streamed rather than all
+        held in memory. The current counter is not changed.
+
+        With more than one worker, the range is split into chunks that
+        are generated in a process pool. At most max_in_flight chunks
+        are submitted ahead of the one being yielded, so memory use stays
+        flat no matter how big the range is.
+
+        Args:
+          start (int): The first counter value
+          stop (int): One past the last counter value
+          workers (int, optional): The number of worker processes. None or
+                                   1 generates codes in this process
+                                   (default: None)
+          chunk_size (int, optional): How many codes each chunk of work
+                                      generates (default: 10000)
+          max_in_flight (int, optional): The most chunks submitted to the
+                                         pool at once
+                                         (default: 2 * workers)
+        """
+        if start < 0 or stop < start:
+            raise ValueError("Counter range must be non-negative and ordered")
+        if stop - 1 > 2**64 - 1:
+            raise ValueError("Counter must fit in a unsigned, 64-bit integer")
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive")
+        chunks = ((lo, min(lo + chunk_size, stop))
+                  for lo in range(start, stop, chunk_size))
+        args = (bytes(self._secret), self._algorithm_name, self._n_digits)
+        return chain.from_iterable(starmap_in_pool(
+            _generate_hotp_chunk, (args + chunk for chunk in chunks),
+            workers, max_in_flight))
+
     def compare(self, code, look_ahead=2):
         """
         Check the code to see if it's valid, comparing it to the
@@ -346,6 +995,23 @@ class HOTP(OTPBase):
         The current counter will be synchronized to match the code
         entered.
 
+        Args:
+          code (str): The code to check
+          look_ahead (int, optional): Check this many valid codes in the
+                                      future of the current code
+                                      (default: 2)
+        """
+        return self.verify(code, look_ahead) is not None
+
+    def verify(self, code, look_ahead=2):
+        """
+        Like compare, but returns how far ahead of the current counter
+        the matching code was (0 for the current counter), or None if
+        nothing matched.
+
+        The current counter will be synchronized to match the code
+        entered.
+
         Args:
           code (str): The code to check
           look_ahead (int, optional): Check this many valid codes in the
@@ -354,14 +1020,234 @@ class HOTP(OTPBase):
         """
         if look_ahead < 0:
             raise ValueError("Look-ahead must be non-negative")
-        counters = [self.counter + i
-                    for i in range(0, look_ahead + 1)]
-        valid_codes = [self.get_otp(counter) for counter in counters]
-        try:
-            is_valid = [self._compare(code, valid) for valid in valid_codes]
-            correct_idx = is_valid.index(True)
-        except ValueError:
-            return False
+        self._validate_code(code)
+        return self._verify_with(code, look_ahead, self._resync_index,
+                                 self.get_otp, constant_time_compare)
+
+    def compare_int(self, code, look_ahead=2):
+        """
+        Like compare, but for a code given as an integer, such as one
+        from get_otp_int. Returns True if the code is valid.
+
+        Args:
+          code (int): The code to check
+          look_ahead (int, optional): Check this many valid codes in the
+                                      future of the current code
+                                      (default: 2)
+        """
+        return self.verify_int(code, look_ahead) is not None
+
+    def verify_int(self, code, look_ahead=2):
+        """
+        Like verify, but for a code given as an integer. Codes are
+        computed and compared as integers, without formatting or
+        parsing any strings, except to look codes up in a resync index.
+
+        Args:
+          code (int): The code to check
+          look_ahead (int, optional): Check this many valid codes in the
+                                      future of the current code
+                                      (default: 2)
+        """
+        if look_ahead < 0:
+            raise ValueError("Look-ahead must be non-negative")
+        self._validate_int_code(code)
+        index = self._resync_index
+        if index is not None and look_ahead < index.size:
+            # the index is keyed by formatted codes
+            return self._verify_with(format_code(code, self._n_digits),
+                                     look_ahead, index, self.get_otp,
+                                     constant_time_compare)
+        keyed_hmac = self._hmac
+        n_digits = self._n_digits
+        return self._verify_with(
+            code, look_ahead, None,
+            lambda counter: self._get_keyed_otp_int(keyed_hmac, counter,
+                                                    n_digits),
+            constant_time_int_compare)
+
+    def _verify_with(self, code, look_ahead, index, get_code, equal):
+        """
+        Check a validated code against get_code(counter) for the current
+        counter and the look_ahead after it, comparing with equal, or
+        look it up in index (a resync index of formatted codes) if given
+        and big enough. Advances the counter past a match.
+        Returns how far ahead the match was, or None.
+        """
+        observer = self._verify_observer
+        if observer is not None:
+            started = _clock()
+        counter = self.counter
+        matched = None
+        if index is not None and look_ahead < index.size:
+            lock = self._counter_lock
+            if lock is not None:
+                lock.acquire()
+            try:
+                counter = self.counter
+                n_computed = index.n_computed
+                matched = index.find(self, code, counter, look_ahead)
+                n_hmacs = index.n_computed - n_computed
+            finally:
+                if lock is not None:
+                    lock.release()
         else:
-            self.counter = counters[correct_idx] + 1
+            n_hmacs = 0
+            for delta in range(0, look_ahead + 1):
+                n_hmacs += 1
+                if equal(code, get_code(counter + delta)):
+                    matched = counter + delta
+                    break
+        result = None
+        if matched is not None and self._advance_counter(matched + 1):
+            result = matched - counter
+        if observer is not None:
+            observer(self, None if matched is None else matched - counter,
+                     result is not None, n_hmacs, _clock() - started)
+        return result
+
+    def _advance_counter(self, new_counter):
+        """
+        Move the counter to new_counter after a code matched. When thread
+        safe, this is a compare-and-swap: the counter only ever moves
+        forward, and returns False (so the code is rejected) if another
+        thread already moved it past the matched code.
+        """
+        lock = self._counter_lock
+        if lock is None:
+            self.counter = new_counter
+            return True
+        with lock:
+            if self.counter >= new_counter:
+                return False
+            self.counter = new_counter
             return True
+
+    def _reserve_counter(self):
+        """
+        Return the current counter and increment it, atomically when
+        thread safe
+        """
+        lock = self._counter_lock
+        if lock is None:
+            counter = self.counter
+            self.counter += 1
+            return counter
+        with lock:
+            counter = self.counter
+            self.counter += 1
+            return counter
+
+    def enable_thread_safety(self):
+        """
+        Make counter updates safe when this HOTP is shared between
+        threads, with a lock per HOTP rather than one for all of them.
+
+        get_otp reserves its counter atomically, so concurrent calls
+        get distinct codes. verify and compare compute codes outside
+        the lock, then advance the counter with a compare-and-swap: the
+        counter never moves backwards, and if two threads match the same
+        code only one of them accepts it. With a resync index, the index
+        lookup is done while holding the lock.
+        """
+        if self._counter_lock is None:
+            self._counter_lock = threading.Lock()
+
+    def __getstate__(self):
+        """
+        Locks can't be pickled, so just record whether there was one.
+        The resync index is just precomputed codes, so only its size
+        is kept, and it's refilled as it's used.
+        """
+        state = super(HOTP, self).__getstate__()
+        state['_counter_lock'] = self._counter_lock is not None
+        index = self._resync_index
+        state['_resync_index'] = None if index is None else index.size
+        return state
+
+    def __setstate__(self, state):
+        super(HOTP, self).__setstate__(state)
+        self._counter_lock = None
+        self._resync_index = None
+        if state.get('_counter_lock'):
+            self.enable_thread_safety()
+        if state.get('_resync_index'):
+            self.enable_resync_index(state['_resync_index'])
+
+    def enable_resync_index(self, size=100):
+        """
+        Keep a map from code to counter for the next size counters,
+        so checking a code against a large look-ahead window is a
+        dictionary lookup instead of one HMAC per counter.
+
+        The map is extended as the counter advances and trimmed behind
+        it, so each code is only computed once. It's used by compare
+        and verify whenever look_ahead + 1 <= size, with the same result
+        as checking each counter in turn. Note the lookup isn't constant
+        time in the way that comparing each code is.
+
+        Args:
+          size (int, optional): How many counters, starting at the
+                                current one, to index (default: 100)
+        """
+        if size < 1:
+            raise ValueError("Index size must be positive")
+        self._resync_index = _ResyncIndex(size)
+
+    def disable_resync_index(self):
+        """
+        Stop using (and free) the resync index
+        """
+        self._resync_index = None
+
+
+class _ResyncIndex(object):
+    """
+    A sliding map from code to counters for the counters
+    [start, start + size) of an HOTP.
+    """
+
+    def __init__(self, size):
+        self.size = int(size)
+        self._codes = {}
+        self._window = deque()
+        self._start = 0
+        self._end = 0
+        # how many codes have been computed, for instrumentation
+        self.n_computed = 0
+
+    def find(self, otp, code, counter, look_ahead):
+        """
+        Return the lowest counter in [counter, counter + look_ahead]
+        whose code matches, or None.
+        """
+        self._sync(otp, counter)
+        counters = self._codes.get(code)
+        if counters and counters[0] <= counter + look_ahead:
+            return counters[0]
+        return None
+
+    def _sync(self, otp, counter):
+        """
+        Move the window to start at counter
+        """
+        if counter < self._start or counter >= self._end:
+            self._codes.clear()
+            self._window.clear()
+            self._start = self._end = counter
+
+        while self._start < counter:
+            old_code = self._window.popleft()
+            counters = self._codes[old_code]
+            counters.popleft()
+            if not counters:
+                del self._codes[old_code]
+            self._start += 1
+
+        stop = min(counter + self.size, 2**64)
+        while self._end < stop:
+            new_code = otp.get_otp(self._end)
+            self._window.append(new_code)
+            self._codes.setdefault(new_code, deque()).append(self._end)
+            self._end += 1
+            self.n_computed += 1
@@ -0,0 +1,49 @@
+"""
+Streaming work through a process pool with bounded memory, shared by the
+bulk loaders, the code generators and the command line.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from collections import deque
+from itertools import starmap
+
+
+__all__ = ['starmap_in_pool']
+
+
+def starmap_in_pool(function, arg_tuples, workers=None, max_in_flight=None):
+    """
+    Like itertools.starmap, but calling function in a process pool.
+    Returns an iterator of the results, in the same order as arg_tuples.
+
+    At most max_in_flight calls are submitted ahead of the result being
+    yielded, and arg_tuples is only read as far as that, so memory use
+    doesn't grow with the number of calls. function and its arguments
+    must be picklable, so function should be defined at module level.
+
+    Args:
+      function (function): The function to call
+      arg_tuples (iterable): The arguments for each call
+      workers (int, optional): The number of processes. None or 1 calls
+                               function in this process (default: None)
+      max_in_flight (int, optional): The most calls submitted to the
+                                     pool at once (default: 2 * workers)
+    """
+    if workers is None or workers <= 1:
+        return starmap(function, arg_tuples)
+    return _starmap_in_pool(function, arg_tuples, workers,
+                            max_in_flight or 2 * workers)
+
+
+def _starmap_in_pool(function, arg_tuples, workers, max_in_flight):
+    from concurrent.futures import ProcessPoolExecutor
+    in_flight = deque()
+    with ProcessPoolExecutor(workers) as executor:
+        for args in arg_tuples:
+            in_flight.append(executor.submit(function, *args))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
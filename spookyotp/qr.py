@@ -0,0 +1,130 @@
+"""
+QR code rendering for otpauth:// URIs.
+
+The qrcode package (and PIL, which it renders with) is only imported
+the first time a code is rendered, so processes that only generate
+and verify codes don't pay for loading it.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from collections import OrderedDict
+import io
+import threading
+
+
+__all__ = ['QRCodeCache', 'default_cache', 'render']
+
+
+class QRCodeCache(object):
+    """
+    Keeps the most recently rendered QR codes, keyed by URI, so showing
+    the same enrollment page again doesn't re-encode the QR matrix.
+
+    Images are shared between callers, so they shouldn't be modified.
+    Once max_entries is reached, the least recently used code is
+    dropped to make room.
+    """
+
+    def __init__(self, max_entries=128, thread_safe=False):
+        """
+        Args:
+          max_entries (int, optional): The most codes to keep
+                                       (default: 128)
+          thread_safe (bool, optional): Guard the cache with a lock so it
+                                        can be shared between threads
+                                        (default: False)
+        """
+        if max_entries < 1:
+            raise ValueError("Max entries must be positive")
+        self._max_entries = int(max_entries)
+        # uri -> [image, PNG bytes or None until first asked for]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock() if thread_safe else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_image(self, uri):
+        """
+        Return a QR code image (as generated by the qrcode package)
+        encoding the URI
+        """
+        if self._lock is None:
+            return self._get_entry(uri)[0]
+        with self._lock:
+            return self._get_entry(uri)[0]
+
+    def get_png(self, uri):
+        """
+        Return a QR code encoding the URI, as PNG bytes
+        """
+        if self._lock is None:
+            return self._get_png(uri)
+        with self._lock:
+            return self._get_png(uri)
+
+    def clear(self):
+        """
+        Forget every cached code
+        """
+        self._entries.clear()
+
+    def _get_png(self, uri):
+        entry = self._get_entry(uri)
+        if entry[1] is None:
+            stream = io.BytesIO()
+            entry[0].save(stream)
+            entry[1] = stream.getvalue()
+        return entry[1]
+
+    def _get_entry(self, uri):
+        entry = self._entries.get(uri)
+        if entry is not None:
+            self._move_to_end(uri)
+            return entry
+        entry = [_make(uri), None]
+        if len(self._entries) >= self._max_entries:
+            self._entries.popitem(last=False)
+        self._entries[uri] = entry
+        return entry
+
+    def _move_to_end(self, uri):
+        try:
+            self._entries.move_to_end(uri)
+        except AttributeError:
+            # Python 2 OrderedDict has no move_to_end
+            self._entries[uri] = self._entries.pop(uri)
+
+
+def render(uri, kind='png'):
+    """
+    Render a QR code encoding the URI, without caching it
+
+    Args:
+      uri (str): The URI to encode
+      kind (str, optional): 'png' or 'svg' (default: 'png')
+
+    Returns:
+      bytes: The image file's contents
+    """
+    if kind == 'png':
+        img = _make(uri)
+    elif kind == 'svg':
+        from qrcode.image.svg import SvgImage
+        img = _make(uri, image_factory=SvgImage)
+    else:
+        raise ValueError("Not a valid image kind: '{}'".format(kind))
+    stream = io.BytesIO()
+    img.save(stream)
+    return stream.getvalue()
+
+
+def _make(uri, image_factory=None):
+    import qrcode
+    return qrcode.make(uri, image_factory=image_factory)
+
+
+# used by OTPBase.get_qr_code and friends
+default_cache = QRCodeCache(thread_safe=True)
@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from collections import OrderedDict
+import threading
+
+
+__all__ = ['UsedCodeCache']
+
+
+class UsedCodeCache(object):
+    """
+    Remembers which TOTP time steps have already been used for each
+    credential, so the same code can't be accepted twice.
+
+    Entries expire once their time step has left the window that
+    TOTP.verify would still accept, so the cache only ever holds
+    codes from the last few periods. As a hard cap, once max_entries
+    is reached the oldest entry is dropped to make room. That entry's
+    code could then be replayed while it's still in the window, so
+    max_entries should be comfortably larger than the number of
+    logins expected in one window.
+    """
+
+    def __init__(self, max_entries=100000, thread_safe=False):
+        """
+        Args:
+          max_entries (int, optional): The most (credential, step) pairs
+                                       to remember (default: 100000)
+          thread_safe (bool, optional): Guard the cache with a lock so it
+                                        can be shared between threads
+                                        (default: False)
+        """
+        if max_entries < 1:
+            raise ValueError("Max entries must be positive")
+        self._max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock() if thread_safe else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def consume(self, credential, step, current_step, max_step_difference):
+        """
+        Mark a time step as used for a credential.
+        Returns True if it hadn't been used yet, False if it's a replay.
+
+        Args:
+          credential (hashable): Identifies the credential the code is for
+          step (int): The time step the code was generated for
+          current_step (int): The time step right now
+          max_step_difference (int): The window the code was checked with
+        """
+        if self._lock is None:
+            return self._consume(credential, step, current_step,
+                                 max_step_difference)
+        with self._lock:
+            return self._consume(credential, step, current_step,
+                                 max_step_difference)
+
+    def _consume(self, credential, step, current_step, max_step_difference):
+        self._expire(current_step)
+        key = (credential, step)
+        if key in self._entries:
+            return False
+        if len(self._entries) >= self._max_entries:
+            self._entries.popitem(last=False)
+        # once the current step passes this, the step is outside
+        # the window and can't be accepted anyway
+        self._entries[key] = step + max_step_difference + 1
+        return True
+
+    def _expire(self, current_step):
+        """
+        Drop entries from the oldest end until one is still live.
+        Entries are added roughly in time order, so this removes
+        nearly everything that has expired without a full scan.
+        """
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            if entries[key] > current_step:
+                break
+            del entries[key]
+
+    def clear(self):
+        """
+        Forget every used code.
+        """
+        self._entries.clear()
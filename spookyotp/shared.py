@@ -0,0 +1,188 @@
+"""
+Share one copy of many credentials between processes, such as the
+workers of a prefork server, using multiprocessing.shared_memory.
+
+Requires Python 3.8 or newer and a POSIX system, so it isn't imported
+by the spookyotp package; import it as spookyotp.shared.
+"""
+import fcntl
+import os
+import tempfile
+import threading
+from multiprocessing import shared_memory
+from spookyotp.otp import OTPBase, constant_time_compare
+from spookyotp.mapped import (_RecordStore, _HEADER, _RECORD, _MAGIC,
+                              _VERSION)
+from spookyotp.table import _HOTP
+
+
+__all__ = ['SharedCredentialStore']
+
+
+class SharedCredentialStore(_RecordStore):
+    """
+    Credential records, laid out like a MappedCredentialStore, in a
+    named shared memory segment. One process creates the store, and
+    any number of others attach to it by name, which takes about as
+    long as opening a file no matter how many credentials it holds.
+    Every process then checks codes against the same copy.
+
+    HOTP counters live in the segment too, so every process sees every
+    counter update. Codes are computed without holding any lock, then
+    the counter is advanced with a compare-and-swap under a lock on
+    just that row: the counter only moves forward, and a code is only
+    accepted once across all processes. The row locks are POSIX
+    byte-range locks on a small lock file, so they work between
+    processes that were never forked from each other.
+
+    The segment has a fixed size, so every credential is added when
+    the store is created. Rows are numbered in the order given.
+    """
+
+    def __init__(self, shm, lock_path, owner):
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        self._lock_path = lock_path
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        # byte-range locks are held per process, so threads in this
+        # process take turns on the same row through this lock
+        self._thread_lock = threading.Lock()
+        self._read_header()
+
+    @classmethod
+    def create(cls, otps, name=None, lock_path=None):
+        """
+        Create a new store holding the given TOTPs and HOTPs.
+        The creating process owns the segment, and should call unlink()
+        once no process needs it any more.
+
+        Args:
+          otps (sequence): The credentials, in row order
+          name (str, optional): The shared memory name. (default: a new,
+                                unique name; see the name property)
+          lock_path (str, optional): The file used for row locks
+                                     (default: one in the temporary
+                                     directory, named after the segment)
+        """
+        records = [cls._pack_record(otp) for otp in otps]
+        size = _HEADER.size + max(len(records), 1) * _RECORD.size
+        shm = shared_memory.SharedMemory(name, create=True, size=size)
+        try:
+            for i, record in enumerate(records):
+                _RECORD.pack_into(shm.buf, _HEADER.size + i * _RECORD.size,
+                                  *record)
+            _HEADER.pack_into(shm.buf, 0, _MAGIC, _VERSION, _RECORD.size,
+                              len(records), len(records))
+            return cls(shm, lock_path or _default_lock_path(shm.name), True)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @classmethod
+    def attach(cls, name, lock_path=None):
+        """
+        Attach to a store another process created
+
+        Args:
+          name (str): The store's name
+          lock_path (str, optional): The file used for row locks; must
+                                     match the one the store was created
+                                     with (default: the same default)
+        """
+        shm = _attach_segment(name)
+        try:
+            return cls(shm, lock_path or _default_lock_path(name), False)
+        except BaseException:
+            shm.close()
+            raise
+
+    @property
+    def name(self):
+        """
+        The name other processes attach with
+        """
+        return self._shm.name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Detach this process from the store. The segment stays
+        until the owner unlinks it.
+        """
+        if self._buf is not None:
+            self._buf = None
+            self._shm.close()
+            os.close(self._lock_fd)
+
+    def unlink(self):
+        """
+        Destroy the segment and the lock file. Only the owner should do
+        this, once no other process needs the store.
+        """
+        if not self._owner:
+            raise ValueError("Only the creating process can unlink a store")
+        self._shm.unlink()
+        try:
+            os.unlink(self._lock_path)
+        except OSError:
+            pass
+
+    def verify(self, row, code, timestamp=None, max_step_difference=1,
+               look_ahead=2):
+        if self._row_type(row) != _HOTP:
+            return super(SharedCredentialStore, self).verify(
+                row, code, timestamp, max_step_difference, look_ahead)
+        OTPBase._validate_code(code)
+        if look_ahead < 0:
+            raise ValueError("Look-ahead must be non-negative")
+        counter = self._row_counter(row)
+        for delta in range(0, look_ahead + 1):
+            if constant_time_compare(code, self._get_otp(row, counter + delta)):
+                if self._advance_counter(row, counter + delta + 1):
+                    return delta
+                return None
+        return None
+    verify.__doc__ = _RecordStore.verify.__doc__
+
+    def _advance_counter(self, row, new_counter):
+        """
+        Set the row's counter to new_counter if it's still below it.
+        Returns False if another process or thread got there first.
+        """
+        with self._thread_lock:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, row)
+            try:
+                if self._row_counter(row) >= new_counter:
+                    return False
+                self._set_row_counter(row, new_counter)
+                return True
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, row)
+
+
+def _default_lock_path(name):
+    return os.path.join(tempfile.gettempdir(),
+                        'spookyotp-{}.lock'.format(name.lstrip('/')))
+
+
+def _attach_segment(name):
+    """
+    Attach to an existing segment without letting this process's
+    resource tracker destroy it when this process exits
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # track is Python 3.13+; before that, every process that
+        # attaches registers the segment to be unlinked at exit
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
@@ -0,0 +1,369 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+from spookyotp.otp import OTPBase, HOTP, TOTP, from_uri, _is_valid_code
+
+
+__all__ = ['StorageBackend', 'MemoryBackend', 'SQLiteBackend']
+
+
+class StorageBackend(object):
+    """
+    Keeps credentials, HOTP counters and used TOTP steps somewhere that
+    outlives the OTP objects.
+
+    Subclasses implement get_many, put, delete, advance_counters,
+    consume_steps and transaction. The batch methods take many
+    operations at once, and every method called inside one transaction
+    is committed together, so a verifier can handle many requests with
+    one round trip. verify_many does that for a whole batch of codes.
+
+    A backend can be passed as used_codes to TOTP.verify and compare,
+    in place of a UsedCodeCache.
+    """
+
+    def get_many(self, keys):
+        """
+        Return {key: TOTP or HOTP} for those keys that are stored
+        """
+        raise NotImplementedError()
+
+    def put(self, key, otp):
+        """
+        Store a TOTP or HOTP under a key, replacing any already there.
+        HOTP counters are stored as they are now.
+        """
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """
+        Remove a credential, if it's stored
+        """
+        raise NotImplementedError()
+
+    def advance_counters(self, updates):
+        """
+        Move HOTP counters forward. Each update only applies if the
+        stored counter is below the new one, so counters never move
+        backwards and a code can only be accepted once.
+        Returns a list of bools, True for each update that applied.
+
+        Args:
+          updates (iterable): (key, new counter) pairs
+        """
+        raise NotImplementedError()
+
+    def consume_steps(self, entries):
+        """
+        Mark TOTP time steps as used, like UsedCodeCache.consume.
+        Entries that are no longer needed once the current step passes
+        their expiry step may be dropped. Returns a list of bools,
+        True for each step that hadn't been used yet.
+
+        Args:
+          entries (iterable): (credential, step, current step,
+                              expiry step) tuples
+        """
+        raise NotImplementedError()
+
+    def transaction(self):
+        """
+        Return a context manager; everything done inside it is
+        committed together. Backends that can roll back do so if it
+        raises.
+        """
+        raise NotImplementedError()
+
+    def get(self, key):
+        """
+        Return the TOTP or HOTP stored under a key, or None
+        """
+        return self.get_many([key]).get(key)
+
+    def advance_counter(self, key, new_counter):
+        """
+        Like advance_counters, for one counter
+        """
+        return self.advance_counters([(key, new_counter)])[0]
+
+    def consume(self, credential, step, current_step, max_step_difference):
+        """
+        Mark a time step as used for a credential, with the same
+        arguments and result as UsedCodeCache.consume
+        """
+        return self.consume_steps([(credential, step, current_step,
+                                    step + max_step_difference + 1)])[0]
+
+    def verify_many(self, items, timestamp=None, max_step_difference=1,
+                    look_ahead=2):
+        """
+        Check codes for many stored credentials. Returns a list of
+        bools, one per item, in the same order as the items.
+
+        Every credential is loaded with one get_many, and the counter
+        updates and used steps for the whole batch are written in one
+        transaction. TOTP codes are rejected if already used, and HOTP
+        codes if the stored counter has already passed them. Unknown
+        keys and malformed codes are reported as False.
+
+        Args:
+          items (iterable): (key, code) pairs
+          timestamp (int or float, optional): The timestamp used to check
+                                              every TOTP code, in seconds
+                                              since an epoch (default: now)
+          max_step_difference (int, optional): Passed on to TOTP checks
+                                               (default: 1)
+          look_ahead (int, optional): Passed on to HOTP checks (default: 2)
+        """
+        if max_step_difference < 0:
+            raise ValueError("Max step difference must be non-negative")
+        if look_ahead < 0:
+            raise ValueError("Look-ahead must be non-negative")
+        if timestamp is None:
+            timestamp = time.time()
+        timestamp = int(timestamp)
+
+        items = list(items)
+        otps = self.get_many(set(key for key, _ in items))
+        results = [False] * len(items)
+        steps = []
+        counters = []
+        for i, (key, code) in enumerate(items):
+            otp = otps.get(key)
+            if otp is None or not _is_valid_code(code):
+                continue
+            if isinstance(otp, TOTP):
+                step = timestamp // otp._period
+                offset = otp._verify_step(code, step, max_step_difference)
+                if offset is not None:
+                    # keyed like TOTP.verify keys used_codes, so codes
+                    # used either way are only accepted once
+                    steps.append((i, (otp._credential_key(), step + offset,
+                                      step, step + offset +
+                                      max_step_difference + 1)))
+            elif otp.verify(code, look_ahead) is not None:
+                counters.append((i, (key, otp.counter)))
+
+        with self.transaction():
+            for pending, write in ((steps, self.consume_steps),
+                                   (counters, self.advance_counters)):
+                if pending:
+                    indexes, args = zip(*pending)
+                    for i, applied in zip(indexes, write(args)):
+                        results[i] = applied
+        return results
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Keeps everything in dicts in this process; mostly for tests, and as
+    a model for other backends. Thread safe.
+    """
+
+    def __init__(self):
+        # key -> (uri, counter)
+        self._credentials = {}
+        # credential -> {step: expiry step}
+        self._used_steps = {}
+        self._lock = threading.RLock()
+
+    def get_many(self, keys):
+        with self._lock:
+            stored = dict((key, self._credentials[key]) for key in keys
+                          if key in self._credentials)
+        return dict((key, _build(uri, counter))
+                    for key, (uri, counter) in stored.items())
+
+    def put(self, key, otp):
+        uri, counter = _unbuild(otp)
+        with self._lock:
+            self._credentials[key] = (uri, counter)
+
+    def delete(self, key):
+        with self._lock:
+            self._credentials.pop(key, None)
+
+    def advance_counters(self, updates):
+        results = []
+        with self._lock:
+            for key, new_counter in updates:
+                stored = self._credentials.get(key)
+                if stored is None or stored[1] is None or \
+                        stored[1] >= new_counter:
+                    results.append(False)
+                    continue
+                self._credentials[key] = (stored[0], new_counter)
+                results.append(True)
+        return results
+
+    def consume_steps(self, entries):
+        results = []
+        with self._lock:
+            for credential, step, current_step, expires in entries:
+                used = self._used_steps.setdefault(credential, {})
+                for old_step in [s for s, e in used.items()
+                                 if e <= current_step]:
+                    del used[old_step]
+                if step in used:
+                    results.append(False)
+                else:
+                    used[step] = expires
+                    results.append(True)
+        return results
+
+    @contextmanager
+    def transaction(self):
+        # Everything is applied as it goes, so this only holds the lock
+        with self._lock:
+            yield
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Keeps everything in an SQLite database. Credentials are stored as
+    otpauth:// URIs, which include the secret, so the database should
+    be protected accordingly.
+
+    One connection is shared, guarded by a lock, so a backend can be
+    used from several threads. Several processes can use the same
+    database file; counter updates and used steps stay correct because
+    each is a single conditional statement.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        """
+        Args:
+          path (str): The database file, or ':memory:'
+          timeout (float, optional): How long to wait for another
+                                     connection's lock, in seconds
+                                     (default: 5.0)
+        """
+        self._connection = sqlite3.connect(path, timeout=timeout,
+                                           isolation_level=None,
+                                           check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        with self.transaction():
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS credentials ('
+                'key TEXT PRIMARY KEY, uri TEXT NOT NULL, counter INTEGER)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS used_steps ('
+                'credential TEXT NOT NULL, step INTEGER NOT NULL, '
+                'expires INTEGER NOT NULL, PRIMARY KEY (credential, step))')
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute('BEGIN IMMEDIATE')
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute('COMMIT')
+
+    def get_many(self, keys):
+        keys = list(keys)
+        result = {}
+        with self._lock:
+            # stay well under SQLite's limit on bound parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._connection.execute(
+                    'SELECT key, uri, counter FROM credentials '
+                    'WHERE key IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk).fetchall()
+                for key, uri, counter in rows:
+                    result[key] = _build(uri, counter)
+        return result
+
+    def put(self, key, otp):
+        uri, counter = _unbuild(otp)
+        with self.transaction():
+            self._connection.execute(
+                'INSERT OR REPLACE INTO credentials (key, uri, counter) '
+                'VALUES (?, ?, ?)', (key, uri, counter))
+
+    def delete(self, key):
+        with self.transaction():
+            self._connection.execute('DELETE FROM credentials WHERE key = ?',
+                                     (key,))
+
+    def advance_counters(self, updates):
+        results = []
+        with self.transaction():
+            for key, new_counter in updates:
+                cursor = self._connection.execute(
+                    'UPDATE credentials SET counter = ? '
+                    'WHERE key = ? AND counter < ?',
+                    (new_counter, key, new_counter))
+                results.append(cursor.rowcount == 1)
+        return results
+
+    def consume_steps(self, entries):
+        entries = [(_credential_text(credential), step, current_step, expires)
+                   for credential, step, current_step, expires in entries]
+        results = []
+        with self.transaction():
+            for credential, _, current_step, _ in entries:
+                self._connection.execute(
+                    'DELETE FROM used_steps '
+                    'WHERE credential = ? AND expires <= ?',
+                    (credential, current_step))
+            for credential, step, _, expires in entries:
+                cursor = self._connection.execute(
+                    'INSERT OR IGNORE INTO used_steps '
+                    '(credential, step, expires) VALUES (?, ?, ?)',
+                    (credential, step, expires))
+                results.append(cursor.rowcount == 1)
+        return results
+
+
+def _unbuild(otp):
+    """
+    Return (uri, counter) to store for an OTP; counter is None for TOTPs
+    """
+    if isinstance(otp, HOTP):
+        return otp.get_uri(), otp.counter
+    if isinstance(otp, OTPBase):
+        return otp.get_uri(), None
+    raise TypeError("Can only store TOTP or HOTP credentials")
+
+
+def _build(uri, counter):
+    otp = from_uri(uri)
+    if counter is not None:
+        otp.counter = counter
+    return otp
+
+
+def _credential_text(credential):
+    """
+    Used step credentials can be any hashable that callers of consume
+    pass, so store them as JSON unless they're text
+    """
+    if isinstance(credential, type('')):
+        return credential
+    return json.dumps(credential)
@@ -0,0 +1,178 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from array import array
+import time
+from spookyotp.otp import (OTPBase, HOTP, TOTP, constant_time_compare,
+                           _window_offsets)
+
+
+__all__ = ['CredentialTable']
+
+
+_TOTP = 0
+_HOTP = 1
+
+
+class _RowVerifier(object):
+    """
+    Code generation and checking for stores that keep credentials as
+    numbered rows. Subclasses provide _row_type, _row_period,
+    _row_counter, _set_row_counter and _get_otp(row, counter).
+    """
+
+    def get_otp(self, row, timestamp=None, counter=None):
+        """
+        Get the code for a row, like TOTP.get_otp or HOTP.get_otp.
+        HOTP counters aren't incremented.
+
+        Args:
+          row (int): The row of the credential
+          timestamp (int or float, optional): For TOTP rows, the timestamp
+                                              to get a code for
+                                              (default: now)
+          counter (int, optional): For HOTP rows, the counter to get a code
+                                   for (default: the row's counter)
+        """
+        if self._row_type(row) == _TOTP:
+            if timestamp is None:
+                timestamp = time.time()
+            counter = int(timestamp) // self._row_period(row)
+        elif counter is None:
+            counter = self._row_counter(row)
+        return self._get_otp(row, counter)
+
+    def verify(self, row, code, timestamp=None, max_step_difference=1,
+               look_ahead=2):
+        """
+        Check a code for a row, like TOTP.verify or HOTP.verify.
+        Returns the matching offset, or None. HOTP rows have their
+        counter synchronized just like HOTP.verify.
+
+        Args:
+          row (int): The row of the credential
+          code (str): The code to check
+          timestamp (int or float, optional): For TOTP rows, the timestamp
+                                              to check the code at
+                                              (default: now)
+          max_step_difference (int, optional): For TOTP rows, check +/-
+                                               this many time steps
+                                               (default: 1)
+          look_ahead (int, optional): For HOTP rows, check this many
+                                      counters ahead (default: 2)
+        """
+        OTPBase._validate_code(code)
+        if self._row_type(row) == _TOTP:
+            if max_step_difference < 0:
+                raise ValueError("Max step difference must be non-negative")
+            if timestamp is None:
+                timestamp = time.time()
+            step = int(timestamp) // self._row_period(row)
+            for offset in _window_offsets(max_step_difference):
+                if constant_time_compare(code,
+                                         self._get_otp(row, step + offset)):
+                    return offset
+            return None
+
+        if look_ahead < 0:
+            raise ValueError("Look-ahead must be non-negative")
+        counter = self._row_counter(row)
+        for delta in range(0, look_ahead + 1):
+            if constant_time_compare(code, self._get_otp(row, counter + delta)):
+                self._set_row_counter(row, counter + delta + 1)
+                return delta
+        return None
+
+    def _check_type(self, row, otp_type):
+        if self._row_type(row) != otp_type:
+            raise ValueError("Row {} is not an {}".format(
+                row, 'HOTP' if otp_type == _HOTP else 'TOTP'))
+
+
+class CredentialTable(_RowVerifier):
+    """
+    A compact, column-oriented table of TOTP/HOTP credentials, for
+    keeping millions of them in memory at once.
+
+    Each credential is a row. Secrets are packed into one contiguous
+    buffer, and the other parameters are stored as small integers in
+    array columns, instead of one object (with its own __dict__) per
+    credential. Only what's needed to generate and check codes is kept,
+    so the issuer and account aren't; callers keep their own mapping
+    from account to row.
+
+    No pre-keyed HMAC is kept per row, so each code costs a little
+    more CPU than with a TOTP/HOTP object in exchange for the memory.
+    """
+
+    def __init__(self):
+        self._secrets = bytearray()
+        self._offsets = array(str('Q'), [0])
+        self._types = array(str('B'))
+        self._n_digits = array(str('B'))
+        self._algorithms = array(str('B'))
+        self._periods = array(str('I'))
+        self._counters = array(str('Q'))
+        self._algorithm_names = []
+        self._algorithm_lookup = {}
+
+    def __len__(self):
+        return len(self._types)
+
+    def append(self, otp):
+        """
+        Add a TOTP or HOTP as a new row. Returns the row number.
+        """
+        if isinstance(otp, TOTP):
+            otp_type, period, counter = _TOTP, otp._period, 0
+        elif isinstance(otp, HOTP):
+            otp_type, period, counter = _HOTP, 0, otp.counter
+        else:
+            raise TypeError("Can only store TOTP or HOTP credentials")
+
+        algorithm_name = otp._algorithm_name
+        if algorithm_name not in self._algorithm_lookup:
+            self._algorithm_lookup[algorithm_name] = len(self._algorithm_names)
+            self._algorithm_names.append(algorithm_name)
+
+        self._secrets.extend(otp._secret)
+        self._offsets.append(len(self._secrets))
+        self._types.append(otp_type)
+        self._n_digits.append(otp._n_digits)
+        self._algorithms.append(self._algorithm_lookup[algorithm_name])
+        self._periods.append(period)
+        self._counters.append(counter)
+        return len(self._types) - 1
+
+    def extend(self, otps):
+        """
+        Add many TOTPs or HOTPs as new rows
+        """
+        for otp in otps:
+            self.append(otp)
+
+    def get_counter(self, row):
+        """
+        Return the current counter of an HOTP row
+        """
+        self._check_type(row, _HOTP)
+        return self._counters[row]
+
+    def _row_type(self, row):
+        return self._types[row]
+
+    def _row_period(self, row):
+        return self._periods[row]
+
+    def _row_counter(self, row):
+        return self._counters[row]
+
+    def _set_row_counter(self, row, counter):
+        self._counters[row] = counter
+
+    def _get_otp(self, row, counter):
+        secret = self._secrets[self._offsets[row]:self._offsets[row + 1]]
+        algorithm_name = self._algorithm_names[self._algorithms[row]]
+        return OTPBase._get_otp(secret, counter, self._n_digits[row],
+                                OTPBase._get_algorithm(algorithm_name))
@@ -0,0 +1,23 @@
+from spookyotp.otp import HOTP, TOTP
+
+
+class CredentialFixture(object):
+    """
+    Mixin for tests of the credential stores. Sets up self.now, a TOTP
+    with non-default parameters on a clock fixed at self.now, and the
+    RFC 4226 test HOTP at hotp_counter.
+
+        class TestStore(CredentialFixture, unittest.TestCase):
+            def setUp(self):
+                super(TestStore, self).setUp()
+                ...
+    """
+    hotp_counter = 7
+
+    def setUp(self):
+        self.now = 1414782000
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                         n_digits=8, algorithm='sha256', period=60,
+                         time_source=lambda: self.now)
+        self.hotp = HOTP(bytearray(b'12345678901234567890'), 'test',
+                         counter=self.hotp_counter)
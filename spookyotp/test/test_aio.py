@@ -0,0 +1,145 @@
+import sys
+import unittest
+if sys.version_info < (3, 7):
+    raise unittest.SkipTest("asyncio tests need Python 3.7+")
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from spookyotp.otp import HOTP, TOTP
+from spookyotp.aio import AsyncVerifier, VerifierBusy
+
+
+class TestAsyncVerifier(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.secret = bytearray(b'\x17\r\xc4.\xca\xe8\x1c\x88\xbaB')
+        self.totp = TOTP(self.secret, 'test', 'test_user',
+                         time_source=lambda: self.now)
+        self.hotp = HOTP(self.secret, 'test', 'test_user', counter=10)
+
+    def test_verify_totp(self):
+        """
+        verify should give the same offsets as TOTP.verify
+        """
+        verifier = AsyncVerifier()
+        for offset in (-1, 0, 1):
+            code = self.totp.get_otp(self.now + 30 * offset)
+            result = asyncio.run(verifier.verify(self.totp, code))
+            self.assertEqual(result, offset)
+        code = self.totp.get_otp(self.now + 60)
+        self.assertFalse(asyncio.run(verifier.compare(self.totp, code)))
+        self.assertEqual(verifier.stats()['completed'], 4)
+
+    def test_verify_totp_drift_tracking(self):
+        """
+        verify should check the window around the tracked drift, and
+        never accept codes past max_drift
+        """
+        verifier = AsyncVerifier()
+        self.totp.enable_drift_tracking(max_drift=5, drift=-3)
+        code = self.totp.get_otp(self.now - 90)
+        self.assertEqual(self.totp.verify(code, 1), -3)
+        self.assertEqual(asyncio.run(verifier.verify(self.totp, code)), -3)
+
+        self.totp.enable_drift_tracking(max_drift=0)
+        code = self.totp.get_otp(self.now + 30)
+        self.assertIsNone(self.totp.verify(code, 1))
+        self.assertIsNone(asyncio.run(verifier.verify(self.totp, code)))
+        self.assertEqual(self.totp.drift, 0)
+
+    def test_verify_hotp_in_order(self):
+        """
+        Concurrent HOTP checks should each advance the counter in turn
+        """
+        verifier = AsyncVerifier()
+        codes = [self.hotp.get_otp(counter) for counter in range(10, 15)]
+
+        async def check_all():
+            return await asyncio.gather(*[verifier.verify(self.hotp, code)
+                                          for code in codes])
+        self.assertEqual(asyncio.run(check_all()), [0, 0, 0, 0, 0])
+        self.assertEqual(self.hotp.counter, 15)
+
+    def test_verify_hotp_mixed_with_sync(self):
+        """
+        An async check that finishes after a sync check has moved the
+        counter past it should be rejected, not move the counter back
+        """
+        self.hotp.enable_thread_safety()
+        verifier = AsyncVerifier()
+
+        async def check():
+            task = asyncio.ensure_future(
+                verifier.verify(self.hotp, self.hotp.get_otp(11), look_ahead=5))
+            # let the async check start computing codes
+            await asyncio.sleep(0)
+            self.assertEqual(self.hotp.verify(self.hotp.get_otp(14), 5), 4)
+            return await task
+        self.assertIsNone(asyncio.run(check()))
+        self.assertEqual(self.hotp.counter, 15)
+
+    def test_verify_in_process_pool(self):
+        """
+        verify should work with a process pool
+        """
+        with ProcessPoolExecutor(1) as executor:
+            verifier = AsyncVerifier(executor)
+            code = self.hotp.get_otp(12)
+            self.assertEqual(asyncio.run(verifier.verify(self.hotp, code)), 2)
+            self.assertEqual(self.hotp.counter, 13)
+
+    def test_max_waiting(self):
+        """
+        Checks beyond max_waiting should be refused
+        """
+        verifier = AsyncVerifier(max_concurrency=1, max_waiting=1)
+        code = self.totp.get_otp()
+
+        async def check_all():
+            return await asyncio.gather(
+                *[verifier.compare(self.totp, code) for _ in range(3)],
+                return_exceptions=True)
+        results = asyncio.run(check_all())
+        self.assertIn(True, results)
+        self.assertTrue(any(isinstance(result, VerifierBusy)
+                            for result in results))
+        self.assertGreater(verifier.stats()['rejected'], 0)
+
+    def test_max_waiting_hotp(self):
+        """
+        Checks queued behind another on the same HOTP should count as
+        waiting, and be refused beyond max_waiting
+        """
+        verifier = AsyncVerifier(max_waiting=1)
+        code = self.hotp.get_otp(10)
+
+        async def check_all():
+            tasks = [asyncio.ensure_future(verifier.verify(self.hotp, code))
+                     for _ in range(3)]
+            # let the first check start and the others queue up
+            await asyncio.sleep(0)
+            waiting = verifier.stats()['waiting']
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            return waiting, results
+        waiting, results = asyncio.run(check_all())
+        self.assertEqual(waiting, 1)
+        self.assertEqual(results[:2], [0, None])
+        self.assertIsInstance(results[2], VerifierBusy)
+        self.assertEqual(verifier.stats()['rejected'], 1)
+        self.assertEqual(verifier.stats()['waiting'], 0)
+
+    def test_verify_raises(self):
+        """
+        verify should raise on bad codes and arguments
+        """
+        verifier = AsyncVerifier()
+        self.assertRaises(ValueError, asyncio.run,
+                          verifier.verify(self.totp, 'abcdef'))
+        self.assertRaises(ValueError, asyncio.run,
+                          verifier.verify(self.hotp, '123456', look_ahead=-1))
+        self.assertRaises(TypeError, asyncio.run,
+                          verifier.verify(object(), '123456'))
+        self.assertRaises(ValueError, AsyncVerifier, max_concurrency=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from spookyotp.otp import HOTP, TOTP
+from spookyotp.bulk import iter_uris, load_uri_file
+
+
+class TestIterUris(unittest.TestCase):
+    def setUp(self):
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                         n_digits=8, algorithm='sha256', period=60)
+        self.hotp = HOTP('CERDGRCVMZ3YRGNK', 'test', counter=7)
+        self.lines = [self.totp.get_uri() + '\n',
+                      '\n',
+                      'not a uri\n',
+                      'otpauth://motp/test?secret=CERDGRCVMZ3YRGNK\n',
+                      self.hotp.get_uri() + '\n']
+        self.errors = []
+
+    def on_error(self, line_number, line, error):
+        self.errors.append((line_number, line))
+
+    def assert_loaded(self, otps):
+        self.assertEqual([otp.get_uri() for otp in otps],
+                         [self.totp.get_uri(), self.hotp.get_uri()])
+        self.assertEqual(self.errors, [
+            (3, 'not a uri'),
+            (4, 'otpauth://motp/test?secret=CERDGRCVMZ3YRGNK')])
+
+    def test_iter_uris(self):
+        """
+        Good lines should be loaded in order, and bad ones reported
+        """
+        self.assert_loaded(list(iter_uris(self.lines, self.on_error,
+                                          chunk_size=2)))
+
+    def test_iter_uris_lazy(self):
+        """
+        Secrets should only be decoded on first use, unless lazy is off
+        """
+        otp = next(iter_uris(self.lines))
+        self.assertNotIn('_secret', otp.__dict__)
+        otp.get_otp(0)
+        self.assertIn('_secret', otp.__dict__)
+
+        otp = next(iter_uris(self.lines, lazy=False))
+        self.assertIn('_secret', otp.__dict__)
+
+    def test_iter_uris_bad_secret(self):
+        """
+        Bad secrets should be reported while loading, lazy or not
+        """
+        lines = ['otpauth://totp/test?secret=1',
+                 'otpauth://totp/test?secret=NOT-BASE32!',
+                 'otpauth://totp/test?secret=CERDGRCVMZ3YRGN',
+                 'otpauth://totp/test?secret=CERDGRCVMZ3YRG%3D%3D',
+                 'otpauth://totp/test?secret=MZXW6%3D%3D%3D']
+        otp, = iter_uris(lines, self.on_error)
+        self.assertEqual(otp.get_otp(0), TOTP('MZXW6===', 'test').get_otp(0))
+        self.assertEqual([line_number for line_number, _ in self.errors],
+                         [1, 2, 3, 4])
+
+        self.assertEqual(len(list(iter_uris(lines, self.on_error,
+                                            lazy=False))), 1)
+        self.assertEqual(len(self.errors), 8)
+
+    def test_iter_uris_workers(self):
+        """
+        Parsing in a process pool should give the same results
+        """
+        self.assert_loaded(list(iter_uris(self.lines, self.on_error,
+                                          workers=2, chunk_size=1,
+                                          max_in_flight=2)))
+
+    def test_iter_uris_raises(self):
+        self.assertRaises(ValueError, list,
+                          iter_uris(self.lines, chunk_size=0))
+
+    def test_load_uri_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'uris.txt')
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(''.join(self.lines))
+            self.assert_loaded(list(load_uri_file(path,
+                                                  on_error=self.on_error)))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
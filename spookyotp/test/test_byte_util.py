@@ -1,6 +1,22 @@
+import hashlib
 import unittest
+import mock
 from spookyotp.byte_util import (int_to_bytearray,
-                                 bytes_to_31_bit_int)
+                                 bytes_to_31_bit_int,
+                                 pack_counter,
+                                 dynamic_truncate,
+                                 truncate_digest,
+                                 truncate_digests)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# HMAC-SHA1 digests for the RFC 4226 test secret, counters 0 and 1
+RFC_4226_DIGESTS = [
+    bytearray.fromhex('cc93cf18508d94934c64b65d8ba7667fb7cde4b0'),
+    bytearray.fromhex('75a48a19d4cbe100644e8ac1397eea747a2d33ab'),
+]
 
 
 class TestByteUtil(unittest.TestCase):
@@ -39,6 +55,92 @@ class TestByteUtil(unittest.TestCase):
         self.assertEqual(bytes_to_31_bit_int(bytearray(b'\x77\x11\xaa\xff')),
                          1997646591)
 
+    def test_pack_counter(self):
+        """
+        pack_counter should match int_to_bytearray, errors included
+        """
+        for number in (0, 1, 17848395054321, 2**64 - 1):
+            packed = pack_counter(number)
+            self.assertIsInstance(packed, bytes)
+            self.assertEqual(packed, int_to_bytearray(number))
+        self.assertRaises(ValueError, pack_counter, 2**64)
+        self.assertRaises(ValueError, pack_counter, -1)
+        self.assertRaises(TypeError, pack_counter, 12.34)
+
+    def test_dynamic_truncate(self):
+        """
+        dynamic_truncate should give the RFC 4226 truncated values
+        """
+        self.assertEqual(dynamic_truncate(RFC_4226_DIGESTS[0]), 1284755224)
+        self.assertEqual(dynamic_truncate(memoryview(RFC_4226_DIGESTS[1])),
+                         1094287082)
+
+    def test_truncate_digest(self):
+        """
+        truncate_digest should accept any bytes-like digest
+        """
+        for digest in RFC_4226_DIGESTS[:1]:
+            for as_type in (bytes, bytearray, memoryview):
+                self.assertEqual(truncate_digest(as_type(digest), 6),
+                                 '755224')
+        self.assertEqual(truncate_digest(RFC_4226_DIGESTS[1], 8),
+                         '94287082')
+        self.assertEqual(truncate_digest(RFC_4226_DIGESTS[1], 11),
+                         '01094287082')
+
+    def test_truncate_digest_short(self):
+        """
+        truncate_digest should handle offsets near the end of
+        digests shorter than 20 bytes
+        """
+        digest = bytearray(15) + b'\x8f'
+        self.assertEqual(truncate_digest(digest, 6), '000143')
+
+    @mock.patch('spookyotp.byte_util._numpy', lambda: None)
+    def test_truncate_digests_pure_python(self):
+        """
+        truncate_digests should work without NumPy
+        """
+        self.assertEqual(truncate_digests(RFC_4226_DIGESTS, 6),
+                         ['755224', '287082'])
+        self.assertEqual(truncate_digests([], 6), [])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_truncate_digests_numpy(self):
+        """
+        truncate_digests should return a NumPy array of codes
+        """
+        codes = truncate_digests(RFC_4226_DIGESTS, 6)
+        self.assertIsInstance(codes, numpy.ndarray)
+        self.assertTrue(codes.flags['C_CONTIGUOUS'])
+        self.assertEqual(list(codes), ['755224', '287082'])
+
+        as_array = numpy.array(RFC_4226_DIGESTS, dtype=numpy.uint8)
+        self.assertEqual(list(truncate_digests(as_array, 8)),
+                         ['84755224', '94287082'])
+
+        # MD5 digests are 16 bytes, so the window can run off the end
+        md5_digests = [hashlib.md5(str(i).encode('ascii')).digest()
+                       for i in range(200)]
+        md5_digests.append(bytes(bytearray(15) + b'\x8f'))
+        self.assertTrue(any(bytearray(d)[-1] & 0x0f > 12
+                            for d in md5_digests))
+        self.assertEqual(list(truncate_digests(md5_digests, 6)),
+                         [truncate_digest(d, 6) for d in md5_digests])
+
+        # an empty batch, as a sequence or as an array
+        self.assertEqual(list(truncate_digests([], 6)), [])
+        self.assertEqual(list(truncate_digests(
+            numpy.zeros((0, 20), dtype=numpy.uint8), 6)), [])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_truncate_digests_numpy_raises(self):
+        """
+        truncate_digests should raise if digests aren't 2-D
+        """
+        self.assertRaises(ValueError, truncate_digests,
+                          numpy.zeros(20, dtype=numpy.uint8), 6)
+
 
 if __name__ == '__main__':
     unittest.main()
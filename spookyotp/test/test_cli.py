@@ -0,0 +1,173 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from spookyotp.otp import HOTP, TOTP
+from spookyotp.cli import run, main
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user')
+        self.hotp = HOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user', counter=5)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _run(self, command, lines, **kwargs):
+        output = io.StringIO()
+        counts = run(command, io.StringIO(''.join(lines)), output, **kwargs)
+        return counts, output.getvalue().splitlines()
+
+    def _jsonl(self, records):
+        return [json.dumps(record) + '\n' for record in records]
+
+    def test_generate(self):
+        """
+        generate should add each record's code, and report bad records
+        """
+        lines = self._jsonl([
+            {'uri': self.totp.get_uri()},
+            {'uri': self.totp.get_uri(), 'timestamp': self.now + 30},
+            {'uri': self.hotp.get_uri()},
+            {'uri': self.hotp.get_uri(), 'counter': 9},
+            {'id': 'no uri'},
+        ]) + ['not json\n']
+        counts, output = self._run('generate', lines, timestamp=self.now,
+                                   chunk_size=2)
+        self.assertEqual(counts, (6, 2))
+        records = [json.loads(line) for line in output]
+        self.assertEqual([r.get('code') for r in records[:4]],
+                         [self.totp.get_otp(self.now),
+                          self.totp.get_otp(self.now + 30),
+                          self.hotp.get_otp(5, False),
+                          self.hotp.get_otp(9, False)])
+        self.assertIn('KeyError', records[4]['error'])
+        self.assertEqual(records[5]['line'], 'not json')
+
+    def test_verify_csv(self):
+        """
+        verify should check every code against its own URI
+        """
+        lines = ['uri,code\n']
+        for code in (self.totp.get_otp(self.now - 30),
+                     self.totp.get_otp(self.now - 60), 'abc'):
+            lines.append('{},{}\n'.format(self.totp.get_uri(), code))
+        # each HOTP record starts from the counter in its URI
+        for _ in range(2):
+            lines.append('{},{}\n'.format(self.hotp.get_uri(),
+                                          self.hotp.get_otp(6, False)))
+        counts, output = self._run('verify', lines, input_format='csv',
+                                   output_format='csv', timestamp=self.now)
+        self.assertEqual(counts, (5, 0))
+        self.assertEqual(output[0], 'uri,code,valid,counter,error')
+        self.assertEqual([line.split(',')[2:4] for line in output[1:]],
+                         [['True', ''], ['False', ''], ['False', ''],
+                          ['True', '7'], ['True', '7']])
+
+    def test_verify_raises(self):
+        """
+        Negative windows should be refused before any work is done
+        """
+        lines = self._jsonl([{'uri': self.totp.get_uri(), 'code': '123456'}])
+        self.assertRaises(ValueError, self._run, 'verify', lines, window=-1)
+        self.assertRaises(ValueError, self._run, 'verify', lines,
+                          look_ahead=-1)
+        with open(os.devnull, 'w') as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertRaises(SystemExit, main,
+                                  ['verify', '--look-ahead', '-1'])
+            finally:
+                sys.stderr = stderr
+
+    def test_jsonl_to_csv(self):
+        """
+        CSV output from JSON lines should keep the input fields
+        """
+        lines = self._jsonl([
+            {'id': 1, 'uri': self.totp.get_uri()},
+            {'id': 2, 'uri': self.hotp.get_uri(), 'note': 'later'},
+        ])
+        counts, output = self._run('generate', lines, output_format='csv',
+                                   timestamp=self.now)
+        self.assertEqual(counts, (2, 0))
+        self.assertEqual(output[0], 'id,uri,note,code,error')
+        self.assertEqual(output[1], '1,{},,{},'.format(
+            self.totp.get_uri(), self.totp.get_otp(self.now)))
+
+    def test_verify_numeric_codes(self):
+        """
+        JSON numbers should be checked as codes, with leading zeros
+        restored, and other types reported as errors
+        """
+        step = self.now // 30
+        while self.totp.get_otp(step * 30)[0] != '0':
+            step += 1
+        code = self.totp.get_otp(step * 30)
+        lines = self._jsonl([
+            {'uri': self.totp.get_uri(), 'code': int(code)},
+            {'uri': self.totp.get_uri(), 'code': int(code) + 1},
+            {'uri': self.totp.get_uri(), 'code': 1.5},
+            {'uri': self.totp.get_uri(), 'code': -1},
+        ])
+        counts, output = self._run('verify', lines, timestamp=step * 30)
+        self.assertEqual(counts, (4, 2))
+        records = [json.loads(line) for line in output]
+        self.assertEqual([r.get('valid') for r in records],
+                         [True, False, None, None])
+        self.assertIn('TypeError', records[2]['error'])
+        self.assertIn('ValueError', records[3]['error'])
+
+    def test_uri_round_trip(self):
+        """
+        uri-export and uri-import should undo each other
+        """
+        lines = self._jsonl([
+            {'secret': 'CERDGRCVMZ3YRGNK', 'issuer': 'test',
+             'account': 'test_user', 'digits': '8', 'algorithm': 'sha256',
+             'period': 60},
+            {'secret': 'CERDGRCVMZ3YRGNK', 'issuer': 'test', 'type': 'hotp',
+             'counter': 5},
+            {'issuer': 'test'},
+        ])
+        counts, uris = self._run('uri-export', lines, output_format='uris')
+        self.assertEqual(counts, (3, 1))
+        self.assertEqual(len(uris), 2)
+
+        counts, output = self._run('uri-import', [u + '\n' for u in uris],
+                                   input_format='uris', workers=2,
+                                   chunk_size=1)
+        self.assertEqual(counts, (2, 0))
+        imported = [json.loads(line) for line in output]
+        self.assertEqual(imported[0]['uri'], uris[0])
+        self.assertEqual((imported[0]['digits'], imported[0]['algorithm'],
+                          imported[0]['period']), (8, 'sha256', 60))
+        self.assertEqual((imported[1]['type'], imported[1]['counter']),
+                         ('hotp', 5))
+        self.assertEqual(imported[1]['secret'], 'CERDGRCVMZ3YRGNK')
+
+    def test_main(self):
+        """
+        main should read and write the named files
+        """
+        input_path = os.path.join(self.tmp_dir, 'uris.txt')
+        output_path = os.path.join(self.tmp_dir, 'out.jsonl')
+        with io.open(input_path, 'w') as f:
+            f.write(self.totp.get_uri() + '\n')
+        status = main(['generate', '-i', input_path, '-o', output_path,
+                       '--input-format', 'uris',
+                       '--timestamp', str(self.now)])
+        self.assertEqual(status, 0)
+        with io.open(output_path) as f:
+            self.assertEqual(json.loads(f.read())['code'],
+                             self.totp.get_otp(self.now))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import pickle
+import unittest
+from spookyotp.otp import TOTP
+from spookyotp.codecache import CodeCache
+
+
+class TestCodeCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.cache = CodeCache(max_entries=10)
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                         time_source=lambda: self.now)
+        self.expected = self.totp.get_otp()
+        self.totp.set_code_cache(self.cache)
+
+    def test_get_otp(self):
+        """
+        Codes should be computed once, then come from the cache
+        """
+        self.assertEqual(self.totp.get_otp(), self.expected)
+        self.assertEqual(self.totp.get_otp(), self.expected)
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 1))
+        self.assertEqual(len(self.cache), 1)
+        # keyed without the secret
+        self.assertEqual(list(self.cache._entries),
+                         [(self.totp._credential_key(), self.now // 30)])
+
+    def test_shared_between_objects(self):
+        """
+        TOTPs for the same credential should share codes
+        """
+        other = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                     time_source=lambda: self.now)
+        other.set_code_cache(self.cache)
+        self.totp.get_otp()
+        self.assertEqual(other.get_otp(), self.expected)
+        self.assertEqual(self.cache.hits, 1)
+
+        different = TOTP('CERDGRCVMZ3YRGNL', 'test', 'test_user',
+                         time_source=lambda: self.now)
+        different.set_code_cache(self.cache)
+        different.get_otp()
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_verify(self):
+        """
+        verify and verify_many should use the cache
+        """
+        self.assertEqual(self.totp.verify(self.expected), 0)
+        self.assertEqual(self.totp.verify(self.expected), 0)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.totp._verify_step(self.expected,
+                                                self.now // 30, 1), 0)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_expires_at_step_boundary(self):
+        """
+        Codes should be dropped once their step is retain_steps old
+        """
+        self.totp.get_otp()
+        self.now += 30
+        self.totp.get_otp()
+        self.assertEqual(len(self.cache), 2)
+        self.now += 30
+        self.totp.get_otp()
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_totp_clock(self):
+        """
+        Expiry should follow the TOTP's clock, not the wall clock
+        """
+        totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                    time_source=lambda: 1000000000)
+        cache = CodeCache()
+        totp.set_code_cache(cache)
+        for _ in range(15):
+            totp.get_otp()
+        self.assertEqual((cache.misses, cache.hits), (1, 14))
+        # steps already past retain_steps aren't kept
+        totp.get_otp(1000000000 - 90)
+        self.assertEqual(len(cache), 1)
+
+    def test_max_entries(self):
+        for i in range(20):
+            self.totp.get_otp(self.now + 30 * i)
+        self.assertEqual(len(self.cache), 10)
+
+    def test_precompute(self):
+        """
+        Hot credentials should get their next code computed
+        just before the boundary
+        """
+        self.totp.get_otp()
+        self.assertEqual(self.cache.precompute(lead=2), 0)
+        self.totp.get_otp()
+        self.assertEqual(self.cache.precompute(lead=2), 0)
+        self.now += 28
+        self.assertEqual(self.cache.precompute(lead=2), 1)
+        self.assertEqual(self.cache.precompute(lead=2), 0)
+        self.now += 2
+        misses = self.cache.misses
+        self.totp.get_otp()
+        self.assertEqual(self.cache.misses, misses)
+
+    def test_thread_safe(self):
+        cache = CodeCache(thread_safe=True)
+        self.totp.set_code_cache(cache)
+        self.assertEqual(self.totp.get_otp(), self.expected)
+        self.assertEqual(self.totp.get_otp(), self.expected)
+        self.assertEqual(cache.hits, 1)
+        self.totp.get_otp()
+        self.now += 29
+        self.assertEqual(cache.precompute(), 1)
+
+    def test_pickle(self):
+        """
+        The cache shouldn't be pickled with the TOTP
+        """
+        self.totp._current_timestamp = None
+        totp = pickle.loads(pickle.dumps(self.totp))
+        self.assertIsNone(totp._code_cache)
+
+    def test_raises(self):
+        self.assertRaises(ValueError, CodeCache, 0)
+        self.assertRaises(ValueError, CodeCache, 1, -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from spookyotp.otp import TOTP
+from spookyotp.codetable import write_code_table, CodeTable
+from spookyotp.test.fixtures import CredentialFixture
+
+
+class TestCodeTable(CredentialFixture, unittest.TestCase):
+    hotp_counter = 0
+
+    def setUp(self):
+        super(TestCodeTable, self).setUp()
+        self.totps = [self.totp, TOTP('MFRGGZDFMZTWQ2LK', 'test', 'test_user',
+                                      n_digits=8, algorithm='sha256',
+                                      period=60)]
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'codes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_totp_table(self):
+        """
+        Every code in a TOTP table should match TOTP.get_otp
+        """
+        start = self.now // 60
+        self.assertEqual(write_code_table(self.path, iter(self.totps),
+                                          start, 100), 2)
+        with CodeTable(self.path) as table:
+            self.assertEqual(len(table), 2)
+            self.assertEqual((table.otp_type, table.algorithm,
+                              table.n_digits, table.period, table.start,
+                              table.count),
+                             ('totp', 'sha256', 8, 60, start, 100))
+            for row, totp in enumerate(self.totps):
+                for step in (start, start + 57, start + 99):
+                    self.assertEqual(table.get_code(row, step),
+                                     totp.get_otp(step * 60))
+            self.assertEqual(table.get_code_at(1, self.now + 125),
+                             self.totps[1].get_otp(self.now + 125))
+            self.assertRaises(IndexError, table.get_code, 0, start + 100)
+            self.assertRaises(IndexError, table.get_code, 0, start - 1)
+            self.assertRaises(IndexError, table.get_code, 2, start)
+
+    def test_hotp_table(self):
+        """
+        HOTP tables should hold the RFC 4226 codes, zero-padded
+        """
+        # more than one chunk of codes
+        write_code_table(self.path, [self.hotp], 0, 5000)
+        with CodeTable(self.path) as table:
+            self.assertEqual((table.otp_type, table.period), ('hotp', None))
+            self.assertEqual([table.get_code(0, c) for c in range(10)],
+                             ['755224', '287082', '359152', '969429',
+                              '338314', '254676', '287922', '162583',
+                              '399871', '520489'])
+            self.assertEqual(table.get_code(0, 4999),
+                             self.hotp.get_otp(4999))
+            self.assertRaises(ValueError, table.get_code_at, 0, self.now)
+
+    def test_raises(self):
+        """
+        Mixed credentials and invalid files should raise
+        """
+        self.assertRaises(ValueError, write_code_table, self.path,
+                          [self.totps[0], self.hotp], 0, 10)
+        self.assertRaises(TypeError, write_code_table, self.path,
+                          [object()], 0, 10)
+        self.assertEqual(write_code_table(self.path, [], 0, 10), 0)
+        with CodeTable(self.path) as table:
+            self.assertEqual(len(table), 0)
+        with open(self.path, 'r+b') as f:
+            f.truncate(20)
+        self.assertRaises(ValueError, CodeTable, self.path)
+        write_code_table(self.path, self.totps, 0, 10)
+        with open(self.path, 'r+b') as f:
+            f.truncate(100)
+        self.assertRaises(ValueError, CodeTable, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from spookyotp.otp import TOTP, from_uri
+from spookyotp.enroll import enroll
+from spookyotp.cli import main
+
+
+class TestEnroll(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.accounts = ['alice\n', '\n', 'bob\n', 'carol\n']
+        self.enrolled = []
+
+    def on_enroll(self, account, totp):
+        self.enrolled.append((account, totp))
+
+    def assert_manifest(self, manifest, names):
+        rows = [json.loads(line) for line in manifest.decode('utf-8')
+                .splitlines()]
+        self.assertEqual([row['account'] for row in rows],
+                         ['alice', 'bob', 'carol'])
+        self.assertEqual([row['file'] for row in rows],
+                         ['00000000.svg', '00000001.svg', '00000002.svg'])
+        self.assertEqual(sorted(names),
+                         sorted([row['file'] for row in rows] +
+                                ['manifest.jsonl']))
+        for row, (account, totp) in zip(rows, self.enrolled):
+            self.assertEqual(row['uri'], totp.get_uri())
+            otp = from_uri(row['uri'])
+            self.assertIsInstance(otp, TOTP)
+            self.assertEqual(otp._n_digits, 8)
+
+    def test_enroll_zip(self):
+        """
+        Every account should get an image and a manifest entry
+        """
+        path = os.path.join(self.tmpdir, 'enroll.zip')
+        n = enroll(self.accounts, path, 'test', image_format='svg',
+                   chunk_size=2, on_enroll=self.on_enroll, n_digits=8)
+        self.assertEqual(n, 3)
+        with zipfile.ZipFile(path) as archive:
+            self.assertIn(b'<svg', archive.read('00000001.svg'))
+            self.assert_manifest(archive.read('manifest.jsonl'),
+                                 archive.namelist())
+
+    def test_enroll_tar_workers(self):
+        """
+        Rendering in a process pool should give the same archive
+        """
+        path = os.path.join(self.tmpdir, 'enroll.tar.gz')
+        enroll(self.accounts, path, 'test', image_format='svg', workers=2,
+               chunk_size=1, max_in_flight=2, on_enroll=self.on_enroll,
+               n_digits=8)
+        with tarfile.open(path) as archive:
+            manifest = archive.extractfile('manifest.jsonl').read()
+            self.assert_manifest(manifest, archive.getnames())
+
+    def test_enroll_raises(self):
+        path = os.path.join(self.tmpdir, 'enroll.zip')
+        self.assertRaises(ValueError, enroll, self.accounts, path, 'test',
+                          image_format='gif')
+        self.assertRaises(ValueError, enroll, self.accounts, path, 'test',
+                          chunk_size=0)
+        self.assertRaises(ValueError, enroll, self.accounts,
+                          os.path.join(self.tmpdir, 'enroll.rar'), 'test')
+
+    def test_main(self):
+        accounts = os.path.join(self.tmpdir, 'accounts.txt')
+        with io.open(accounts, 'w', encoding='utf-8') as f:
+            f.write(''.join(self.accounts))
+        path = os.path.join(self.tmpdir, 'enroll.tar')
+        self.assertEqual(main(['enroll', 'test', path, '-i', accounts,
+                               '-f', 'svg']), 0)
+        with tarfile.open(path) as archive:
+            self.assertEqual(len(archive.getnames()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
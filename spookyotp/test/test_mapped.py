@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from spookyotp.otp import HOTP
+from spookyotp.mapped import MappedCredentialStore
+from spookyotp.test.fixtures import CredentialFixture
+
+
+class TestMappedCredentialStore(CredentialFixture, unittest.TestCase):
+    def setUp(self):
+        super(TestMappedCredentialStore, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'store.bin')
+        self.store = MappedCredentialStore.create(self.path, capacity=1)
+        self.store.extend([self.totp, self.hotp])
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append_grows(self):
+        """
+        append should return row numbers and grow the file as needed
+        """
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.append(self.hotp), 2)
+        self.assertEqual(len(self.store), 3)
+
+    def test_get_secret(self):
+        """
+        get_secret should return a copy of the stored secret, which
+        doesn't stop the store from growing
+        """
+        secret = self.store.get_secret(1)
+        self.assertEqual(secret, b'12345678901234567890')
+        self.store.extend([self.totp] * 10)
+        self.assertEqual(self.store.get_secret(1), secret)
+
+    def test_verify(self):
+        """
+        Rows should check codes just like the objects they came from
+        """
+        code = self.totp.get_otp(self.now - 60)
+        self.assertEqual(self.store.verify(0, code, self.now), -1)
+        code = self.hotp.get_otp(9)
+        self.assertEqual(self.store.verify(1, code), 2)
+        self.assertEqual(self.store.get_counter(1), 10)
+
+    def test_threads(self):
+        """
+        Reads from other threads should be safe while appends grow
+        the store
+        """
+        errors = []
+        done = threading.Event()
+        expected = self.hotp.get_otp(auto_increment=False)
+
+        def read():
+            try:
+                while not done.is_set():
+                    self.assertEqual(self.store.get_otp(1), expected)
+                    self.store.load(1, 'test')
+                    self.assertGreaterEqual(len(self.store), 2)
+            except Exception as e:
+                errors.append(e)
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            self.store.extend([self.totp] * 2000)
+        finally:
+            done.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+
+    def test_reopen(self):
+        """
+        Records and counters should survive closing and reopening
+        """
+        self.store.verify(1, self.hotp.get_otp(8))
+        self.store.close()
+        self.store = MappedCredentialStore(self.path)
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.get_counter(1), 9)
+        totp = self.store.load(0, 'test', 'test_user')
+        self.assertEqual(totp.get_uri(), self.totp.get_uri())
+        self.assertRaises(IndexError, self.store.get_counter, 2)
+
+    def test_raises(self):
+        """
+        Invalid files and credentials should raise
+        """
+        self.assertRaises(TypeError, self.store.append, object())
+        self.assertRaises(ValueError, self.store.append,
+                          HOTP(bytearray(65), 'test'))
+        with open(self.path + '.bad', 'wb') as f:
+            f.write(b'\x00' * 100)
+        self.assertRaises(ValueError, MappedCredentialStore,
+                          self.path + '.bad')
+
+
+if __name__ == '__main__':
+    unittest.main()
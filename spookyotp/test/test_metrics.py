@@ -0,0 +1,112 @@
+import unittest
+from spookyotp.otp import OTPBase, HOTP, TOTP
+from spookyotp.replay import UsedCodeCache
+from spookyotp.metrics import VerifyMetrics
+
+
+class TestVerifyObserver(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                         time_source=lambda: self.now)
+        self.hotp = HOTP('CERDGRCVMZ3YRGNK', 'test', counter=10)
+        self.calls = []
+        OTPBase.set_verify_observer(
+            lambda *args: self.calls.append(args[1:4]))
+        self.addCleanup(OTPBase.set_verify_observer, None)
+
+    def test_totp(self):
+        """
+        The observer should see the offset and HMACs for each check
+        """
+        for offset in (0, -1, 1, -2):
+            self.totp.verify(self.totp.get_otp(self.now + 30 * offset), 2)
+        self.totp.verify('000000', 2)
+        self.assertEqual(self.calls, [(0, True, 1), (-1, True, 2),
+                                      (1, True, 3), (-2, True, 4),
+                                      (None, False, 5)])
+
+    def test_totp_replay(self):
+        used_codes = UsedCodeCache()
+        code = self.totp.get_otp()
+        self.totp.verify(code, used_codes=used_codes)
+        self.totp.verify(code, used_codes=used_codes)
+        self.assertEqual(self.calls, [(0, True, 1), (0, False, 1)])
+
+    def test_hotp(self):
+        self.hotp.verify(self.hotp.get_otp(11, False), 5)
+        self.hotp.verify('000000', 2)
+        self.assertEqual(self.calls, [(1, True, 2), (None, False, 3)])
+
+    def test_hotp_resync_index(self):
+        """
+        With a resync index, only newly computed codes are counted
+        """
+        self.hotp.enable_resync_index(10)
+        self.hotp.verify(self.hotp.get_otp(12, False), 5)
+        self.hotp.verify(self.hotp.get_otp(13, False), 5)
+        self.assertEqual(self.calls, [(2, True, 10), (0, True, 3)])
+
+    def test_per_class(self):
+        """
+        An observer set on one class shouldn't see the other
+        """
+        OTPBase.set_verify_observer(None)
+        HOTP.set_verify_observer(lambda *args: self.calls.append(args[1:4]))
+        self.addCleanup(delattr, HOTP, '_verify_observer')
+        self.totp.verify(self.totp.get_otp())
+        self.hotp.verify(self.hotp.get_otp(10, False))
+        self.assertEqual(self.calls, [(0, True, 1)])
+
+
+class TestVerifyMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = VerifyMetrics(buckets=(0.001, 0.01))
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test')
+        self.hotp = HOTP('CERDGRCVMZ3YRGNK', 'test')
+
+    def test_record(self):
+        self.metrics(self.totp, 0, True, 1, 0.0005)
+        self.metrics(self.totp, -1, False, 2, 0.005)
+        self.metrics(self.totp, None, False, 3, 0.5)
+        self.metrics(self.hotp, 2, True, 3, 0.001)
+        self.assertEqual(self.metrics.calls, {'totp': 3, 'hotp': 1})
+        self.assertEqual(self.metrics.accepted, {'totp': 1, 'hotp': 1})
+        self.assertEqual(self.metrics.failures, {'totp': 1})
+        self.assertEqual(self.metrics.replays, {'totp': 1})
+        self.assertEqual(self.metrics.hmacs, {'totp': 6, 'hotp': 3})
+        self.assertEqual(self.metrics.offsets, {('totp', 0): 1,
+                                                ('totp', -1): 1,
+                                                ('hotp', 2): 1})
+
+        text = self.metrics.to_prometheus()
+        lines = text.splitlines()
+        self.assertIn('# TYPE spookyotp_verify_total counter', lines)
+        self.assertIn('spookyotp_verify_total{type="totp"} 3', lines)
+        self.assertIn('spookyotp_verify_matched_offset_total'
+                      '{offset="-1",type="totp"} 1', lines)
+        self.assertIn('spookyotp_verify_duration_seconds_bucket'
+                      '{le="0.001",type="hotp"} 1', lines)
+        self.assertIn('spookyotp_verify_duration_seconds_bucket'
+                      '{le="0.01",type="totp"} 2', lines)
+        self.assertIn('spookyotp_verify_duration_seconds_bucket'
+                      '{le="+Inf",type="totp"} 3', lines)
+        self.assertIn('spookyotp_verify_duration_seconds_count'
+                      '{type="totp"} 3', lines)
+
+    def test_reset(self):
+        metrics = VerifyMetrics(thread_safe=True)
+        metrics(self.totp, 0, True, 1, 0.0005)
+        metrics.reset()
+        self.assertEqual(metrics.calls, {})
+        self.assertNotIn('type="totp"', metrics.to_prometheus())
+
+    def test_as_observer(self):
+        TOTP.set_verify_observer(self.metrics)
+        self.addCleanup(delattr, TOTP, '_verify_observer')
+        self.totp.compare(self.totp.get_otp())
+        self.assertEqual(self.metrics.accepted, {'totp': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
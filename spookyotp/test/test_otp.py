@@ -1,12 +1,21 @@
 import unittest
 import mock
 import hashlib
+import hmac
+import pickle
 import six
+import threading
 from spookyotp.otp import (OTPBase,
                            HOTP,
                            TOTP,
+                           constant_time_compare,
+                           constant_time_int_compare,
                            get_random_secret,
-                           from_uri)
+                           from_uri,
+                           verify_many,
+                           generate_many)
+from spookyotp.qr import QRCodeCache
+from spookyotp.replay import UsedCodeCache
 
 
 class TestSecretUtils(unittest.TestCase):
@@ -151,6 +160,18 @@ class TestOTPBase(unittest.TestCase):
             '000127',
             OTPBase._get_otp(bytearray([42]*19), 1, 6, hashlib.md5))
 
+    def test_get_keyed_otp(self):
+        """
+        Codes from a pre-keyed HMAC should match codes keyed per call
+        """
+        for algorithm in (hashlib.sha1, hashlib.sha256, hashlib.sha512):
+            secret = bytearray([42]*20)
+            keyed = hmac.new(secret, None, algorithm)
+            for counter in (0, 1, 2**40):
+                self.assertEqual(
+                    OTPBase._get_otp(secret, counter, 8, algorithm),
+                    OTPBase._get_keyed_otp(keyed, counter, 8))
+
     def test_get_otp_raises(self):
         """
         Verify the OTP algorithm raises when passed a too-big counter
@@ -168,6 +189,17 @@ class TestOTPBase(unittest.TestCase):
         self.assertFalse(OTPBase._compare('001234', '1234'))
         self.assertFalse(OTPBase._compare('123456', '678901'))
 
+    def test_constant_time_compare(self):
+        """
+        Test the constant time comparisons handle any text, and ints
+        """
+        self.assertTrue(constant_time_compare(u'\u0661\u0662',
+                                              u'\u0661\u0662'))
+        self.assertFalse(constant_time_compare(u'\u0661\u0662', u'12'))
+        self.assertTrue(constant_time_int_compare(1234, 1234))
+        self.assertFalse(constant_time_int_compare(1234, 1235))
+        self.assertFalse(constant_time_int_compare(2**64, 1234))
+
     def test_compare_raises(self):
         """
         _compare should raise if passed invalid OTP codes
@@ -178,8 +210,9 @@ class TestOTPBase(unittest.TestCase):
 
 
 class CommonOTPTests(object):
-    @mock.patch('spookyotp.otp.qrcode.make')
-    def test_get_qr_code(self, mock_make):
+    @mock.patch('spookyotp.otp.qr.default_cache', new_callable=QRCodeCache)
+    @mock.patch('spookyotp.qr._make')
+    def test_get_qr_code(self, mock_make, cache):
         """
         Test getting a QR code for the OTP generator
         """
@@ -191,6 +224,10 @@ class CommonOTPTests(object):
         mock_make.assert_called_with("otp://otp/TEST_URL")
         self.assertIs(qr_code, mock_img)
 
+        # the second time should come from the cache
+        self.assertIs(self.otp.get_qr_code(), mock_img)
+        self.assertEqual(mock_make.call_count, 1)
+
     def test_save_qr_code(self):
         """
         Test saving a QR code to a file for the OTP generator
@@ -225,6 +262,26 @@ class CommonOTPTests(object):
         otp = from_uri(uri)
         self.assertIsInstance(otp, self.otp.__class__)
 
+    def test_from_uri_lazy(self):
+        """
+        A lazily built OTP shouldn't decode its secret until it's used
+        """
+        otp = from_uri(self.otp.get_uri(), lazy=True)
+        self.assertIsInstance(otp, self.otp.__class__)
+        self.assertNotIn('_secret', otp.__dict__)
+        self.assertEqual(otp.get_uri(), self.otp.get_uri())
+        self.assertIn('_secret', otp.__dict__)
+
+    def test_pickle(self):
+        """
+        OTPs should survive pickling, rebuilding their pre-keyed HMAC
+        """
+        self.otp._current_timestamp = None
+        otp = pickle.loads(pickle.dumps(self.otp))
+        self.assertEqual(otp.get_uri(), self.otp.get_uri())
+        self.assertEqual(otp._get_keyed_otp(otp._hmac, 5, 6),
+                         self.otp._get_keyed_otp(self.otp._hmac, 5, 6))
+
 
 class TestHOTP(unittest.TestCase, CommonOTPTests):
     def setUp(self):
@@ -238,34 +295,32 @@ class TestHOTP(unittest.TestCase, CommonOTPTests):
         self.otp = HOTP(self.secret, self.issuer, self.account,
                         self.n_digits, self.algorithm, self.counter)
 
-    @mock.patch('spookyotp.otp.OTPBase._get_otp')
+    @mock.patch('spookyotp.otp.OTPBase._get_keyed_otp')
     def test_get_otp_passed_counter(self, mock_get_otp):
         """
         Test get_otp works when passed a particular counter value
         """
         mock_get_otp.return_value = '123456'
         otp = self.otp.get_otp(1001)
-        mock_get_otp.assert_called_with(self.secret, 1001, self.n_digits,
-                                        getattr(hashlib, self.algorithm))
+        mock_get_otp.assert_called_with(self.otp._hmac, 1001, self.n_digits)
         self.assertEqual(otp, '123456')
         # counter should not be incremented
         self.assertEqual(self.otp.counter, self.counter)
 
-    @mock.patch('spookyotp.otp.OTPBase._get_otp')
+    @mock.patch('spookyotp.otp.OTPBase._get_keyed_otp')
     def test_get_otp(self, mock_get_otp):
         """
         Test get_otp works using the internal counter and increments it
         """
         mock_get_otp.return_value = '123456'
         otp = self.otp.get_otp()
-        mock_get_otp.assert_called_with(self.secret, self.counter,
-                                        self.n_digits,
-                                        getattr(hashlib, self.algorithm))
+        mock_get_otp.assert_called_with(self.otp._hmac, self.counter,
+                                        self.n_digits)
         self.assertEqual(otp, '123456')
         # counter should be incremented automatically
         self.assertEqual(self.otp.counter, self.counter + 1)
 
-    @mock.patch('spookyotp.otp.OTPBase._get_otp')
+    @mock.patch('spookyotp.otp.OTPBase._get_keyed_otp')
     def test_get_otp_no_autoincrement(self, mock_get_otp):
         """
         Test get_otp works using the internal counter but doesn't
@@ -273,9 +328,8 @@ class TestHOTP(unittest.TestCase, CommonOTPTests):
         """
         mock_get_otp.return_value = '123456'
         otp = self.otp.get_otp(auto_increment=False)
-        mock_get_otp.assert_called_with(self.secret, self.counter,
-                                        self.n_digits,
-                                        getattr(hashlib, self.algorithm))
+        mock_get_otp.assert_called_with(self.otp._hmac, self.counter,
+                                        self.n_digits)
         self.assertEqual(otp, '123456')
         # counter should be incremented automatically
         self.assertEqual(self.otp.counter, self.counter)
@@ -311,6 +365,178 @@ class TestHOTP(unittest.TestCase, CommonOTPTests):
         self.assertFalse(self.otp.compare(str(self.counter + 6), 5))
         self.assertEqual(self.otp.counter, self.counter)
 
+    def test_get_otp_range(self):
+        """
+        Test get_otp_range generates codes in order without
+        changing the counter
+        """
+        expected = [self.otp.get_otp(counter) for counter in range(5, 30)]
+        self.assertEqual(list(self.otp.get_otp_range(5, 30, chunk_size=7)),
+                         expected)
+        self.assertEqual(list(self.otp.get_otp_range(5, 30, workers=2,
+                                                     chunk_size=7,
+                                                     max_in_flight=2)),
+                         expected)
+        self.assertEqual(self.otp.counter, self.counter)
+
+    def test_get_otp_range_raises(self):
+        """
+        Test get_otp_range raises on a bad range or chunk size
+        """
+        self.assertRaises(ValueError, self.otp.get_otp_range, 10, 5)
+        self.assertRaises(ValueError, self.otp.get_otp_range, -1, 5)
+        self.assertRaises(ValueError, self.otp.get_otp_range, 0, 5,
+                          chunk_size=0)
+
+    def test_resync_index(self):
+        """
+        Test compare gives the same results with a resync index
+        """
+        indexed = HOTP(self.secret, self.issuer, counter=self.counter)
+        indexed.enable_resync_index(50)
+        codes = [self.otp.get_otp(counter) for counter in
+                 range(self.counter, self.counter + 200)]
+        for offset in (0, 40, 3, 1, 10, 150, 45):
+            code = codes[offset]
+            self.assertEqual(indexed.verify(code, 40),
+                             self.otp.verify(code, 40))
+            self.assertEqual(indexed.counter, self.otp.counter)
+
+    def test_resync_index_collisions(self):
+        """
+        Test the resync index matches the lowest counter when
+        several counters share a code
+        """
+        self.otp.get_otp = lambda counter: str(counter % 3)
+        self.otp.enable_resync_index(10)
+
+        self.assertEqual(self.otp.verify(str((self.counter + 1) % 3), 5), 1)
+        self.assertEqual(self.otp.counter, self.counter + 2)
+        self.assertEqual(self.otp.verify(str(self.counter % 3), 5), 1)
+        self.assertEqual(self.otp.counter, self.counter + 4)
+
+    def test_resync_index_counter_moved(self):
+        """
+        Test the resync index follows the counter when it's set directly
+        """
+        self.otp.get_otp = lambda counter: str(counter)
+        self.otp.enable_resync_index(10)
+
+        self.assertTrue(self.otp.compare(str(self.counter + 3), 5))
+        self.otp.counter = self.counter
+        self.assertTrue(self.otp.compare(str(self.counter), 5))
+        self.otp.counter = self.counter + 1000
+        self.assertFalse(self.otp.compare(str(self.counter), 5))
+        self.assertTrue(self.otp.compare(str(self.counter + 1005), 5))
+        self.assertRaises(ValueError, self.otp.enable_resync_index, 0)
+
+    def test_verify_returns_delta(self):
+        """
+        Test verify returns how far ahead the matching code was
+        """
+        self.otp.get_otp = lambda counter: str(counter)
+
+        self.assertEqual(self.otp.verify(str(self.counter + 2), 2), 2)
+        self.assertEqual(self.otp.counter, self.counter + 3)
+        self.assertIsNone(self.otp.verify(str(self.counter), 2))
+        self.assertEqual(self.otp.counter, self.counter + 3)
+
+    def test_verify_int(self):
+        """
+        Test verify_int checks integer codes like verify checks strings
+        """
+        codes = [self.otp.get_otp_int(self.counter + delta)
+                 for delta in range(3)]
+        self.assertEqual(
+            ['{:06d}'.format(code) for code in codes],
+            [self.otp.get_otp(self.counter + delta) for delta in range(3)])
+        self.assertEqual(self.otp.verify_int(codes[1]), 1)
+        self.assertEqual(self.otp.counter, self.counter + 2)
+        self.assertFalse(self.otp.compare_int(codes[1]))
+        self.assertTrue(self.otp.compare_int(codes[2]))
+        self.assertFalse(self.otp.compare_int(10**6 + codes[2]))
+        self.assertFalse(self.otp.compare_int(2**70))
+        for code in (str(codes[2]), -1, True, 1.0):
+            self.assertRaises(ValueError, self.otp.verify_int, code)
+
+        self.otp.enable_resync_index(10)
+        code = self.otp.get_otp_int(self.counter + 7)
+        self.assertEqual(self.otp.verify_int(code, 5), 4)
+        self.assertEqual(self.otp.get_otp_int(), self.otp.get_otp_int(
+            self.counter + 8))
+        self.assertEqual(self.otp.counter, self.counter + 9)
+
+    def test_thread_safe_compare_and_swap(self):
+        """
+        A code matched after another thread moved the counter past it
+        should be rejected, and the counter shouldn't move back
+        """
+        self.otp.enable_thread_safety()
+
+        def get_otp(counter):
+            # another request is accepted while this one computes codes
+            self.otp.counter = self.counter + 5
+            return str(counter)
+        self.otp.get_otp = get_otp
+
+        self.assertIsNone(self.otp.verify(str(self.counter + 1), 2))
+        self.assertEqual(self.otp.counter, self.counter + 5)
+
+    def test_thread_safe_concurrent(self):
+        """
+        Concurrent checks of one code should accept it once, and
+        concurrent get_otp calls should get distinct counters
+        """
+        self.otp.enable_thread_safety()
+        code = self.otp.get_otp(self.counter + 1)
+        results = []
+        codes = []
+
+        def run_threads(target):
+            threads = [threading.Thread(target=target) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        run_threads(lambda: results.append(self.otp.verify(code, 2)))
+        run_threads(lambda: codes.append(self.otp.get_otp()))
+
+        self.assertEqual(sorted(results, key=str), [1] + [None] * 7)
+        self.assertEqual(len(set(codes)), 8)
+        self.assertEqual(self.otp.counter, self.counter + 10)
+
+    def test_thread_safe_pickle(self):
+        self.otp.enable_thread_safety()
+        otp = pickle.loads(pickle.dumps(self.otp))
+        self.assertIsNotNone(otp._counter_lock)
+        self.assertEqual(otp.verify(otp.get_otp(self.counter)), 0)
+
+    def test_resync_index_pickle(self):
+        """
+        The resync index should be rebuilt after unpickling, not pickled
+        """
+        self.otp.enable_resync_index(50)
+        code = self.otp.get_otp(self.counter + 20)
+        self.assertEqual(self.otp.verify(self.otp.get_otp(self.counter)), 0)
+        data = pickle.dumps(self.otp)
+        self.assertNotIn(code.encode('ascii'), data)
+        otp = pickle.loads(data)
+        self.assertEqual(otp._resync_index.size, 50)
+        self.assertEqual(otp.verify(code, 30), 19)
+
+    def test_pickle_before_resync_index(self):
+        """
+        HOTPs pickled before resync indexes and thread safety existed
+        should still load and work
+        """
+        state = self.otp.__getstate__()
+        del state['_resync_index']
+        del state['_counter_lock']
+        otp = HOTP.__new__(HOTP)
+        otp.__setstate__(state)
+        self.assertEqual(otp.verify(otp.get_otp(self.counter)), 0)
+
 
 class TestTOTP(unittest.TestCase, CommonOTPTests):
     def setUp(self):
@@ -326,7 +552,7 @@ class TestTOTP(unittest.TestCase, CommonOTPTests):
                         self.n_digits, self.algorithm, self.period,
                         time_source=self.time_source)
 
-    @mock.patch('spookyotp.otp.OTPBase._get_otp')
+    @mock.patch('spookyotp.otp.OTPBase._get_keyed_otp')
     def test_get_otp_passed_timestamp(self, mock_get_otp):
         """
         Test get_otp works when passed a particular timestamp
@@ -334,11 +560,11 @@ class TestTOTP(unittest.TestCase, CommonOTPTests):
         mock_get_otp.return_value = '123456'
         otp = self.otp.get_otp(1414695600)
         counter = 1414695600 // self.period
-        mock_get_otp.assert_called_with(self.secret, counter, self.n_digits,
-                                        getattr(hashlib, self.algorithm))
+        mock_get_otp.assert_called_with(self.otp._hmac, counter,
+                                        self.n_digits)
         self.assertEqual(otp, '123456')
 
-    @mock.patch('spookyotp.otp.OTPBase._get_otp')
+    @mock.patch('spookyotp.otp.OTPBase._get_keyed_otp')
     def test_get_otp(self, mock_get_otp):
         """
         Test get_otp works using the current timestamp
@@ -346,9 +572,8 @@ class TestTOTP(unittest.TestCase, CommonOTPTests):
         mock_get_otp.return_value = '123456'
         otp = self.otp.get_otp()
         counter = self.time_source() // self.period
-        mock_get_otp.assert_called_with(self.secret, counter,
-                                        self.n_digits,
-                                        getattr(hashlib, self.algorithm))
+        mock_get_otp.assert_called_with(self.otp._hmac, counter,
+                                        self.n_digits)
         self.assertEqual(otp, '123456')
 
     def test_compare_no_other_steps(self):
@@ -382,5 +607,227 @@ class TestTOTP(unittest.TestCase, CommonOTPTests):
         self.assertFalse(self.otp.compare(two_before, 1))
         self.assertFalse(self.otp.compare(two_after, 1))
 
+    def test_verify_returns_offset(self):
+        """
+        Test verify returns the step offset of the matching code
+        """
+        self.otp.get_otp = lambda counter: str(counter // self.period)
+        step = self.time_source() // self.period
+
+        self.assertEqual(self.otp.verify(str(step), 1), 0)
+        self.assertEqual(self.otp.verify(str(step - 1), 1), -1)
+        self.assertEqual(self.otp.verify(str(step + 1), 1), 1)
+        self.assertIsNone(self.otp.verify(str(step + 2), 1))
+
+    def test_verify_int(self):
+        """
+        Test verify_int checks integer codes like verify checks strings
+        """
+        now = self.time_source()
+        code = self.otp.get_otp_int(now - self.period)
+        self.assertEqual('{:06d}'.format(code),
+                         self.otp.get_otp(now - self.period))
+        self.assertEqual(self.otp.verify_int(code), -1)
+        self.assertIsNone(self.otp.verify_int(code, 0))
+        self.assertTrue(self.otp.compare_int(self.otp.get_otp_int()))
+
+        used_codes = UsedCodeCache()
+        self.assertTrue(self.otp.compare_int(code, used_codes=used_codes))
+        # shares used steps with the string API
+        self.assertFalse(self.otp.compare(self.otp.get_otp(now -
+                                                           self.period),
+                                          used_codes=used_codes))
+        self.assertRaises(ValueError, self.otp.verify_int, '123456')
+
+    def test_verify_checks_current_step_first(self):
+        """
+        Test verify stops after the current step when it matches
+        """
+        calls = []
+
+        def get_otp(timestamp):
+            calls.append(timestamp)
+            return str(timestamp // self.period)
+        self.otp.get_otp = get_otp
+        step = self.time_source() // self.period
+
+        self.assertEqual(self.otp.verify(str(step), 3), 0)
+        self.assertEqual(calls, [self.time_source()])
+
+    def test_verify_raises_on_invalid_code(self):
+        """
+        Test verify raises when the code isn't a number
+        """
+        self.assertRaises(ValueError, self.otp.verify, 'abcdef')
+
+    def test_drift_tracking(self):
+        """
+        With drift tracking, the window should follow the last match
+        """
+        self.otp.get_otp = lambda counter: str(counter // self.period)
+        step = self.time_source() // self.period
+        self.otp.enable_drift_tracking(max_drift=3)
+
+        self.assertEqual(self.otp.verify(str(step - 1), 1), -1)
+        self.assertEqual(self.otp.drift, -1)
+        self.assertEqual(self.otp.verify(str(step - 2), 1), -2)
+        self.assertEqual(self.otp.verify(str(step - 3), 1), -3)
+        # max_drift caps how far the window can move
+        self.assertIsNone(self.otp.verify(str(step - 4), 1))
+        self.assertEqual(self.otp.drift, -3)
+        # the current step is now outside the window
+        self.assertIsNone(self.otp.verify(str(step), 1))
+
+        self.otp.disable_drift_tracking()
+        self.assertIsNone(self.otp.drift)
+        self.assertEqual(self.otp.verify(str(step), 1), 0)
+
+    def test_drift_tracking_checks_drift_first(self):
+        calls = []
+
+        def get_otp(timestamp):
+            calls.append(timestamp)
+            return str(timestamp // self.period)
+        self.otp.get_otp = get_otp
+        step = self.time_source() // self.period
+        self.otp.enable_drift_tracking(drift=-1)
+
+        self.assertEqual(self.otp.verify(str(step - 1), 2), -1)
+        self.assertEqual(calls, [self.time_source() - self.period])
+
+    def test_drift_tracking_pickle(self):
+        self.otp.enable_drift_tracking(max_drift=5, drift=2)
+        self.otp._current_timestamp = None
+        otp = pickle.loads(pickle.dumps(self.otp))
+        otp._current_timestamp = self.time_source
+        self.assertEqual(otp.drift, 2)
+        self.assertEqual(otp.verify(otp.get_otp(self.time_source() + 90)),
+                         3)
+
+    def test_drift_tracking_raises(self):
+        self.assertRaises(ValueError, self.otp.enable_drift_tracking, -1)
+        self.assertRaises(ValueError, self.otp.enable_drift_tracking, 1, 2)
+
+
+class TestRFCVectors(unittest.TestCase):
+    """
+    Test vectors from RFC 4226 appendix D and RFC 6238 appendix B
+    """
+    def test_rfc_4226(self):
+        codes = ['755224', '287082', '359152', '969429', '338314',
+                 '254676', '287922', '162583', '399871', '520489']
+        secret = b'12345678901234567890'
+        for as_type in (bytearray, memoryview):
+            otp = HOTP(as_type(secret), 'test')
+            self.assertEqual([otp.get_otp() for _ in codes], codes)
+
+    def test_rfc_6238(self):
+        seeds = {
+            'sha1': b'12345678901234567890',
+            'sha256': b'12345678901234567890123456789012',
+            'sha512': b'1234567890123456789012345678901234567890'
+                      b'123456789012345678901234',
+        }
+        vectors = [
+            (59, '94287082', '46119246', '90693936'),
+            (1111111109, '07081804', '68084774', '25091201'),
+            (1111111111, '14050471', '67062674', '99943326'),
+            (1234567890, '89005924', '91819424', '93441116'),
+            (2000000000, '69279037', '90698825', '38618901'),
+            (20000000000, '65353130', '77737706', '47863826'),
+        ]
+        for i, algorithm in enumerate(('sha1', 'sha256', 'sha512')):
+            otp = TOTP(bytearray(seeds[algorithm]), 'test', n_digits=8,
+                       algorithm=algorithm)
+            for vector in vectors:
+                self.assertEqual(otp.get_otp(vector[0]), vector[i + 1])
+                self.assertEqual(otp.get_otp_int(vector[0]),
+                                 int(vector[i + 1]))
+
+    def test_memoryview_secret_not_copied(self):
+        """
+        A memoryview secret should be kept as is
+        """
+        secret = memoryview(bytearray(b'12345678901234567890'))
+        otp = HOTP(secret, 'test')
+        self.assertIs(otp._secret, secret)
+        self.assertEqual(otp.get_otp(0), '755224')
+
+
+class TestGenerateMany(unittest.TestCase):
+    def test_generate_many(self):
+        """
+        generate_many should match generating codes one at a time
+        """
+        secrets = [bytearray(b'12345678901234567890'), 'CERDGRCVMZ3YRGNK',
+                   b'CERDGRCVMZ3YRGNK',
+                   memoryview(bytearray(b'12345678901234567890'))]
+        pairs = [(secret, counter) for secret in secrets
+                 for counter in range(5)]
+        expected = [HOTP(secret, 'test').get_otp(counter)
+                    for secret, counter in pairs]
+        self.assertEqual(list(generate_many(pairs)), expected)
+        self.assertEqual(expected[:2], ['755224', '287082'])
+
+
+class TestVerifyMany(unittest.TestCase):
+    def setUp(self):
+        self.timestamp = 1414782000
+        self.secret = bytearray(b'\x17\r\xc4.\xca\xe8\x1c\x88\xbaB')
+        self.totp = TOTP(self.secret, 'test', 'test_user',
+                         time_source=lambda: self.timestamp)
+        self.hotp = HOTP(self.secret, 'test', 'test_user', counter=10)
+
+    def test_verify_many_matches_compare(self):
+        """
+        verify_many should agree with calling compare one at a time
+        """
+        current = self.totp.get_otp(self.timestamp)
+        previous = self.totp.get_otp(self.timestamp - 30)
+        too_old = self.totp.get_otp(self.timestamp - 60)
+        items = [(self.totp, current), (self.totp, previous),
+                 (self.totp, too_old)]
+        expected = [self.totp.compare(code) for _, code in items]
+        self.assertEqual(verify_many(items, self.timestamp), expected)
+        self.assertEqual(expected, [True, True, False])
+
+    def test_verify_many_hotp_and_uri(self):
+        """
+        verify_many should handle HOTPs and URIs, and sync HOTP counters
+        """
+        hotp_code = self.hotp.get_otp(11)
+        totp_code = self.totp.get_otp(self.timestamp)
+        items = [(self.hotp, hotp_code), (self.totp.get_uri(), totp_code)]
+        self.assertEqual(verify_many(items, self.timestamp), [True, True])
+        self.assertEqual(self.hotp.counter, 12)
+
+    def test_verify_many_malformed_code(self):
+        """
+        verify_many should report malformed codes as False, not raise
+        """
+        items = [(self.totp, 'a1b2c3'), (self.totp, None)]
+        self.assertEqual(verify_many(items, self.timestamp), [False, False])
+
+    def test_verify_many_malformed_uri(self):
+        """
+        verify_many should report URIs it can't parse as False, not raise
+        """
+        totp_code = self.totp.get_otp(self.timestamp)
+        items = [('otpauth://totp/test?issuer=test', totp_code),
+                 ('otpauth://sotp/test?secret=CERDGRCVMZ3YRGNK', totp_code),
+                 ('not a uri', totp_code), (None, totp_code),
+                 ([1], totp_code), ({}, totp_code),
+                 (self.totp.get_uri(), totp_code)]
+        self.assertEqual(verify_many(items, self.timestamp),
+                         [False, False, False, False, False, False, True])
+
+    def test_verify_many_raises_on_negative(self):
+        """
+        verify_many should raise when passed a negative window
+        """
+        self.assertRaises(ValueError, verify_many, [], self.timestamp, -1)
+        self.assertRaises(ValueError, verify_many, [], self.timestamp, 1, -1)
+
+
 if __name__ == '__main__':
     unittest.main()
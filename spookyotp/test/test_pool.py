@@ -0,0 +1,42 @@
+import unittest
+from spookyotp.pool import starmap_in_pool
+
+
+def _scale(x, factor):
+    return x * factor
+
+
+class TestPool(unittest.TestCase):
+    def test_in_process(self):
+        """
+        Without workers, calls should be made lazily in this process
+        """
+        read = []
+
+        def args():
+            for x in range(5):
+                read.append(x)
+                yield (x, 3)
+        results = starmap_in_pool(_scale, args())
+        self.assertEqual(read, [])
+        self.assertEqual(list(results), [0, 3, 6, 9, 12])
+
+    def test_pool_order(self):
+        """
+        Results from the pool should come back in order, and only
+        max_in_flight calls should be read ahead
+        """
+        read = []
+
+        def args():
+            for x in range(20):
+                read.append(x)
+                yield (x, 2)
+        results = starmap_in_pool(_scale, args(), workers=2, max_in_flight=3)
+        self.assertEqual(next(results), 0)
+        self.assertEqual(len(read), 3)
+        self.assertEqual(list(results), [2 * x for x in range(1, 20)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import unittest
+import mock
+from spookyotp.qr import QRCodeCache
+
+
+class TestQRCodeCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = QRCodeCache(max_entries=2)
+        patcher = mock.patch('spookyotp.qr._make')
+        self.mock_make = patcher.start()
+        self.mock_make.side_effect = lambda uri: mock.Mock(uri=uri)
+        self.addCleanup(patcher.stop)
+
+    def test_get_image(self):
+        """
+        Images should be rendered once per URI
+        """
+        img = self.cache.get_image('otpauth://a')
+        self.assertEqual(img.uri, 'otpauth://a')
+        self.assertIs(self.cache.get_image('otpauth://a'), img)
+        self.assertEqual(self.mock_make.call_count, 1)
+
+    def test_get_png(self):
+        """
+        PNG bytes should be saved from the cached image, once
+        """
+        img = self.cache.get_image('otpauth://a')
+        img.save.side_effect = lambda stream: stream.write(b'PNG')
+        self.assertEqual(self.cache.get_png('otpauth://a'), b'PNG')
+        self.assertEqual(self.cache.get_png('otpauth://a'), b'PNG')
+        self.assertEqual(img.save.call_count, 1)
+
+    def test_evicts_least_recently_used(self):
+        """
+        Once full, the least recently used code should be dropped
+        """
+        a = self.cache.get_image('otpauth://a')
+        self.cache.get_image('otpauth://b')
+        self.cache.get_image('otpauth://a')
+        self.cache.get_image('otpauth://c')
+        self.assertEqual(len(self.cache), 2)
+        self.assertIs(self.cache.get_image('otpauth://a'), a)
+        self.cache.get_image('otpauth://b')
+        self.assertEqual(self.mock_make.call_count, 4)
+
+    def test_clear(self):
+        self.cache.get_image('otpauth://a')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_thread_safe(self):
+        cache = QRCodeCache(thread_safe=True)
+        self.assertIs(cache.get_image('otpauth://a'),
+                      cache.get_image('otpauth://a'))
+
+    def test_raises(self):
+        self.assertRaises(ValueError, QRCodeCache, 0)
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_qrcode_not_imported(self):
+        """
+        Importing spookyotp shouldn't import qrcode
+        """
+        code = 'import sys, spookyotp; print("qrcode" in sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from spookyotp.otp import TOTP, verify_many
+from spookyotp.replay import UsedCodeCache
+
+
+class TestUsedCodeCache(unittest.TestCase):
+    """
+    Tests for the cache of already-used TOTP steps
+    """
+    def test_consume(self):
+        """
+        consume should accept a step once per credential
+        """
+        cache = UsedCodeCache()
+        self.assertTrue(cache.consume('a', 100, 100, 1))
+        self.assertFalse(cache.consume('a', 100, 100, 1))
+        self.assertTrue(cache.consume('b', 100, 100, 1))
+        self.assertTrue(cache.consume('a', 101, 101, 1))
+
+    def test_expiry(self):
+        """
+        Steps should be forgotten once they leave the window
+        """
+        cache = UsedCodeCache(thread_safe=True)
+        cache.consume('a', 100, 100, 1)
+        cache.consume('b', 101, 101, 1)
+        self.assertEqual(len(cache), 2)
+        cache.consume('c', 102, 102, 1)
+        self.assertEqual(len(cache), 2)
+        cache.consume('c', 110, 110, 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_max_entries(self):
+        """
+        The cache should never hold more than max_entries
+        """
+        cache = UsedCodeCache(max_entries=3)
+        for credential in range(10):
+            cache.consume(credential, 100, 100, 1)
+        self.assertEqual(len(cache), 3)
+        self.assertTrue(cache.consume(0, 100, 100, 1))
+        self.assertFalse(cache.consume(9, 100, 100, 1))
+
+    def test_raises_on_bad_size(self):
+        """
+        The cache should need room for at least one entry
+        """
+        self.assertRaises(ValueError, UsedCodeCache, 0)
+
+
+class TestTOTPReplay(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.otp = TOTP(bytearray(b'\x17\r\xc4.\xca\xe8\x1c\x88\xbaB'),
+                        'test', 'test_user', time_source=lambda: self.now)
+        self.used_codes = UsedCodeCache()
+
+    def test_compare_rejects_replay(self):
+        """
+        compare should only accept a code once when given a cache
+        """
+        code = self.otp.get_otp()
+        self.assertTrue(self.otp.compare(code, used_codes=self.used_codes))
+        self.assertFalse(self.otp.compare(code, used_codes=self.used_codes))
+        # still valid without the cache
+        self.assertTrue(self.otp.compare(code))
+
+    def test_replay_across_steps(self):
+        """
+        A code should stay used as the window moves past it
+        """
+        code = self.otp.get_otp()
+        self.assertEqual(self.otp.verify(code, used_codes=self.used_codes), 0)
+        self.now += 30
+        self.assertIsNone(self.otp.verify(code, used_codes=self.used_codes))
+
+    def test_credentials_keyed_by_secret(self):
+        """
+        Different secrets sharing an issuer and account shouldn't share
+        used steps, but objects for the same secret should
+        """
+        other = TOTP(bytearray(b'\x01' * 10), 'test', 'test_user',
+                     time_source=lambda: self.now)
+        self.assertTrue(self.otp.compare(self.otp.get_otp(),
+                                         used_codes=self.used_codes))
+        self.assertTrue(other.compare(other.get_otp(),
+                                      used_codes=self.used_codes))
+
+        same = TOTP(bytearray(b'\x17\r\xc4.\xca\xe8\x1c\x88\xbaB'),
+                    'other', time_source=lambda: self.now)
+        self.assertFalse(same.compare(same.get_otp(),
+                                      used_codes=self.used_codes))
+
+    def test_verify_many_rejects_replay(self):
+        """
+        verify_many should use the cache for TOTP checks
+        """
+        code = self.otp.get_otp()
+        items = [(self.otp, code), (self.otp, code)]
+        self.assertEqual(verify_many(items, self.now,
+                                     used_codes=self.used_codes),
+                         [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import unittest
+if sys.version_info < (3, 8) or sys.platform == 'win32':
+    raise unittest.SkipTest("shared memory tests need Python 3.8+ on POSIX")
+import multiprocessing
+from spookyotp.shared import SharedCredentialStore
+from spookyotp.test.fixtures import CredentialFixture
+
+
+def _verify_in_child(name, row, codes, results):
+    with SharedCredentialStore.attach(name) as store:
+        for code in codes:
+            results.put((code, store.verify(row, code)))
+
+
+class TestSharedCredentialStore(CredentialFixture, unittest.TestCase):
+    def setUp(self):
+        super(TestSharedCredentialStore, self).setUp()
+        self.store = SharedCredentialStore.create([self.totp, self.hotp])
+
+    def tearDown(self):
+        self.store.close()
+        self.store.unlink()
+
+    def test_attach(self):
+        """
+        An attached store should see the same rows as the owner
+        """
+        with SharedCredentialStore.attach(self.store.name) as other:
+            self.assertEqual(len(other), 2)
+            self.assertEqual(other.get_otp(0, self.now),
+                             self.totp.get_otp(self.now))
+            self.assertEqual(other.get_counter(1), 7)
+            self.assertEqual(other.load(1, 'test').get_uri(),
+                             self.hotp.get_uri())
+            self.assertRaises(ValueError, other.unlink)
+
+    def test_verify_totp(self):
+        """
+        TOTP rows should be checked like TOTP.verify
+        """
+        code = self.totp.get_otp(self.now - 60)
+        self.assertEqual(self.store.verify(0, code, self.now), -1)
+        self.assertIsNone(self.store.verify(0, code, self.now,
+                                            max_step_difference=0))
+
+    def test_verify_hotp_shared_counter(self):
+        """
+        A counter advanced through one attachment should be seen by
+        the others, and a code should only be accepted once
+        """
+        code = self.hotp.get_otp(8)
+        with SharedCredentialStore.attach(self.store.name) as other:
+            self.assertEqual(other.verify(1, code), 1)
+            self.assertEqual(self.store.get_counter(1), 9)
+            self.assertIsNone(self.store.verify(1, code))
+            self.assertEqual(self.store.verify(1, self.hotp.get_otp(9)), 0)
+            self.assertEqual(other.get_counter(1), 10)
+
+    def test_verify_hotp_across_processes(self):
+        """
+        Codes checked from several processes should never be accepted
+        more than once, and the counter should end past all of them
+        """
+        codes = [self.hotp.get_otp(counter) for counter in range(7, 10)]
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        workers = [context.Process(target=_verify_in_child,
+                                   args=(self.store.name, 1, codes, results))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get(timeout=30) for _ in range(9)]
+        for worker in workers:
+            worker.join(30)
+            self.assertEqual(worker.exitcode, 0)
+        accepted = [code for code, offset in outcomes if offset is not None]
+        self.assertTrue(accepted)
+        self.assertEqual(len(accepted), len(set(accepted)))
+        self.assertEqual(self.store.get_counter(1), 10)
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+from spookyotp.storage import MemoryBackend, SQLiteBackend
+from spookyotp.test.fixtures import CredentialFixture
+
+
+class CommonBackendTests(CredentialFixture):
+    hotp_counter = 10
+
+    def setUp(self):
+        super(CommonBackendTests, self).setUp()
+        self.backend = self.make_backend()
+        self.backend.put('t', self.totp)
+        self.backend.put('h', self.hotp)
+
+    def test_get(self):
+        self.assertEqual(self.backend.get('t').get_uri(), self.totp.get_uri())
+        self.assertEqual(self.backend.get('h').counter, 10)
+        self.assertIsNone(self.backend.get('missing'))
+        self.assertEqual(sorted(self.backend.get_many(['t', 'h', 'x'])),
+                         ['h', 't'])
+        self.assertRaises(TypeError, self.backend.put, 'x', object())
+
+    def test_delete(self):
+        self.backend.delete('t')
+        self.backend.delete('missing')
+        self.assertIsNone(self.backend.get('t'))
+
+    def test_advance_counters(self):
+        """
+        Counters should only ever move forward
+        """
+        self.assertEqual(self.backend.advance_counters(
+            [('h', 12), ('h', 11), ('h', 12), ('h', 13), ('t', 5),
+             ('missing', 1)]),
+            [True, False, False, True, False, False])
+        self.assertEqual(self.backend.get('h').counter, 13)
+
+    def test_consume(self):
+        """
+        Backends should work as used_codes, like UsedCodeCache
+        """
+        code = self.totp.get_otp()
+        self.assertTrue(self.totp.compare(code, used_codes=self.backend))
+        self.assertFalse(self.totp.compare(code, used_codes=self.backend))
+        self.assertTrue(self.backend.consume('c', 5, 5, 1))
+        self.assertFalse(self.backend.consume('c', 5, 6, 1))
+        # expired, so forgotten
+        self.assertTrue(self.backend.consume('c', 5, 7, 1))
+
+    def test_verify_many(self):
+        """
+        Each code should only be accepted once, and the batch
+        written back
+        """
+        totp_code = self.totp.get_otp(self.now)
+        hotp_code = self.hotp.get_otp(11, False)
+        items = [('t', totp_code), ('h', hotp_code), ('t', totp_code),
+                 ('h', hotp_code), ('missing', '123456'), ('t', 'abc')]
+        self.assertEqual(self.backend.verify_many(items, self.now),
+                         [True, True, False, False, False, False])
+        self.assertEqual(self.backend.get('h').counter, 12)
+        self.assertEqual(self.backend.verify_many(items[:2], self.now),
+                         [False, False])
+        self.assertFalse(self.totp.compare(totp_code,
+                                           used_codes=self.backend))
+
+    def test_verify_many_raises(self):
+        self.assertRaises(ValueError, self.backend.verify_many, [], None, -1)
+        self.assertRaises(ValueError, self.backend.verify_many, [], None,
+                          1, -1)
+
+
+class TestMemoryBackend(CommonBackendTests, unittest.TestCase):
+    def make_backend(self):
+        return MemoryBackend()
+
+
+class TestSQLiteBackend(CommonBackendTests, unittest.TestCase):
+    def make_backend(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = os.path.join(tmpdir, 'otp.sqlite')
+        backend = SQLiteBackend(self.path)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_persists(self):
+        self.backend.advance_counter('h', 20)
+        with SQLiteBackend(self.path) as backend:
+            self.assertEqual(backend.get('h').counter, 20)
+
+    def test_transaction_rolls_back(self):
+        try:
+            with self.backend.transaction():
+                self.backend.advance_counter('h', 20)
+                raise KeyError()
+        except KeyError:
+            pass
+        self.assertEqual(self.backend.get('h').counter, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
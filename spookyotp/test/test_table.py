@@ -0,0 +1,53 @@
+import unittest
+from spookyotp.table import CredentialTable
+from spookyotp.test.fixtures import CredentialFixture
+
+
+class TestCredentialTable(CredentialFixture, unittest.TestCase):
+    def setUp(self):
+        super(TestCredentialTable, self).setUp()
+        self.table = CredentialTable()
+        self.table.extend([self.totp, self.hotp])
+
+    def test_append(self):
+        """
+        append should return the new row number
+        """
+        self.assertEqual(self.table.append(self.totp), 2)
+        self.assertEqual(len(self.table), 3)
+        self.assertRaises(TypeError, self.table.append, object())
+
+    def test_get_otp(self):
+        """
+        Rows should generate the same codes as the objects they came from
+        """
+        self.assertEqual(self.table.get_otp(0, self.now),
+                         self.totp.get_otp(self.now))
+        self.assertEqual(self.table.get_otp(1),
+                         self.hotp.get_otp(auto_increment=False))
+        self.assertEqual(self.table.get_otp(1, counter=100),
+                         self.hotp.get_otp(100))
+
+    def test_verify_totp(self):
+        """
+        verify should return the same offsets as TOTP.verify
+        """
+        for offset in (-2, -1, 0, 1, 2):
+            code = self.totp.get_otp(self.now + 60 * offset)
+            self.assertEqual(self.table.verify(0, code, self.now),
+                             self.totp.verify(code))
+        self.assertRaises(ValueError, self.table.verify, 0, 'abcdefgh')
+
+    def test_verify_hotp(self):
+        """
+        verify should synchronize the counter of HOTP rows
+        """
+        code = self.hotp.get_otp(9)
+        self.assertEqual(self.table.verify(1, code), 2)
+        self.assertEqual(self.table.get_counter(1), 10)
+        self.assertIsNone(self.table.verify(1, code))
+        self.assertRaises(ValueError, self.table.get_counter, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
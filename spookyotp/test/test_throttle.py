@@ -0,0 +1,94 @@
+import unittest
+from spookyotp.otp import HOTP, TOTP
+from spookyotp.throttle import AttemptThrottle
+
+
+class TestAttemptThrottle(unittest.TestCase):
+    def setUp(self):
+        self.now = 1414782000
+        self.throttle = AttemptThrottle(rate=0.5, burst=2, max_entries=3,
+                                        time_source=lambda: self.now)
+        self.totp = TOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user',
+                         time_source=lambda: self.now)
+        self.hotp = HOTP('CERDGRCVMZ3YRGNK', 'test', 'test_user', counter=5)
+
+    def test_malformed_codes_skip_hashing(self):
+        """
+        Malformed codes should be rejected without computing anything
+        or spending an attempt
+        """
+        def fail(*args, **kwargs):
+            raise AssertionError("verify should not be called")
+        self.totp.verify = fail
+        for code in ('12345', '1234567', '12345a', ' 12345', '+12345',
+                     '١٢٣٤٥٦', None, 123456):
+            self.assertFalse(self.throttle.compare(self.totp, code))
+        self.assertEqual(self.throttle.malformed, 8)
+        self.assertEqual(len(self.throttle), 0)
+
+    def test_throttles_per_credential(self):
+        """
+        Attempts past the burst should be rejected, even with the
+        right code, until the bucket refills
+        """
+        code = self.totp.get_otp()
+        self.assertFalse(self.throttle.compare(self.totp, '000000'))
+        self.assertFalse(self.throttle.compare(self.totp, '000000'))
+        self.assertFalse(self.throttle.compare(self.totp, code))
+        self.assertEqual(self.throttle.throttled, 1)
+
+        # other credentials have their own buckets
+        self.assertEqual(self.throttle.verify(self.hotp,
+                                              self.hotp.get_otp(6, False)), 1)
+
+        self.now += 2
+        self.assertTrue(self.throttle.compare(self.totp, code))
+        self.assertFalse(self.throttle.compare(self.totp, code))
+
+        self.throttle.reset(self.totp._credential_key())
+        self.assertTrue(self.throttle.allow(self.totp._credential_key()))
+
+    def test_buckets_per_secret(self):
+        """
+        Credentials without accounts under one issuer should each have
+        their own bucket, unless given the same key
+        """
+        totps = [TOTP(secret, 'test', time_source=lambda: self.now)
+                 for secret in ('CERDGRCVMZ3YRGNK', 'MFRGGZDFMZTWQ2LK')]
+        for _ in range(3):
+            self.throttle.compare(totps[0], '000000')
+        self.assertTrue(self.throttle.compare(totps[1], totps[1].get_otp()))
+
+        self.assertTrue(self.throttle.compare(totps[1], totps[1].get_otp(),
+                                              key='user'))
+        self.throttle.compare(totps[0], '000000', key='user')
+        self.assertFalse(self.throttle.compare(totps[1], totps[1].get_otp(),
+                                               key='user'))
+
+    def test_passes_arguments_on(self):
+        """
+        Extra arguments should reach otp.verify
+        """
+        code = self.totp.get_otp(self.now - 60)
+        self.assertIsNone(self.throttle.verify(self.totp, code))
+        self.assertEqual(self.throttle.verify(self.totp, code,
+                                              max_step_difference=2), -2)
+
+    def test_idle_entries_evicted(self):
+        """
+        Entries should be dropped once their bucket would be full,
+        and the least recently used once max_entries is reached
+        """
+        for credential in ('a', 'b', 'c'):
+            self.throttle.allow(credential)
+            self.now += 1
+        self.assertEqual(len(self.throttle), 3)
+
+        self.throttle.allow('d')
+        self.throttle.allow('c')
+        self.throttle.allow('e')
+        self.assertEqual(set(self.throttle._entries), set(['c', 'd', 'e']))
+
+        self.now += 4
+        self.throttle.allow('f')
+        self.assertEqual(set(self.throttle._entries), set(['f']))
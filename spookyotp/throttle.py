@@ -0,0 +1,187 @@
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from collections import OrderedDict
+import re
+import threading
+import time
+
+
+__all__ = ['AttemptThrottle']
+
+
+_DIGITS = re.compile(r'[0-9]+\Z')
+
+
+class AttemptThrottle(object):
+    """
+    Sheds load in front of TOTP and HOTP checks, so bad guesses cost
+    as little as possible.
+
+    Codes of the wrong length, or with anything but ASCII digits in
+    them, are rejected before any code is computed. Everything else is
+    rate limited per credential with a token bucket: each credential
+    can make burst attempts at once, and regains rate attempts per
+    second after that. Attempts beyond that are rejected, again without
+    computing anything, whether or not the code was right.
+
+        throttle = AttemptThrottle(rate=0.1, burst=5)
+        if throttle.compare(otp, code):
+            ...
+
+    Each active credential takes one small entry. An entry is dropped
+    once it has been idle long enough to have refilled its bucket,
+    since a new entry would behave the same. As a hard cap, once
+    max_entries is reached the least recently used entry is dropped
+    to make room, which gives that credential a full bucket again.
+    """
+
+    def __init__(self, rate=0.1, burst=5, max_entries=100000,
+                 thread_safe=False, time_source=None):
+        """
+        Args:
+          rate (float, optional): Attempts regained per second, per
+                                  credential (default: 0.1)
+          burst (int, optional): The most attempts a credential can make
+                                 at once (default: 5)
+          max_entries (int, optional): The most credentials to track
+                                       (default: 100000)
+          thread_safe (bool, optional): Guard the throttle with a lock so
+                                        it can be shared between threads
+                                        (default: False)
+          time_source(function, optional): A function that returns the
+                                           current timestamp
+                                           (default: time.time)
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        if burst < 1:
+            raise ValueError("Burst must be at least 1")
+        if max_entries < 1:
+            raise ValueError("Max entries must be positive")
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._refill_seconds = self._burst / self._rate
+        self._max_entries = int(max_entries)
+        # credential -> [tokens, timestamp of last update]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock() if thread_safe else None
+        self._current_timestamp = time_source or time.time
+        self.malformed = 0
+        self.throttled = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def allow(self, credential):
+        """
+        Take one attempt from a credential's bucket.
+        Returns True if there was one to take, False if it's throttled.
+
+        Args:
+          credential (hashable): Identifies the credential
+        """
+        if self._lock is None:
+            return self._allow(credential)
+        with self._lock:
+            return self._allow(credential)
+
+    def _allow(self, credential):
+        now = self._current_timestamp()
+        self._expire(now)
+        entries = self._entries
+        entry = entries.pop(credential, None)
+        if entry is None:
+            if len(entries) >= self._max_entries:
+                entries.popitem(last=False)
+            entry = [self._burst, now]
+        else:
+            entry[0] = min(self._burst,
+                           entry[0] + (now - entry[1]) * self._rate)
+            entry[1] = now
+        # re-inserted so the dict stays in order of last update
+        entries[credential] = entry
+        if entry[0] < 1:
+            self.throttled += 1
+            return False
+        entry[0] -= 1
+        return True
+
+    def _expire(self, now):
+        """
+        Drop entries from the oldest end until one could still be
+        short of a full bucket
+        """
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            if now - entries[key][1] < self._refill_seconds:
+                break
+            del entries[key]
+
+    def reset(self, credential):
+        """
+        Give a credential a full bucket again, e.g. once its owner has
+        proven who they are some other way
+        """
+        if self._lock is None:
+            self._entries.pop(credential, None)
+        else:
+            with self._lock:
+                self._entries.pop(credential, None)
+
+    def clear(self):
+        """
+        Forget every credential
+        """
+        self._entries.clear()
+
+    def compare(self, otp, code, *args, **kwargs):
+        """
+        Like otp.compare, but rejecting malformed and throttled
+        attempts first. Extra arguments are passed on to otp.compare.
+        Returns True if the code is valid.
+
+        Args:
+          otp (TOTP or HOTP): The credential to check the code for
+          code (str): The code to check
+          key (hashable, optional): The bucket to take the attempt from
+                                    (default: one per secret)
+        """
+        return self.verify(otp, code, *args, **kwargs) is not None
+
+    def verify(self, otp, code, *args, **kwargs):
+        """
+        Like otp.verify, but rejecting malformed and throttled
+        attempts first. Extra arguments are passed on to otp.verify.
+        Returns the matching offset, or None.
+
+        Args:
+          otp (TOTP or HOTP): The credential to check the code for
+          code (str): The code to check
+          key (hashable, optional): The bucket to take the attempt from,
+                                    such as a user id (default: one per
+                                    secret)
+        """
+        key = kwargs.pop('key', None)
+        if not self.is_well_formed(otp, code):
+            self.malformed += 1
+            return None
+        if key is None:
+            key = otp._credential_key()
+        if not self.allow(key):
+            return None
+        return otp.verify(code, *args, **kwargs)
+
+    @staticmethod
+    def is_well_formed(otp, code):
+        """
+        Return True if the code has the right number of ASCII digits
+        to be one of otp's codes
+        """
+        try:
+            return (len(code) == otp._n_digits and
+                    _DIGITS.match(code) is not None)
+        except TypeError:
+            return False